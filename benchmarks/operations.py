@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the operations of the tool, against deterministic stand-ins
+for the system binaries.
+
+A directory of fake `ping`, `ip`, `ps`, `sudo`, `systemctl`, `chattr`, `ufw`,
+`timedatectl`, `ntpdate` (plus `date` and `kill`, so nothing real is touched) is
+put first on PATH. Every stand-in logs its call, waits --latency ms and fails when
+named in --fail. resolv.conf, the systemd directory, the apt lock, /proc, ufw's
+configuration (enabled, NTP rule missing) and the date-sync state are redirected
+into a temporary sandbox, and a fake SNTP server
+answers on 127.0.0.123 (needs root to bind port 123).
+
+Each operation runs in a fresh interpreter and reports its wall time, the
+processes it spawned (audit hook on subprocess/os spawns) and the peak RSS.
+The results are compared against the stored baseline; exits with 1 on a regression.
+
+    python3 benchmarks/operations.py [--runs 3] [--latency 5] [--fail systemctl,ping]
+    python3 benchmarks/operations.py --save-baseline
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Force Python not to create .pyc files
+sys.dont_write_bytecode = True
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "operations_baseline.json")
+NTP_ADDRESS = "127.0.0.123"
+TIMEZONE = "America/Sao_Paulo"
+# Fake apt processes: pids above the kernel limit, so they cannot exist
+APT_PIDS = (4194400, 4194401)
+
+# Shared head of every stand-in: log the call, simulate failure and latency
+STUB_HEAD = """#!/bin/sh
+name=${0##*/}
+echo "$name $*" >> "$FAKE_LOG"
+case ",$FAKE_FAIL," in *",$name,"*) echo "$name: simulated failure" >&2; exit 1;; esac
+[ "$FAKE_LATENCY" = 0 ] || sleep "$FAKE_LATENCY"
+"""
+
+STUBS = {
+    "ping": """
+count=1 interval=1
+while [ $# -gt 1 ]; do
+  case "$1" in -c) count=$2; shift;; -i) interval=$2; shift;; esac
+  shift
+done
+echo "PING $1 ($1) 56(84) bytes of data."
+i=1
+while [ $i -le $count ]; do
+  echo "64 bytes from $1: icmp_seq=$i ttl=64 time=$FAKE_RTT ms"
+  [ $i -lt $count ] && sleep "$interval"
+  i=$((i + 1))
+done
+echo "--- $1 ping statistics ---"
+echo "$count packets transmitted, $count received, 0% packet loss, time 0ms"
+""",
+    "ip": """
+echo "default via 10.0.0.1 dev eth0 proto dhcp src 10.0.0.2 metric 100"
+""",
+    "ps": """
+echo "USER PID %CPU %MEM VSZ RSS TTY STAT START TIME COMMAND"
+echo "root 1 0.0 0.1 1000 100 ? Ss 00:00 0:01 /sbin/init"
+""",
+    "sudo": """
+while [ $# -gt 0 ]; do case "$1" in -*) shift;; *) break;; esac; done
+case "$(command -v "$1")" in "$FAKE_BIN"/*) exec "$@";; esac
+# Real file commands only run on the sandbox, anything else is just logged
+case "$1" in cp|mv|rm)
+  for arg in "$@"; do
+    case "$arg" in /*) case "$arg" in "$FAKE_ROOT"/*) ;; *) exit 0;; esac;; esac
+  done
+  exec "$@";;
+esac
+exit 0
+""",
+    "systemctl": """
+if [ "$1" = show ]; then
+  first=1
+  for unit in "$@"; do
+    case "$unit" in show|--*|-*) continue;; esac
+    [ $first = 1 ] || echo
+    first=0
+    echo "Id=$unit"; echo "LoadState=loaded"; echo "ActiveState=active"; echo "SubState=running"
+    echo "UnitFileState=enabled"; echo "ExecMainStatus=0"
+  done
+fi
+exit 0
+""",
+    "chattr": "exit 0\n",
+    "ufw": """
+case "$*" in
+  "status verbose") echo "Status: active";;
+  "status numbered") echo "[ 1] 123/udp ALLOW OUT Anywhere (out)"; echo "allow out 123/udp";;
+esac
+exit 0
+""",
+    "timedatectl": """
+echo "               Local time: Sat 2026-01-01 00:00:00 -03"
+echo "                Time zone: $FAKE_TIMEZONE (-03, -0300)"
+exit 0
+""",
+    "ntpdate": """
+echo "adjust time server $1 offset +0.000100 sec"
+exit 0
+""",
+    "date": "exit 0\n",
+    "kill": "exit 0\n",
+}
+
+
+def make_stubs(bin_dir: str) -> None:
+    os.makedirs(bin_dir, exist_ok=True)
+    for name, body in STUBS.items():
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as f:
+            f.write(STUB_HEAD + body.lstrip("\n"))
+        os.chmod(path, 0o755)
+
+
+def make_proc(proc_dir: str, others: int = 200) -> None:
+    """
+    Fake /proc: `others` idle processes and two apt processes under a shell.
+    """
+    def process(pid, ppid, comm, cmdline):
+        path = os.path.join(proc_dir, str(pid))
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "cmdline"), "wb") as f:
+            f.write(b"\x00".join(arg.encode() for arg in cmdline) + b"\x00")
+        with open(os.path.join(path, "comm"), "w") as f:
+            f.write(comm + "\n")
+        with open(os.path.join(path, "status"), "w") as f:
+            f.write(f"Name:\t{comm}\nPPid:\t{ppid}\nUid:\t0\t0\t0\t0\n")
+
+    process(1, 0, "systemd", ["/sbin/init"])
+    for pid in range(100, 100 + others):
+        process(pid, 1, "sleep", ["sleep", "infinity"])
+    process(4194399, 1, "sh", ["/bin/sh", "-c", "apt-get -y upgrade"])
+    for pid in APT_PIDS:
+        process(pid, 4194399, "apt-get", ["/usr/bin/apt-get", "-y", "upgrade"])
+
+
+def make_ufw(ufw_dir: str) -> None:
+    """
+    ufw enabled, without the outgoing NTP rule: date-sync adds it with the stand-in.
+    """
+    os.makedirs(ufw_dir, exist_ok=True)
+    with open(os.path.join(ufw_dir, "ufw.conf"), "w") as f:
+        f.write("# /etc/ufw/ufw.conf\nENABLED=yes\nLOGLEVEL=low\n")
+    with open(os.path.join(ufw_dir, "user.rules"), "w") as f:
+        f.write("*filter\n### RULES ###\n\n### tuple ### allow tcp 22 0.0.0.0/0 any 0.0.0.0/0 in\n"
+                "-A ufw-user-input -p tcp --dport 22 -j ACCEPT\n\n### END RULES ###\nCOMMIT\n")
+
+
+class FakeNtpServer:
+    """
+    Answers SNTP client requests on address:port (port 0: a free port, see self.port)
+    with the local time moved by `offset` seconds, answering `delay` seconds late.
+    stratum/refid fill the reply header (stratum 0 is a kiss-o'-death, refid its code);
+    echo_origin=False answers with an origin timestamp that matches no request.
+    """
+    def __init__(self, address: str = NTP_ADDRESS, delay: float = 0.0, port: int = 123,
+                 offset: float = 0.0, stratum: int = 2, refid: bytes = b"GPS\0", echo_origin: bool = True):
+        import socket
+        self.delay = delay
+        self.offset = offset
+        self.stratum = stratum
+        self.refid = refid
+        self.echo_origin = echo_origin
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((address, port))
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        from tools.date import sntp
+        while True:
+            try:
+                data, peer = self.sock.recvfrom(512)
+            except OSError:
+                return
+            request = sntp.NTP_PACKET.unpack(data[:sntp.NTP_PACKET.size])
+            # The wait is on the path, not between the server timestamps: it counts as round trip delay
+            time.sleep(self.delay)
+            received = time.time() + self.offset
+            origin = request[10] if self.echo_origin else request[10] ^ 1
+            reply = sntp.NTP_PACKET.pack(
+                (0 << 6) | (4 << 3) | sntp.MODE_SERVER, self.stratum, 6, -20, 0, 0, self.refid,
+                sntp.to_ntp(received), origin, sntp.to_ntp(received), sntp.to_ntp(time.time() + self.offset),
+            )
+            self.sock.sendto(reply, peer)
+
+    def close(self):
+        self.sock.close()
+
+
+# ---------------------------------------------------------------- operations (run in the child)
+
+def _network(sandbox: str):
+    from tools import network, processes
+    network.APT_LOCK_FILE = os.path.join(sandbox, "apt", "lock")
+    processes.PROC = os.path.join(sandbox, "proc")
+    return network.NetworkManager(
+        dns_servers=["192.0.2.1", "192.0.2.2", "192.0.2.3"],
+        ping_host="192.0.2.10",
+        resolv_conf=os.path.join(sandbox, "resolv.conf"),
+    )
+
+
+def _units(sandbox: str):
+    import tools
+    units_dir = os.path.join(sandbox, "units")
+    os.makedirs(units_dir, exist_ok=True)
+
+    def rendered(create, *args):
+        # Unit files are written to the sandbox instead of the source tree
+        return lambda *more: (create(*(args + more))[0], units_dir)
+
+    my_model = tools.MyService("system", os.path.join(sandbox, "systemd"))
+    os.makedirs(my_model.destination_path, exist_ok=True)
+    service = my_model.create_service("date-sync", rendered(tools.create_service_date, sandbox))
+    forwarder = my_model.create_service("dns-forwarder", rendered(tools.create_service_dns_forwarder, ["192.0.2.1"], "127.0.1.53", sandbox), auto_init=True)
+    timer = my_model.create_timer("date-sync", rendered(tools.create_timer_date), service.name)
+    return my_model, [service, forwarder, timer]
+
+
+def op_configure_dns(sandbox):
+    return _network(sandbox).configure_dns() is not False
+
+
+def op_check_connection(sandbox):
+    return _network(sandbox).check_connection()
+
+
+def op_check_proccess_lock(sandbox):
+    return _network(sandbox).check_proccess_lock()
+
+
+def op_install(sandbox):
+    my_model, units = _units(sandbox)
+    return my_model.apply(units, units)
+
+
+def op_uninstall(sandbox):
+    my_model, units = _units(sandbox)
+    return my_model.apply([], units)
+
+
+def op_date_sync(sandbox):
+    from tools.date import clock, preflight, script
+
+    def denied(*_):
+        raise PermissionError(1, "clock changes are not allowed in the benchmark")
+
+    # The clock is only ever changed through the `date` stand-in
+    clock.step_clock = clock.slew_clock = clock.set_frequency = denied
+    preflight.UFW_CONF = os.path.join(sandbox, "ufw", "ufw.conf")
+    preflight.UFW_USER_RULES = os.path.join(sandbox, "ufw", "user.rules")
+    preflight.LOCALTIME = os.path.join(sandbox, "localtime")
+    preflight.TIMEZONE_FILE = os.path.join(sandbox, "timezone")
+    config = os.path.join(sandbox, "date.yaml")
+    with open(config, "w") as f:
+        f.write(f"timezone: {TIMEZONE}\nping_host: 127.0.0.1\nntp_servers:\n  - {NTP_ADDRESS}\n"
+                f"last_sync_file: {os.path.join(sandbox, 'date', 'last_sync_date.log')}\n")
+    try:
+        script.main(config)
+    except SystemExit as e:
+        return not e.code
+    return True
+
+
+# Run in this order, each in its own interpreter; a sequence shares one sandbox
+OPERATIONS = [
+    ("configure_dns", op_configure_dns),
+    ("configure_dns (unchanged)", op_configure_dns),
+    ("check_connection", op_check_connection),
+    ("check_proccess_lock", op_check_proccess_lock),
+    ("install", op_install),
+    ("install (unchanged)", op_install),
+    ("uninstall", op_uninstall),
+    ("date-sync main()", op_date_sync),
+]
+
+
+def run_operation(name: str, sandbox: str) -> dict:
+    """
+    Child side: runs one operation and returns its measurements.
+    """
+    import resource
+    function = dict(OPERATIONS)[name]
+    spawned = [0]
+
+    def audit(event, _):
+        if event in ("subprocess.Popen", "os.system", "os.posix_spawn", "os.exec", "os.fork"):
+            spawned[0] += 1
+
+    sys.addaudithook(audit)
+    start = time.perf_counter()
+    try:
+        ok = bool(function(sandbox))
+    except Exception as e:
+        print(f"[ERROR] {name}: {e}", file=sys.stderr)
+        ok = False
+    wall = time.perf_counter() - start
+    return {
+        "ok": ok,
+        "wall_ms": round(wall * 1000, 2),
+        "spawned": spawned[0],
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+# ---------------------------------------------------------------- harness (parent)
+
+def _clear_immutable(root: str) -> None:
+    from tools.network import _set_immutable
+    for directory, _, names in os.walk(root):
+        for name in names:
+            _set_immutable(os.path.join(directory, name), False)
+
+
+def run_sequence(args, bin_dir: str) -> dict:
+    """
+    Runs every operation once, in order, in a fresh sandbox.
+    """
+    sandbox = tempfile.mkdtemp(prefix="ops-bench-")
+    log = os.path.join(sandbox, "calls.log")
+    make_proc(os.path.join(sandbox, "proc"))
+    os.makedirs(os.path.join(sandbox, "apt"))
+    open(os.path.join(sandbox, "apt", "lock"), "w").close()
+    make_ufw(os.path.join(sandbox, "ufw"))
+    env = dict(
+        os.environ,
+        PATH=f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+        FAKE_BIN=bin_dir,
+        FAKE_ROOT=sandbox,
+        FAKE_LOG=log,
+        FAKE_FAIL=args.fail,
+        FAKE_LATENCY=f"{args.latency / 1000:.3f}" if args.latency else "0",
+        FAKE_RTT=f"{max(args.latency, 0.1):.1f}",
+        FAKE_TIMEZONE=TIMEZONE,
+    )
+    results = {}
+    try:
+        for name, _ in OPERATIONS:
+            calls = _count_lines(log)
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-operation", name, "--sandbox", sandbox],
+                cwd=sandbox, env=env, capture_output=True, text=True,
+            )
+            try:
+                result = json.loads(child.stdout.strip().splitlines()[-1])
+            except (IndexError, ValueError):
+                result = {"ok": False, "wall_ms": 0.0, "spawned": 0, "peak_rss_kb": 0}
+                if args.verbose:
+                    print(child.stderr, file=sys.stderr)
+            result["stand_ins"] = _count_lines(log) - calls
+            results[name] = result
+            if args.verbose:
+                print(child.stderr, file=sys.stderr)
+    finally:
+        _clear_immutable(sandbox)
+        shutil.rmtree(sandbox, ignore_errors=True)
+    return results
+
+
+def _count_lines(path: str) -> int:
+    try:
+        with open(path, "rb") as f:
+            return sum(1 for _ in f)
+    except OSError:
+        return 0
+
+
+def summarize(runs: list) -> dict:
+    """
+    Median wall time, maximum of the counters over the runs.
+    """
+    summary = {}
+    for name, _ in OPERATIONS:
+        samples = [run[name] for run in runs]
+        walls = sorted(sample["wall_ms"] for sample in samples)
+        summary[name] = {
+            "ok": all(sample["ok"] for sample in samples),
+            "wall_ms": walls[len(walls) // 2],
+            "spawned": max(sample["spawned"] for sample in samples),
+            "stand_ins": max(sample["stand_ins"] for sample in samples),
+            "peak_rss_kb": max(sample["peak_rss_kb"] for sample in samples),
+        }
+    return summary
+
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> bool:
+    """
+    Prints the table; returns True if any operation regressed against the baseline:
+    more processes, or wall time / peak RSS over the tolerance (wall time also 5 ms over).
+    """
+    regressed = False
+    print(f"{'operation':<28}{'wall (ms)':>11}{'base':>9}{'procs':>7}{'base':>6}{'stand-ins':>11}{'rss (KB)':>10}{'base':>8}  result")
+    for name, result in summary.items():
+        base = baseline.get(name, {})
+        problems = []
+        if not result["ok"]:
+            problems.append("failed")
+        if base:
+            if result["spawned"] > base["spawned"]:
+                problems.append("procs")
+            if result["wall_ms"] > base["wall_ms"] * (1 + tolerance) and result["wall_ms"] - base["wall_ms"] > 5.0:
+                problems.append("wall")
+            if result["peak_rss_kb"] > base["peak_rss_kb"] * (1 + tolerance):
+                problems.append("rss")
+        regressed |= any(problem != "failed" for problem in problems)
+        print(
+            f"{name:<28}{result['wall_ms']:>11.1f}{base.get('wall_ms', float('nan')):>9.1f}"
+            f"{result['spawned']:>7}{base.get('spawned', '-'):>6}{result['stand_ins']:>11}"
+            f"{result['peak_rss_kb']:>10}{base.get('peak_rss_kb', '-'):>8}  {', '.join(problems) or 'OK'}"
+        )
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the operations against fake system binaries.")
+    parser.add_argument("--runs", type=int, default=3, help="sequences to run (median wall time is kept)")
+    parser.add_argument("--latency", type=float, default=0.0, help="ms every stand-in (and the fake NTP server) waits")
+    parser.add_argument("--fail", default="", help="comma-separated stand-ins that exit with an error")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed wall time / RSS increase over the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help=f"store the results in {os.path.basename(BASELINE_FILE)}")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show the output of the operations")
+    parser.add_argument("--run-operation", help=argparse.SUPPRESS)
+    parser.add_argument("--sandbox", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_operation:
+        # Child: the operation's own output goes to stderr, the measurements to stdout
+        stdout = os.dup(1)
+        os.dup2(2, 1)
+        result = run_operation(args.run_operation, args.sandbox)
+        sys.stdout.flush()
+        os.dup2(stdout, 1)
+        print(json.dumps(result))
+        return 0
+
+    bin_dir = tempfile.mkdtemp(prefix="ops-bench-bin-")
+    server = None
+    try:
+        make_stubs(bin_dir)
+        try:
+            server = FakeNtpServer(delay=args.latency / 1000)
+        except OSError as e:
+            print(f"[WARN] Fake NTP server unavailable ({e}): date-sync will time out")
+        summary = summarize([run_sequence(args, bin_dir) for _ in range(args.runs)])
+    finally:
+        if server:
+            server.close()
+        shutil.rmtree(bin_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(summary))
+        return 0
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"[INFO] Baseline saved in {BASELINE_FILE}")
+    baseline = {}
+    try:
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        print("[WARN] No baseline yet (--save-baseline)")
+    return 1 if compare(summary, baseline, args.tolerance) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
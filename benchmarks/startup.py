@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Startup-time budget for the entry points that run constantly (menu, hourly
+date-sync timer, automation).
+
+Each entry point is started in a fresh interpreter with `python -X importtime`,
+from the source tree or, for the systemd services, from a tree built the way
+tools.deploy installs it (with precompiled bytecode);
+the import time it adds on top of a bare interpreter (best of --runs) must stay
+within its budget, and modules that belong to specific actions must not be
+imported at startup. Exits with 1 on any regression.
+
+    python3 benchmarks/startup.py [--runs 7] [--scale 1.0]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Force Python not to create .pyc files
+sys.dont_write_bytecode = True
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from tools import deploy
+
+# name: (run from "source" or "installed", code run at startup, import budget in ms, modules that must not be loaded)
+ENTRY_POINTS = {
+    "tools package": (
+        "source",
+        "import tools",
+        8.0,
+        ["yaml", "socket", "subprocess", "concurrent.futures", "tools.network", "tools.service"],
+    ),
+    "main.py until the menu": (
+        "source",
+        "import main; main.load_config('settings.yaml')",
+        25.0,
+        ["yaml", "socket", "subprocess", "concurrent.futures", "typing", "tools.network", "tools.service"],
+    ),
+    "network module": (
+        "source",
+        "import tools.network",
+        75.0,
+        ["tools.probe", "tools.monitor", "tools.adaptive", "tools.dns", "tools.netinfo", "tools.processes"],
+    ),
+    "date-sync service": (
+        "installed",
+        "import tools.date.script as s; s.AjustDate.load_config(object.__new__(s.AjustDate), 'settings.yaml')",
+        60.0,
+        ["yaml", "ctypes", "argparse", "tools.network"],
+    ),
+}
+
+
+def measure(code: str, cwd: str):
+    """
+    Runs code with -X importtime in a new interpreter.
+    Returns (total import time in ms, set of imported modules).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    total = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.add(name.strip())
+        # Top-level entries already include their children
+        if not name[1:].startswith(" "):
+            total += int(cumulative)
+    return total / 1000.0, modules
+
+
+def best_of(code: str, runs: int, cwd: str = PROJECT_DIR):
+    samples = [measure(code, cwd) for _ in range(runs)]
+    return min(t for t, _ in samples), set.union(*(m for _, m in samples))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the import-time budget of the entry points.")
+    parser.add_argument("--runs", type=int, default=7, help="interpreter starts per entry point (best is kept)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget (slow machines)")
+    args = parser.parse_args(argv)
+
+    baseline, baseline_modules = best_of("pass", args.runs)
+    print(f"bare interpreter: {baseline:.1f} ms of imports\n")
+    print(f"{'entry point':<26}{'imports (ms)':>14}{'budget (ms)':>13}  result")
+
+    installed = tempfile.mkdtemp(prefix="startup-bench-")
+    try:
+        if not deploy.build(installed):
+            print("[ERROR] Failed to build the installed layout")
+            return 1
+        failed = run(args, baseline, baseline_modules, installed)
+    finally:
+        shutil.rmtree(installed, ignore_errors=True)
+    return 1 if failed else 0
+
+
+def run(args, baseline: float, baseline_modules: set, installed: str) -> bool:
+    failed = False
+    for name, (where, code, budget, forbidden) in ENTRY_POINTS.items():
+        elapsed, modules = best_of(code, args.runs, installed if where == "installed" else PROJECT_DIR)
+        added = max(0.0, elapsed - baseline)
+        budget *= args.scale
+        loaded = sorted(m for m in forbidden if m in modules - baseline_modules)
+        ok = added <= budget and not loaded
+        failed |= not ok
+        print(f"{name:<26}{added:>14.1f}{budget:>13.1f}  {'OK' if ok else 'FAIL'}")
+        if loaded:
+            print(f"{'':<26}loaded at startup: {', '.join(loaded)}")
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,28 @@
 #!/usr/bin/env python3
 import os
 import sys
-from typing import List
+from functools import partial
 
-import yaml
 # Force Python not to create .pyc files
 sys.dont_write_bytecode = True
 
+# The tools package is lazy: each action imports only the modules it needs
 try:
-    from .tools import NetworkManager, ModelService, MyService, create_service_date, create_timer_date
+    from . import tools
 except Exception:
-    from tools import NetworkManager, ModelService, MyService, create_service_date, create_timer_date
+    import tools
 
 def load_config(name_file):
     local_dir = os.path.dirname(os.path.abspath(__file__))
     file_path=os.path.join(local_dir, name_file)
     if os.path.exists(file_path):
         try:
-            with open(file_path, "r") as f:
-                return yaml.safe_load(f)
-        except:
+            return tools.config.load_yaml(file_path) or {}
+        except Exception:
             print(f"[WARN] Failed to read {file_path}")
     return {}
 
-def menu(menu_options: List[str]):
+def menu(menu_options: list):
     print("\n\n==========   Menu   ==========")
     for i, option in enumerate(menu_options):
         print(f" {i} - {option}")
@@ -36,34 +35,267 @@ def menu(menu_options: List[str]):
     return opcao
 
 
-def main(args):
+class Actions:
     """
-    Configura todos os serviços definidos na lista.
+    Everything the menu and the command line can do. Each action prints its progress
+    and returns a JSON-serializable result with at least "ok".
+    The network manager and the unit set are built on first use and shared.
     """
-    settings = args[0] or {}
-    manager = NetworkManager(
-        dns_servers=settings.get("dns_servers"),
-        ping_host=settings.get("ping_host"),
-        resolv_conf=settings.get("resolv_conf")
-    )
+    def __init__(self, settings: dict, prefix: str, destination_path: str):
+        self.settings = settings or {}
+        self.prefix = prefix
+        self.destination_path = destination_path
+        # dns_forwarder: true | {listen: 127.0.1.53}
+        forwarder = self.settings.get("dns_forwarder")
+        self.forwarder_address = None
+        if forwarder:
+            self.forwarder_address = forwarder.get("listen", "127.0.1.53") if isinstance(forwarder, dict) else "127.0.1.53"
+        self._manager = None
+        self._services = None
 
-    my_model = MyService(args[1], args[2])
+    def install_dir(self):
+        """
+        install_dir: root-owned copy with precompiled bytecode the units run from (false: run from this tree).
+        """
+        install_dir = self.settings.get("install_dir", True)
+        if install_dir is True:
+            return tools.deploy.INSTALL_DIR
+        return install_dir or os.path.dirname(os.path.abspath(__file__))
 
-    DATE_SYNC='date-sync'
-    serv_date = my_model.create_service(DATE_SYNC, create_service_date)
-    timer_date = my_model.create_timer(DATE_SYNC, create_timer_date, serv_date.name)
+    def enable_broker(self):
+        if self.settings.get("privilege_broker", True):
+            # Elevate once: all privileged commands go through one root helper,
+            # which may only change the files this tool manages
+            tools.privileged.enable_broker(managed=[
+                self.destination_path,
+                self.install_dir(),
+                self.settings.get("resolv_conf") or "/etc/resolv.conf",
+                tools.network.APT_LOCK_FILE,
+            ])
 
-    services: List[ModelService]  = [
-        serv_date,
-    ]
+    @property
+    def manager(self):
+        if self._manager is None:
+            self.enable_broker()
+            self._manager = tools.NetworkManager(
+                dns_servers=self.settings.get("dns_servers"),
+                ping_host=self.settings.get("ping_host"),
+                resolv_conf=self.settings.get("resolv_conf"),
+                native_probe=self.settings.get("native_probe", False),
+                forwarder_address=self.forwarder_address,
+                latency_ms=self.settings.get("probe_latency_ms"),
+            )
+        return self._manager
+
+    def services(self):
+        """
+        Returns (my_model, services_install, services_uinstall), built on first use.
+        """
+        if self._services is not None:
+            return self._services
+        self.enable_broker()
+        install_dir = self.install_dir()
+        my_model = tools.MyService(self.prefix, self.destination_path)
+
+        DATE_SYNC='date-sync'
+        date_daemon = self.settings.get("date_sync_daemon", False)
+        if date_daemon:
+            # Resident service with adaptive NTP polling instead of the hourly timer
+            serv_date = my_model.create_service(DATE_SYNC, partial(tools.create_daemon_date, install_dir), auto_init=True)
+        else:
+            serv_date = my_model.create_service(DATE_SYNC, partial(tools.create_service_date, install_dir))
+        timer_date = my_model.create_timer(DATE_SYNC, tools.create_timer_date, serv_date.name)
+
+        services = [
+            serv_date,
+        ]
+
+        if self.forwarder_address:
+            create_forwarder = partial(
+                tools.create_service_dns_forwarder,
+                self.manager.dns_servers,
+                self.manager.forwarder_address,
+                install_dir,
+            )
+            services.append(my_model.create_service("dns-forwarder", create_forwarder, auto_init=True))
+
+        timers = [
+            timer_date,
+        ]
+
+        # Order does not matter: MyService.apply orders the units by their `depende` DAG
+        services_uinstall = services + timers
+        # In daemon mode the timer is only uninstalled (left over from timer mode)
+        services_install = services + ([] if date_daemon else timers)
+        self._services = (my_model, services_install, services_uinstall)
+        return self._services
+
+    def install(self):
+        print("### Install and Config ###\n")
+        my_model, services_install, services_uinstall = self.services()
+        if self.settings.get("install_dir", True) and not tools.deploy.install(self.install_dir()):
+            print("[ERROR] Install aborted: the services would have nothing to run.")
+            return {"ok": False}
+        # One transaction: changed units copied, a single daemon-reload, grouped enable/restart
+        if not my_model.apply(services_install, services_uinstall):
+            print("[ERROR] Failed to install the services.")
+            return {"ok": False}
+        return {"ok": True, "units": [service.name for service in services_install]}
+
+    def uninstall(self):
+        print("### Uninstalling ###\n")
+        my_model, _, services_uinstall = self.services()
+        names = [service.name for service in services_uinstall]
+        if not my_model.apply([], services_uinstall):
+            return {"ok": False}
+        print(f"Uninstall: {', '.join(names)}")
+        return {"ok": True, "units": names}
+
+    def plan(self):
+        """
+        What "install" would change, without touching anything.
+        """
+        my_model, services_install, services_uinstall = self.services()
+        result = {"ok": True}
+        if self.settings.get("install_dir", True):
+            install_dir = self.install_dir()
+            result["install_dir"] = "unchanged" if tools.deploy.up_to_date(install_dir) else "install"
+            print(f"[PLAN] {install_dir}: {result['install_dir']}")
+        result["units"] = my_model.changes(services_install, services_uinstall)
+        result["commands"] = my_model.plan(services_install, services_uinstall, result["units"])
+        for name, action in result["units"].items():
+            print(f"[PLAN] {name}: {action}")
+        for argv in result["commands"]:
+            print(f"[PLAN] {' '.join(argv)}")
+        return result
+
+    def dns(self):
+        config_result = self.manager.configure_dns()
+        if config_result is None:
+            print("[INFO] Configuration already applied.")
+        else:
+            print(f"[RESULT] Configuration completed: {'Yes' if config_result else 'No'}")
+        return {"ok": config_result is not False, "changed": bool(config_result)}
+
+    def check(self):
+        return {"ok": self.manager.check_connection()}
+
+    def apt_lock(self):
+        return {"ok": self.manager.check_proccess_lock()}
+
+    def benchmark_dns(self):
+        results = self.manager.benchmark_dns(
+            names=self.settings.get("dns_benchmark_names"),
+            rewrite=self.settings.get("dns_benchmark_rewrite", False),
+        )
+        return {"ok": True, "servers": [result.to_dict() for result in results]}
+
+    def monitor(self):
+        self.manager.monitor(
+            interval=self.settings.get("monitor_interval", 10),
+            textfile=self.settings.get("monitor_textfile"),
+            socket_path=self.settings.get("monitor_socket"),
+            adaptive=self.settings.get("monitor_adaptive", False),
+        )
+        return {"ok": True}
+
+    def status(self):
+        # One `systemctl show` for every managed unit
+        my_model, _, services_uinstall = self.services()
+        rows = my_model.status(services_uinstall)
+        print(tools.service.status_table(rows))
+        return {"ok": True, "units": rows}
+
+
+# Command line actions -> Actions method. Actions of the same group touch the same
+# state and run one after another, in the order given; groups run concurrently.
+CLI_ACTIONS = {
+    "install": ("install", "units"),
+    "uninstall": ("uninstall", "units"),
+    "plan": ("plan", "units"),
+    "status": ("status", "units"),
+    "dns": ("dns", "network"),
+    "check": ("check", "network"),
+    "benchmark-dns": ("benchmark_dns", "network"),
+    "apt-lock": ("apt_lock", "apt"),
+}
+
+
+def run_actions(actions: Actions, names: list) -> list:
+    """
+    Runs the named CLI actions, independent groups concurrently.
+    Returns one {"action", "ok", "seconds", ...} dict per action, in the order given.
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    groups = {}
+    for index, name in enumerate(names):
+        groups.setdefault(CLI_ACTIONS[name][1], []).append((index, name))
+
+    def run_group(group):
+        results = []
+        for index, name in group:
+            start = time.monotonic()
+            try:
+                result = getattr(actions, CLI_ACTIONS[name][0])()
+            except Exception as e:
+                print(f"[ERROR] {name}: {e}")
+                result = {"ok": False, "error": str(e)}
+            results.append((index, dict({"action": name}, seconds=round(time.monotonic() - start, 3), **result)))
+        return results
+
+    # Shared state is set up before the threads start
+    if "units" in groups:
+        actions.services()
+    if "network" in groups:
+        actions.manager
+    with ThreadPoolExecutor(max_workers=len(groups) or 1) as executor:
+        done = [item for results in executor.map(run_group, groups.values()) for item in results]
+    return [result for _, result in sorted(done, key=lambda item: item[0])]
+
+
+def cli(argv: list, prefix: str, destination_path: str) -> int:
+    """
+    Non-interactive entry point: `main.py [--config FILE] [--json] ACTION [ACTION ...]`.
+    Returns the exit status: 0 when every action succeeded.
+    """
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="Install the services and check/configure the network, without the menu.")
+    parser.add_argument("actions", nargs="+", choices=list(CLI_ACTIONS), metavar="ACTION", help=", ".join(CLI_ACTIONS))
+    parser.add_argument("--config", default="settings.yaml")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON (progress goes to stderr)")
+    args = parser.parse_args(argv)
+
+    stdout = None
+    if args.json:
+        # Everything else, including the output of child processes, goes to stderr
+        sys.stdout.flush()
+        stdout = os.dup(1)
+        os.dup2(2, 1)
+    try:
+        results = run_actions(Actions(load_config(args.config), prefix, destination_path), list(dict.fromkeys(args.actions)))
+    finally:
+        if stdout is not None:
+            sys.stdout.flush()
+            os.dup2(stdout, 1)
+            os.close(stdout)
+    ok = all(result["ok"] for result in results)
+    if args.json:
+        print(json.dumps({"ok": ok, "actions": results}, default=str))
+    else:
+        for result in results:
+            print(f"[{'OK' if result['ok'] else 'FAIL'}] {result['action']} ({result['seconds']:.3f}s)")
+    return 0 if ok else 1
+
+
+def main(args):
+    """
+    Configura todos os serviços definidos na lista.
+    """
+    actions = Actions(args[0], args[1], args[2])
 
-    timers: List[ModelService]  = [
-        timer_date,
-    ]
-    
-    services_uinstall = timers + services
-    services_install = services + timers
-    
     MENU_TEXT = [
         "Exit",
         "Install all",
@@ -71,60 +303,44 @@ def main(args):
         "Configure DNS",
         "Check Connecton",
         "Check apt Lock proccess",
+        "Benchmark DNS servers",
+        "Monitor connection",
+        "Show install plan",
+        "Show service status",
+    ]
+    MENU_ACTIONS = [
+        None,
+        actions.install,
+        actions.uninstall,
+        actions.dns,
+        actions.check,
+        actions.apt_lock,
+        actions.benchmark_dns,
+        actions.monitor,
+        actions.plan,
+        actions.status,
     ]
 
     while True:
         opcao = menu(MENU_TEXT)
         print()
         if opcao == 0:
-          print("Log out of the system...")
-          break  
-      
-        elif opcao == 1:
-            print()
-            print("### Install and Config ###\n")
-            services_success = []
-            for service in services_uinstall:
-                service.uninstall()
-                
-            for service in services_install:
-                if service.create():
-                    services_success.append(service.name)
-                                    
-            if services_success != []:
-                for service in services_install:
-                    if service.name in services_success:
-                        service.install()
-            print()
-            
-        elif opcao == 2:
-            print()
-            print("### Uninstalling ###\n")
-            for service in services_uinstall:
-                if service.uninstall():
-                    print(f"Uninstall: {service.name}")
-            print()
-            
-        elif opcao == 3:
-            config_result = manager.configure_dns()
-            if config_result is None:
-                print("[INFO] Configuration already applied.")
-            else:
-                print(f"[RESULT] Configuration completed: {'Yes' if config_result else 'No'}")
-        elif opcao == 4:
-           manager.check_connection()
-        
-        elif opcao == 3:
-            manager.check_proccess_lock()
+            print("Log out of the system...")
+            break
+        MENU_ACTIONS[opcao]()
+        print()
 
 if __name__ == "__main__":
     PREFIX_NAME_SERVICE = "system"
     DESTINATION_PATH = "/etc/systemd/system/"
     
     config="settings.yaml"
-    
+
+    if len(sys.argv) > 1:
+        sys.exit(cli(sys.argv[1:], PREFIX_NAME_SERVICE, DESTINATION_PATH))
+
     main([
         load_config(config),
         PREFIX_NAME_SERVICE,
         DESTINATION_PATH
-    ])
\ No newline at end of file
+    ])
@@ -0,0 +1,47 @@
+import os
+import stat
+import sys
+
+import pytest
+
+# Force Python not to create .pyc files
+sys.dont_write_bytecode = True
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+
+class FakeBin:
+    """
+    Directory of stand-in executables, first on PATH. Every call is appended
+    to `log` as one "name args..." line.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.log = os.path.join(path, "calls.log")
+
+    def add(self, name: str, body: str = "exit 0\n") -> str:
+        executable = os.path.join(self.path, name)
+        with open(executable, "w") as f:
+            f.write(f'#!/bin/sh\necho "{name} $*" >> "{self.log}"\n{body}')
+        os.chmod(executable, os.stat(executable).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        return executable
+
+    def calls(self):
+        try:
+            with open(self.log) as f:
+                return [line.rstrip("\n") for line in f]
+        except FileNotFoundError:
+            return []
+
+
+@pytest.fixture
+def fake_bin(tmp_path, monkeypatch):
+    directory = tmp_path / "bin"
+    directory.mkdir()
+    monkeypatch.setenv("PATH", f"{directory}{os.pathsep}{os.environ.get('PATH', '')}")
+    fake = FakeBin(str(directory))
+    # sudo only runs the command: privileged fallbacks stay inside the test
+    fake.add("sudo", 'exec "$@"\n')
+    return fake
@@ -0,0 +1,74 @@
+import os
+import re
+
+import pytest
+
+from conftest import PROJECT_DIR
+from tools import config
+
+yaml = pytest.importorskip("yaml")
+
+SETTINGS_FILES = [
+    os.path.join(PROJECT_DIR, "settings.yaml"),
+    os.path.join(PROJECT_DIR, "tools", "date", "settings.yaml"),
+]
+
+
+def readme_example() -> str:
+    with open(os.path.join(PROJECT_DIR, "README.md")) as f:
+        return re.search(r"```yaml\n(.*?)```", f.read(), re.DOTALL).group(1)
+
+
+@pytest.mark.parametrize("path", SETTINGS_FILES, ids=os.path.basename)
+def test_bundled_settings_match_pyyaml(path):
+    with open(path) as f:
+        text = f.read()
+    assert config.parse_simple_yaml(text) == yaml.safe_load(text)
+
+
+def test_readme_example_matches_pyyaml():
+    text = readme_example()
+    assert config.parse_simple_yaml(text) == yaml.safe_load(text)
+
+
+@pytest.mark.parametrize("text", [
+    "a: 1\nb: -2\nc: 1.5\nd: .5\ne: 007x\n",
+    "a: true\nb: False\nc: NO\nd: on\ne: ~\nf: null\ng:\n",
+    "a: 'quoted # not a comment'\nb: \"x\"  # comment\nc: plain text # comment\n",
+    "list:\n  - 1\n  - two\n  -\nmap:\n  x: 1\n  y: yes\n",
+    "# only a comment\n",
+    "a: http://example.com/x\n",
+])
+def test_subset_matches_pyyaml(text):
+    assert (config.parse_simple_yaml(text) or None) == yaml.safe_load(text)
+
+
+@pytest.mark.parametrize("text", [
+    "a: 0x1F\n",
+    "a: 010\n",
+    "a: 1_000\n",
+    "a: 1:30\n",
+    "a: 2024-01-01\n",
+    "a: .inf\n",
+    "a: tRUE\n",
+    "a: \"esc\\n\"\n",
+    "a: 'it''s'\n",
+    "a: [1, 2]\n",
+    "a: b: c\n",
+    "a:\n  b:\n    c: 1\n",
+    "a: 1\na: 2\n",
+    "---\na: 1\n",
+])
+def test_outside_the_subset_is_left_to_pyyaml(text, tmp_path):
+    with pytest.raises(ValueError):
+        config.parse_simple_yaml(text)
+    path = tmp_path / "settings.yaml"
+    path.write_text(text)
+    # load_yaml falls back to PyYAML: same result or the same error
+    try:
+        expected = yaml.safe_load(text)
+    except yaml.YAMLError:
+        with pytest.raises(yaml.YAMLError):
+            config.load_yaml(str(path))
+    else:
+        assert config.load_yaml(str(path)) == expected
@@ -0,0 +1,38 @@
+from tools.date.script import PollInterval
+
+
+def climb(poll: PollInterval, offset: float = 0.0005):
+    """
+    Feeds stable offsets until the interval reaches its maximum.
+    Returns the intervals seen on the way.
+    """
+    seen = []
+    while poll.exp < poll.max_exp:
+        seen.append(poll.update(offset))
+        assert len(seen) < 100
+    return seen
+
+
+def test_stable_offsets_lengthen_the_interval():
+    poll = PollInterval()
+    assert poll.seconds == 64
+    seen = climb(poll)
+    assert seen == sorted(seen)
+    assert seen[-1] == 1024
+
+
+def test_failure_then_successes_converge_again_from_the_minimum():
+    poll = PollInterval()
+    first = climb(poll)
+    assert poll.failed() == 64
+    # The next successes stay short instead of jumping back to 1024 s
+    assert poll.update(0.0005) == 64
+    assert poll.update(0.0005) == 64
+    assert 2 + len(climb(poll)) == len(first)
+
+
+def test_a_stepped_offset_goes_back_to_the_minimum():
+    poll = PollInterval()
+    climb(poll)
+    assert poll.update(10.0) == 64
+    assert poll.jitter is None
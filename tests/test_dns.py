@@ -0,0 +1,146 @@
+import socket
+import struct
+import threading
+
+import pytest
+
+from tools import dns
+from tools.dns_forwarder.script import DnsCache, DnsForwarder
+
+
+def answer(query: bytes, ttl: int = 300, rcode: int = dns.RCODE_NOERROR) -> bytes:
+    """
+    Response to query with one A record (192.0.2.1), name compressed to the question.
+    """
+    end = 12 + len(dns.encode_name(dns.parse_question(query)[0])) + 4
+    header = struct.pack("!HHHHHH", struct.unpack("!H", query[:2])[0], dns.FLAG_QR | dns.FLAG_RD | 0x0080 | rcode, 1, 1, 0, 0)
+    record = struct.pack("!HHHIH", 0xC00C, dns.QTYPE_A, dns.QCLASS_IN, ttl, 4) + socket.inet_aton("192.0.2.1")
+    return header + query[12:end] + record
+
+
+def with_opt(query: bytes, payload: int = 1232, dnssec_ok: bool = False) -> bytes:
+    data = bytearray(query)
+    struct.pack_into("!H", data, 10, 1)
+    return bytes(data) + b"\x00" + struct.pack("!HHIH", dns.QTYPE_OPT, payload, dns.EDNS_DO if dnssec_ok else 0, 0)
+
+
+class StubServer:
+    """
+    UDP nameserver on 127.0.0.1 answering every query with answer(); keeps what it received.
+    """
+    def __init__(self):
+        self.queries = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                data, peer = self.sock.recvfrom(4096)
+            except OSError:
+                return
+            self.queries.append(data)
+            self.sock.sendto(answer(data), peer)
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+QUERY = dns.build_query("Example.COM", query_id=0x1234)
+
+
+@pytest.mark.parametrize("message", [
+    b"",
+    QUERY[:11],
+    QUERY[:12],
+    QUERY[:15],
+    QUERY[:-2],
+    QUERY[:12] + b"\x3f" + b"a" * 4,
+    QUERY[:4] + b"\x00\x00" + QUERY[6:],
+])
+def test_question_of_malformed_messages(message):
+    with pytest.raises(ValueError):
+        dns.parse_question(message)
+
+
+def test_question():
+    assert dns.parse_question(QUERY) == ("example.com", dns.QTYPE_A, dns.QCLASS_IN)
+
+
+@pytest.mark.parametrize("cut", [1, 4, 10, 14])
+def test_truncated_answers_are_not_cached(cut):
+    response = answer(QUERY)[:-cut]
+    with pytest.raises(ValueError):
+        dns.cache_ttl(response)
+    cache = DnsCache()
+    cache.put(("example.com", 1, 1), response)
+    assert len(cache) == 0
+
+
+def test_compression_loop():
+    message = bytearray(answer(QUERY))
+    # The question name points at itself
+    message[12:14] = b"\xC0\x0C"
+    with pytest.raises(ValueError):
+        dns.parse_question(bytes(message))
+
+
+def test_query_options():
+    assert dns.query_options(QUERY) == (0, False, False)
+    assert dns.query_options(with_opt(QUERY, 4096, dnssec_ok=True)) == (4096, True, False)
+    with pytest.raises(ValueError):
+        dns.query_options(with_opt(QUERY)[:-3])
+
+
+def test_cache_ttl_and_aging():
+    response = answer(QUERY, ttl=120)
+    assert dns.cache_ttl(response) == 120
+    aged = dns.age_response(response, 0x9999, 20)
+    assert aged[:2] == b"\x99\x99"
+    assert dns.cache_ttl(aged) == 100
+
+
+def test_forwarder_caches_per_edns_options(stub_server):
+    forwarder = DnsForwarder(["127.0.0.1"], port=stub_server.port, timeout=1.0)
+    plain = forwarder.resolve(QUERY)
+    assert dns.parse_header(plain)[0] == 0x1234
+    assert forwarder.resolve(dns.build_query("example.com", query_id=7))[:2] == b"\x00\x07"
+    assert len(stub_server.queries) == 1
+
+    # Asking for DNSSEC records must not be answered from the plain entry
+    forwarder.resolve(with_opt(QUERY, dnssec_ok=True))
+    forwarder.resolve(with_opt(QUERY, dnssec_ok=True))
+    assert len(stub_server.queries) == 2
+    assert forwarder.cache.hits == 2
+
+
+def test_forwarder_ignores_malformed_queries(stub_server):
+    forwarder = DnsForwarder(["127.0.0.1"], port=stub_server.port, timeout=1.0)
+    for message in (b"", QUERY[:15], with_opt(QUERY)[:-3]):
+        assert forwarder.resolve(message) is None
+    assert stub_server.queries == []
+
+
+def test_benchmark_against_a_stub_server(stub_server):
+    result = dns.benchmark_server("127.0.0.1", ["example.com", "example.org"], port=stub_server.port, timeout=1.0, repeats=2)
+    assert result.queries == 6
+    assert result.failures == 0
+    assert len(result.cold) == 2 and len(result.warm) == 4
+    assert result.transports == {"udp": 6}
+
+
+def test_servers_are_ranked_fastest_first(stub_server):
+    # Nothing listens on 127.0.0.2: every query is refused over UDP and TCP
+    results = dns.benchmark_servers(["127.0.0.2", "127.0.0.1"], ["example.com"], port=stub_server.port, timeout=1.0, repeats=1)
+    assert [result.server for result in results] == ["127.0.0.1", "127.0.0.2"]
+    assert results[1].failure_rate == 100.0
+    assert dns.suggest_resolver_options(results) == {"timeout": 1, "attempts": 3}
@@ -0,0 +1,121 @@
+import subprocess
+import sys
+import time
+
+from conftest import PROJECT_DIR
+from tools import network
+
+# Replies with icmp_seq 1..count every $interval seconds (-i), or loses them all
+PING = """
+count=1 interval=1
+while [ $# -gt 1 ]; do
+  case "$1" in -c) count=$2; shift;; -i) interval=$2; shift;; esac
+  shift
+done
+echo "PING $1 ($1) 56(84) bytes of data."
+i=1
+while [ $i -le $count ]; do
+  case "$1" in down*) ;; *) echo "64 bytes from $1: icmp_seq=$i ttl=64 time=0.$i ms";; esac
+  [ $i -lt $count ] && sleep "$interval"
+  i=$((i + 1))
+done
+echo "$count packets transmitted"
+"""
+
+
+def test_hosts_are_checked_in_parallel_and_returned_in_order(fake_bin):
+    fake_bin.add("ping", PING)
+    hosts = ["first", "second", "down", "fourth"]
+    started = time.monotonic()
+    results = network.check_hosts_concurrently(hosts, attempts=3, timeout=10.0)
+    # Each host takes about 1 s (3 packets, 0.5 s apart); one after another would take 4 s
+    assert time.monotonic() - started < 2.5
+    assert [result.host for result in results] == hosts
+    assert [result.ok for result in results] == [True, True, False, True]
+
+
+def test_expired_deadline_gives_a_failed_result(fake_bin):
+    fake_bin.add("ping", PING)
+    result = network.check_internet_connection("host", timeout=0, output=[])
+    assert not result.ok
+    assert result.error == "deadline reached"
+    assert fake_bin.calls() == []
+
+
+def test_queued_host_past_the_shared_deadline(fake_bin):
+    fake_bin.add("ping", PING)
+    # The second host only starts once the first one used the whole budget
+    results = network.check_hosts_concurrently(["slow", "queued"], attempts=5, timeout=0.5, max_workers=1)
+    assert [result.host for result in results] == ["slow", "queued"]
+    assert not results[1].ok
+    assert results[1].error == "deadline reached"
+
+
+def test_stops_once_the_threshold_is_reached(fake_bin):
+    fake_bin.add("ping", PING)
+    started = time.monotonic()
+    result = network.check_internet_connection("host", attempts=5, interval=0.1, output=[])
+    assert result.ok
+    assert result.stopped_early
+    assert result.rtts == [0.1, 0.2, 0.3, 0.4]
+    assert time.monotonic() - started < 2.0
+
+
+def test_unreachable_host(fake_bin):
+    fake_bin.add("ping", PING)
+    result = network.check_internet_connection("down", attempts=3, interval=0.05, wait=0.2, output=[])
+    assert not result.ok
+    assert result.received == 0
+
+
+def test_resolv_conf_keeps_the_upstreams_behind_the_forwarder(tmp_path):
+    manager = network.NetworkManager(
+        dns_servers=["192.0.2.1", "192.0.2.2", "192.0.2.3"],
+        resolv_conf=str(tmp_path / "resolv.conf"),
+        forwarder_address="127.0.1.53",
+    )
+    assert manager.resolv_servers == ["127.0.1.53", "192.0.2.1", "192.0.2.2"]
+
+
+def pinged(fake_bin):
+    # host -> packet count of every ping, in call order
+    counts = {}
+    for call in fake_bin.calls():
+        if call.startswith("ping "):
+            args = call.split()
+            counts.setdefault(args[-1], []).append(int(args[args.index("-c") + 1]))
+    return counts
+
+
+def test_check_connection_sends_one_light_probe_per_healthy_host(fake_bin):
+    fake_bin.add("ping", PING)
+    manager = network.NetworkManager(dns_servers=["192.0.2.1", "down"], ping_host="host")
+    assert manager.check_connection(percentage_of_correct=60.0)
+    # Only the host that lost its light probe is escalated to dense probing
+    assert pinged(fake_bin) == {"host": [1], "192.0.2.1": [1], "down": [1, 5]}
+    assert manager.scheduler.hosts["host"].baseline == 0.1
+
+    manager.check_connection()
+    assert pinged(fake_bin)["host"] == [1, 1]
+
+
+def test_check_connection_escalates_on_latency(fake_bin):
+    fake_bin.add("ping", PING)
+    # The stub answers in 0.1 ms
+    manager = network.NetworkManager(dns_servers=["192.0.2.1"], ping_host="host", latency_ms=0.05)
+    manager.check_connection()
+    assert pinged(fake_bin) == {"host": [1, 5], "192.0.2.1": [1, 5]}
+
+
+def test_check_connection_without_adaptive_probing(fake_bin):
+    fake_bin.add("ping", PING)
+    manager = network.NetworkManager(dns_servers=["192.0.2.1"], ping_host="host")
+    assert manager.check_connection(adaptive=False, concurrent=False)
+    assert pinged(fake_bin) == {"host": [5], "192.0.2.1": [5]}
+    assert manager.scheduler is None
+
+
+def test_other_tools_modules_are_loaded_on_first_use():
+    code = "import sys, tools.network; print(' '.join(sorted(m for m in sys.modules if m.startswith('tools'))))"
+    loaded = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, capture_output=True, text=True, check=True).stdout.split()
+    assert loaded == ["tools", "tools.network", "tools.privileged"]
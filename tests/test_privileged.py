@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tools import privileged
+
+# Answers the first request, then exits as if it crashed
+DYING_HELPER = """
+import json, subprocess, sys
+request = json.loads(sys.stdin.readline())
+subprocess.run(request["argv"])
+print(json.dumps({"id": request["id"], "returncode": 0, "stdout": "", "stderr": ""}), flush=True)
+"""
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    def enable(command):
+        monkeypatch.setattr(privileged, "_broker", privileged.PrivilegeBroker(command))
+        return privileged._broker
+    yield enable
+    privileged.disable_broker()
+
+
+@pytest.fixture
+def helper(tmp_path, broker):
+    managed = tmp_path / "managed"
+    source = tmp_path / "source"
+    managed.mkdir()
+    source.mkdir()
+    (source / "unit").write_text("unit\n")
+    broker([sys.executable, privileged.HELPER_PATH, "--serve", "--manage", str(managed), "--source", str(source)])
+    return managed, source
+
+
+def test_fallback_runs_only_unanswered_commands(tmp_path, fake_bin, broker):
+    log = tmp_path / "ran"
+    instance = broker([sys.executable, "-c", DYING_HELPER])
+    commands = [["sh", "-c", f"echo {i} >> {log}"] for i in range(3)]
+    results = privileged.run_many(commands)
+    assert [result.returncode for result in results] == [0, 0, 0]
+    assert log.read_text().split() == ["0", "1", "2"]
+    assert privileged._broker is None
+    assert instance._process is None
+
+
+def test_check_stops_the_batch_at_the_first_failure(helper):
+    managed, source = helper
+    commands = [["rm", str(managed / "missing")], ["cp", str(source / "unit"), str(managed)]]
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        privileged.run_many(commands, check=True, capture=True)
+    assert error.value.cmd == commands[0]
+    assert os.listdir(managed) == []
+
+    results = privileged.run_many(commands, capture=True)
+    assert [result.returncode for result in results] == [1, 0]
+    assert os.listdir(managed) == ["unit"]
+
+
+@pytest.mark.parametrize("argv", [
+    ["rm", "-rf", "{managed}"],
+    ["rm", "-f", "{managed}/../outside"],
+    ["cp", "/etc/passwd", "{managed}"],
+    ["cp", "{source}/unit", "/etc/"],
+    ["cp", "-rt", "/etc", "{source}/unit"],
+    ["mv", "{source}/unit", "/tmp/outside"],
+    ["chattr", "+i", "/etc/passwd"],
+    ["kill", "-9", "1"],
+    ["sh", "-c", "true"],
+])
+def test_helper_refuses_paths_it_does_not_manage(helper, argv):
+    managed, source = helper
+    argv = [arg.format(managed=managed, source=source) for arg in argv]
+    result = privileged.run_privileged(argv, capture=True)
+    assert result.returncode == 126
+    assert "not allowed" in result.stderr
+
+
+def test_policy_without_managed_paths_refuses_every_file_command():
+    policy = privileged.Policy()
+    assert policy.refusal(["rm", "-f", "/etc/resolv.conf"])
+    assert policy.refusal(["cp", "a", "/etc/systemd/system"])
+    assert policy.refusal(["systemctl", "daemon-reload"]) is None
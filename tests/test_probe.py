@@ -0,0 +1,147 @@
+import socket
+
+import pytest
+
+from tools import probe
+from tools.probe import ProbeResult
+
+
+@pytest.fixture
+def no_icmp(monkeypatch):
+    # As with the default net.ipv4.ping_group_range ("1 0")
+    def denied(family):
+        raise PermissionError(1, "Operation not permitted")
+    monkeypatch.setattr(probe, "_icmp_socket", denied)
+
+
+@pytest.fixture
+def tcp_listener():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(16)
+    yield sock.getsockname()[1]
+    sock.close()
+
+
+@pytest.fixture
+def silent_udp_port():
+    # Bound but never answering: every datagram is lost
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    yield sock.getsockname()[1]
+    sock.close()
+
+
+def closed_port(kind: int) -> int:
+    with socket.socket(socket.AF_INET, kind) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_auto_falls_back_to_tcp_when_icmp_is_denied(no_icmp, tcp_listener):
+    result = probe.probe("127.0.0.1", count=3, interval=0.01, timeout=0.5, port=tcp_listener)
+    assert result.method == "tcp"
+    assert result.address == "127.0.0.1"
+    assert result.sent == result.received == 3
+    assert result.ok and result.error is None
+
+
+def test_tcp_reset_counts_as_a_reply(no_icmp):
+    result = probe.probe("127.0.0.1", count=2, interval=0.01, timeout=0.5, method="tcp", port=closed_port(socket.SOCK_STREAM))
+    assert result.received == 2
+
+
+def test_udp_port_unreachable_counts_as_a_reply(no_icmp):
+    result = probe.probe("127.0.0.1", count=2, interval=0.01, timeout=0.5, method="udp", port=closed_port(socket.SOCK_DGRAM))
+    assert result.method == "udp"
+    assert result.received == 2
+
+
+def test_icmp_only_reports_the_denied_socket(no_icmp):
+    result = probe.probe("127.0.0.1", count=2, method="icmp")
+    assert result.method == "icmp"
+    assert result.received == 0
+    assert result.error.startswith("icmp socket unavailable")
+
+
+def test_icmp_echo_on_loopback():
+    try:
+        probe._icmp_socket(socket.AF_INET).close()
+    except OSError:
+        pytest.skip("unprivileged ICMP sockets not allowed (net.ipv4.ping_group_range)")
+    result = probe.probe("127.0.0.1", count=3, interval=0.01, timeout=0.5, method="icmp")
+    assert result.method == "icmp"
+    assert result.received == 3
+
+
+def test_stops_once_the_threshold_is_reached(no_icmp, tcp_listener):
+    result = probe.probe("127.0.0.1", count=10, interval=0.01, timeout=0.5, port=tcp_listener, threshold=20.0)
+    assert result.stopped_early
+    assert result.rtts and len(result.rtts) == 2
+    assert result.ok
+
+
+def test_stops_once_the_threshold_cannot_be_reached(no_icmp, silent_udp_port):
+    result = probe.probe("127.0.0.1", count=5, interval=0.0, timeout=0.05, method="udp", port=silent_udp_port, threshold=80.0)
+    assert result.stopped_early
+    assert result.rtts == [None, None]
+    assert not result.ok
+
+
+@pytest.mark.parametrize("received, lost, count, threshold, expected", [
+    (4, 0, 5, 80.0, True),
+    (3, 0, 5, 80.0, None),
+    (3, 1, 5, 80.0, None),
+    (3, 2, 5, 80.0, False),
+    (1, 0, 5, 20.0, True),
+    (0, 5, 5, 0.0, True),
+    (0, 0, 3, 100.0, None),
+])
+def test_settled(received, lost, count, threshold, expected):
+    assert probe.settled(received, lost, count, threshold) is expected
+
+
+def test_unknown_method_is_reported_in_the_result():
+    result = probe.probe("127.0.0.1", count=2, method="carrier-pigeon")
+    assert result.error == "unknown probe method: carrier-pigeon"
+    assert result.rtts == [None, None]
+    assert not result.ok
+
+
+def test_statistics_and_percentiles():
+    result = ProbeResult("host", "192.0.2.1", "icmp", [10.0, None, 20.0, 30.0, 40.0], threshold=80.0)
+    assert (result.sent, result.received) == (5, 4)
+    assert result.loss == 20.0
+    assert result.ok
+    assert (result.min, result.avg, result.max) == (10.0, 25.0, 40.0)
+    assert result.stddev == pytest.approx(11.1803, abs=1e-4)
+    assert result.percentile(0) == 10.0
+    assert result.percentile(50) == 25.0
+    assert result.percentile(90) == pytest.approx(37.0)
+    assert result.percentile(100) == 40.0
+    assert probe.percentile([], 50) is None
+
+
+def test_to_dict():
+    data = ProbeResult("host", "192.0.2.1", "tcp", [10.0, None, 30.0], threshold=50.0, stopped_early=True).to_dict()
+    assert data == {
+        "host": "host",
+        "address": "192.0.2.1",
+        "method": "tcp",
+        "sent": 3,
+        "received": 2,
+        "loss": pytest.approx(100 / 3),
+        "rtts": [10.0, None, 30.0],
+        "min": 10.0,
+        "avg": 20.0,
+        "max": 30.0,
+        "stddev": 10.0,
+        "p50": 20.0,
+        "p90": 28.0,
+        "p99": pytest.approx(29.8),
+        "ok": True,
+        "stopped_early": True,
+        "error": None,
+    }
+    empty = ProbeResult("host", None, "icmp", [None, None]).to_dict()
+    assert (empty["min"], empty["p50"], empty["ok"]) == (None, None, False)
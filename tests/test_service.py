@@ -0,0 +1,149 @@
+import os
+
+import pytest
+
+from tools.service import INSTALL, REMOVE, START, UNCHANGED, UPDATE, MyService
+
+# `show` reports every unit after `--` as enabled and running; any other
+# action listed in systemctl.fail exits 1
+SYSTEMCTL = """
+if [ "$1" = show ]; then
+  found=
+  for arg in "$@"; do
+    if [ -n "$found" ]; then printf 'Id=%s\\nActiveState=active\\nSubState=running\\nUnitFileState=enabled\\n\\n' "$arg"; fi
+    [ "$arg" = -- ] && found=1
+  done
+  exit 0
+fi
+grep -qx "$1" "$0.fail" 2>/dev/null && exit 1
+exit 0
+"""
+
+
+@pytest.fixture
+def units(tmp_path, fake_bin):
+    fake_bin.add("systemctl", SYSTEMCTL)
+    fake_bin.add("systemd-analyze")
+    destination = tmp_path / "system"
+    source = tmp_path / "units"
+    destination.mkdir()
+    source.mkdir()
+    my_model = MyService("test", str(destination))
+    contents = {"a": "[Unit]\nDescription=a\n", "b": "[Unit]\nDescription=b\n"}
+
+    def rendered(name):
+        return lambda *args: (contents[name], str(source))
+
+    def make():
+        return [my_model.create_service("a", rendered("a"), auto_init=True),
+                my_model.create_service("b", rendered("b"), "test-a.service", auto_init=True)]
+
+    def fail(action):
+        with open(os.path.join(fake_bin.path, "systemctl.fail"), "w") as f:
+            f.write(f"{action}\n")
+
+    return my_model, make, contents, destination, fake_bin, fail
+
+
+def systemctl_calls(fake_bin):
+    return [call for call in fake_bin.calls() if call.startswith("systemctl ")]
+
+
+def test_apply_installs_as_one_transaction(units):
+    my_model, make, _, destination, fake_bin, _ = units
+    assert my_model.changes(make()) == {"test-a.service": INSTALL, "test-b.service": INSTALL}
+    a, b = make()
+    # One cp and one daemon-reload for every unit
+    assert my_model.plan([a, b])[:2] == [
+        ["cp", a.source_path, b.source_path, str(destination)],
+        ["systemctl", "daemon-reload"],
+    ]
+    assert my_model.apply(make())
+    assert sorted(os.listdir(destination)) == ["test-a.service", "test-b.service"]
+    assert systemctl_calls(fake_bin) == [
+        "systemctl daemon-reload",
+        "systemctl enable --now test-a.service",
+        "systemctl enable --now test-b.service",
+    ]
+
+
+def test_removal_given_as_a_generator(units):
+    my_model, make, _, destination, _, _ = units
+    a, b = make()
+    assert my_model.apply([a, b])
+    a, b = make()
+    assert my_model.changes([a], iter([a, b])) == {"test-a.service": UNCHANGED, "test-b.service": REMOVE}
+    assert my_model.plan([a], (service for service in [a, b]))[-2:] == [
+        ["rm", "-f", b.destination_path],
+        ["systemctl", "daemon-reload"],
+    ]
+    assert my_model.apply([a], (service for service in [a, b]))
+    assert os.listdir(destination) == ["test-a.service"]
+
+
+def test_second_apply_only_reads_the_state(units):
+    my_model, make, _, _, fake_bin, _ = units
+    assert my_model.apply(make())
+    os.remove(fake_bin.log)
+    assert my_model.plan(make()) == []
+    assert my_model.apply(make())
+    assert [call.split()[1] for call in systemctl_calls(fake_bin)] == ["show", "show"]
+    assert not [call for call in fake_bin.calls() if not call.startswith("systemctl show")]
+
+
+def test_update_restarts_only_the_changed_unit(units):
+    my_model, make, contents, destination, fake_bin, _ = units
+    assert my_model.apply(make())
+    contents["b"] += "After=network.target\n"
+    os.remove(fake_bin.log)
+    assert my_model.changes(make()) == {"test-a.service": UNCHANGED, "test-b.service": UPDATE}
+    assert my_model.apply(make())
+    assert (destination / "test-b.service").read_text() == contents["b"]
+    assert "systemctl restart test-b.service" in systemctl_calls(fake_bin)
+    assert not any("test-a" in call for call in systemctl_calls(fake_bin) if not call.startswith("systemctl show"))
+
+
+def test_stopped_unit_is_started(units, fake_bin):
+    my_model, make, _, _, _, _ = units
+    assert my_model.apply(make())
+    fake_bin.add("systemctl", 'printf "Id=x\\nActiveState=inactive\\nUnitFileState=disabled\\n\\n"\n')
+    assert set(my_model.changes(make()).values()) == {START}
+
+
+def test_failed_restart_restores_the_previous_unit(units):
+    my_model, make, contents, destination, fake_bin, fail = units
+    assert my_model.apply(make())
+    previous = contents["a"]
+    contents["a"] += "After=network.target\n"
+    fail("restart")
+    os.remove(fake_bin.log)
+    assert not my_model.apply(make())
+    assert (destination / "test-a.service").read_text() == previous
+    assert systemctl_calls(fake_bin)[-2:] == ["systemctl daemon-reload", "systemctl try-restart test-a.service"]
+
+
+def test_failed_start_removes_the_new_units(units):
+    my_model, make, _, destination, fake_bin, fail = units
+    fail("enable")
+    assert not my_model.apply(make())
+    assert os.listdir(destination) == []
+    assert systemctl_calls(fake_bin)[-1] == "systemctl daemon-reload"
+
+
+def test_units_start_after_their_dependencies(units):
+    my_model, make, _, _, _, _ = units
+    a, b = make()
+    assert my_model.levels([b, a]) == [[a], [b]]
+    b.depende = ["test-a.service", "test-missing.service"]
+    assert my_model.levels([b, a]) == [[a], [b]]
+    a.depende = "test-b.service"
+    with pytest.raises(ValueError):
+        my_model.levels([a, b])
+
+
+def test_concurrent_preparation_prints_in_unit_order(units, capsys):
+    my_model, make, _, _, _, _ = units
+    my_model.workers = 2
+    assert my_model.apply(make())
+    saved = [line for line in capsys.readouterr().out.splitlines() if line.startswith("[INFO] Serviço salvo")]
+    assert [line.rsplit("/", 1)[1] for line in saved] == ["test-a.service", "test-b.service"]
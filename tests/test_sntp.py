@@ -0,0 +1,162 @@
+import os
+import socket
+import sys
+import time
+
+import pytest
+
+from conftest import PROJECT_DIR
+from tools.date import sntp
+
+sys.path.insert(0, os.path.join(PROJECT_DIR, "benchmarks"))
+from operations import FakeNtpServer  # noqa: E402
+
+TRANSMIT = 0x0123456789ABCDEF
+
+
+def reply(stratum=2, refid=b"GPS\0", origin=TRANSMIT, mode=sntp.MODE_SERVER, leap=0, t2=1000.0, t3=1000.001):
+    flags = (leap << 6) | (4 << 3) | mode
+    return sntp.NTP_PACKET.pack(flags, stratum, 6, -20, 0, 0, refid, 0, origin, sntp.to_ntp(t2), sntp.to_ntp(t3))
+
+
+def parsed(data, max_delay=1.0, t1=1000.0, t4=1000.011):
+    return sntp.parse_reply(sntp.SntpSample("server", "192.0.2.1"), data, TRANSMIT, t1, t4, max_delay)
+
+
+def test_parse_reply():
+    sample = parsed(reply(t2=1000.5, t3=1000.501))
+    assert sample.valid
+    assert sample.offset == pytest.approx(0.495, abs=1e-6)
+    assert sample.delay == pytest.approx(0.010, abs=1e-6)
+    assert (sample.stratum, sample.refid) == (2, "71.80.83.0")
+
+
+def test_kiss_o_death():
+    sample = parsed(reply(stratum=0, refid=b"RATE"))
+    assert not sample.valid
+    assert sample.error == "kiss-o'-death RATE"
+    assert sample.offset is None
+
+
+def test_stratum_0_without_a_code():
+    sample = parsed(reply(stratum=0, refid=b"\0\0\0\0"))
+    assert sample.error == "kiss-o'-death "
+    assert not sample.valid
+
+
+@pytest.mark.parametrize("data, error", [
+    (reply()[:40], "short reply"),
+    (reply(origin=TRANSMIT ^ 1), "origin timestamp mismatch"),
+    (reply(mode=sntp.MODE_CLIENT), "unexpected mode 3"),
+    (reply(stratum=16), "bad stratum 16"),
+    (reply(leap=sntp.LEAP_UNSYNCHRONIZED), "server not synchronized"),
+    (reply(t2=1000.0, t3=1000.0)[:-8] + b"\0" * 8, "zero timestamp"),
+])
+def test_rejected_replies(data, error):
+    sample = parsed(data)
+    assert sample.error == error
+    assert not sample.valid
+
+
+def test_excessive_delay():
+    sample = parsed(reply(), max_delay=0.005)
+    assert sample.error == "excessive delay 0.010s"
+    assert not sample.valid
+
+
+@pytest.fixture
+def ntp_servers():
+    """
+    Starts FakeNtpServers on 127.0.0.2, 127.0.0.3... sharing one free port.
+    Returns (start(**options) -> address, port).
+    """
+    servers = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    def start(**options):
+        address = f"127.0.0.{len(servers) + 2}"
+        servers.append(FakeNtpServer(address, port=port, **options))
+        return address
+
+    yield start, port
+    for server in servers:
+        server.close()
+
+
+def silent_server(address: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((address, port))
+    return sock
+
+
+def by_address(samples):
+    return {sample.address: sample for sample in samples}
+
+
+def test_query_servers(ntp_servers):
+    start, port = ntp_servers
+    good = start(offset=0.5)
+    kiss = start(stratum=0, refid=b"DENY")
+    zero = start(stratum=0, refid=b"\0\0\0\0")
+    stale = start(echo_origin=False)
+    slow = start(delay=0.2)
+    silent = silent_server("127.0.0.99", port)
+    try:
+        started = time.monotonic()
+        samples = by_address(sntp.query_servers([good, kiss, zero, stale, slow, "127.0.0.99"], timeout=0.5, max_delay=0.1, port=port))
+        # Queried at the same time: the whole run is bounded by the timeout, not by the slow server
+        assert time.monotonic() - started < 0.9
+    finally:
+        silent.close()
+    assert samples[good].valid
+    assert samples[good].offset == pytest.approx(0.5, abs=0.05)
+    assert samples[kiss].error == "kiss-o'-death DENY"
+    assert samples[zero].error.startswith("kiss-o'-death")
+    assert samples[stale].error == "origin timestamp mismatch"
+    assert samples[slow].error.startswith("excessive delay")
+    assert samples["127.0.0.99"].error == "timeout"
+    assert sntp.select_best(list(samples.values())) is samples[good]
+
+
+def test_query_servers_stops_once_enough_answered(ntp_servers):
+    start, port = ntp_servers
+    fast = [start(), start()]
+    late = start(delay=1.0)
+    started = time.monotonic()
+    samples = by_address(sntp.query_servers([], timeout=2.0, port=port, targets=[
+        ("ntp", address, socket.AF_INET) for address in fast + [late]
+    ], enough=2))
+    assert time.monotonic() - started < 0.8
+    assert all(samples[address].valid for address in fast)
+    assert samples[late].error == sntp.SKIPPED
+
+
+def test_select_best_picks_the_lowest_delay_of_the_majority(ntp_servers):
+    start, port = ntp_servers
+    servers = [start(offset=2.0), start(offset=2.01), start(offset=-30.0)]
+    best = sntp.select_best(sntp.query_servers(servers, timeout=1.0, port=port))
+    assert best.offset == pytest.approx(2.0, abs=0.05)
+
+
+def sample(offset, delay, stratum=2, error=None):
+    result = sntp.SntpSample("ntp", f"192.0.2.{len(str(offset))}")
+    result.offset, result.delay, result.stratum, result.error = offset, delay, stratum, error
+    return result
+
+
+def test_select_best_ignores_a_fast_falseticker():
+    falseticker = sample(5.0, 0.001)
+    clique = [sample(0.10, 0.030), sample(0.11, 0.020), sample(0.12, 0.040)]
+    assert sntp.select_best([falseticker] + clique) is clique[1]
+
+
+def test_select_best_breaks_ties_on_stratum():
+    first, second = sample(0.1, 0.02, stratum=3), sample(0.1, 0.02, stratum=1)
+    assert sntp.select_best([first, second]) is second
+
+
+def test_select_best_without_valid_samples():
+    assert sntp.select_best([]) is None
+    assert sntp.select_best([sample(None, None, error="timeout"), sample(0.1, 0.01, error=sntp.SKIPPED)]) is None
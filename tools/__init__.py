@@ -1,11 +1,53 @@
-from .date.create_service import create as create_service_date, create_timer as create_timer_date
-from .service import ModelService, MyService
-from .network import NetworkManager
+import importlib
+
+# Exported names are imported on first use (PEP 562), so `import tools` stays cheap
+# and each action only pays for the modules it needs.
+_EXPORTS = {
+    'create_service_date': ('.date.create_service', 'create'),
+    'create_timer_date': ('.date.create_service', 'create_timer'),
+    'create_daemon_date': ('.date.create_service', 'create_daemon'),
+    'create_service_dns_forwarder': ('.dns_forwarder.create_service', 'create'),
+    'ModelService': ('.service', 'ModelService'),
+    'MyService': ('.service', 'MyService'),
+    'NetworkManager': ('.network', 'NetworkManager'),
+}
+
+_SUBMODULES = {
+    'adaptive',
+    'config',
+    'deploy',
+    'dns',
+    'monitor',
+    'netinfo',
+    'network',
+    'privileged',
+    'probe',
+    'processes',
+    'service',
+}
 
 __all__ = [
     'create_service_date',
     'create_timer_date',
+    'create_daemon_date',
+    'create_service_dns_forwarder',
     'ModelService',
     'MyService',
     'NetworkManager'
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        module, attr = _EXPORTS[name]
+        value = getattr(importlib.import_module(module, __name__), attr)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f'.{name}', __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS) | _SUBMODULES)
@@ -0,0 +1,201 @@
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# Prevent Python from generating .pyc files
+sys.dont_write_bytecode = True
+
+try:
+    from .probe import ProbeResult, probe
+except ImportError:
+    from probe import ProbeResult, probe
+
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+DOWN = "down"
+
+
+class HostSchedule:
+    """
+    Probe state of one host.
+    """
+    def __init__(self, host: str):
+        self.host = host
+        self.mode = HEALTHY
+        self.next_due = 0.0
+        self.failures = 0
+        self.degraded_rounds = 0
+        self.baseline: Optional[float] = None
+        self.last_result: Optional[ProbeResult] = None
+        self.probes_sent = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            "host": self.host,
+            "mode": self.mode,
+            "failures": self.failures,
+            "baseline_ms": self.baseline,
+            "probes_sent": self.probes_sent,
+            "last_loss": self.last_result.loss if self.last_result else None,
+            "last_avg_ms": self.last_result.avg if self.last_result else None,
+        }
+
+
+class AdaptiveScheduler:
+    """
+    Decides how hard to probe each host from its recent history:
+    - healthy: one light probe every base_interval seconds
+    - degraded (a light probe was lost or slow): dense_count packets, starting at
+      base_interval / 4 seconds and backing off to base_interval, until the host
+      looks healthy again; a host that is steadily slower without loss for
+      down_after rounds gets its baseline reset to the new latency
+    - down (dense probing failed down_after times in a row): one light probe with
+      exponential backoff (base_interval * 2^n, capped at backoff_max, +/- jitter)
+    A probe is slow when its RTT exceeds latency_ms, or latency_factor times the
+    host's own RTT baseline (EWMA of healthy probes) by more than min_increase_ms.
+    """
+    def __init__(
+        self,
+        hosts: List[str],
+        base_interval: float = 60.0,
+        dense_count: int = 5,
+        loss_threshold: float = 20.0,
+        latency_factor: float = 3.0,
+        latency_ms: Optional[float] = None,
+        min_increase_ms: float = 20.0,
+        down_after: int = 3,
+        backoff_max: float = 3600.0,
+        jitter: float = 0.1,
+        timeout: float = 1.0,
+        probe_fn: Callable[..., ProbeResult] = probe,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.hosts = {host: HostSchedule(host) for host in dict.fromkeys(hosts)}
+        self.base_interval = base_interval
+        self.dense_count = dense_count
+        self.loss_threshold = loss_threshold
+        self.latency_factor = latency_factor
+        self.latency_ms = latency_ms
+        self.min_increase_ms = min_increase_ms
+        self.down_after = down_after
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.timeout = timeout
+        self.probe_fn = probe_fn
+        self.clock = clock
+        self.rng = rng
+
+    def _jittered(self, delay: float) -> float:
+        return delay * (1.0 + self.jitter * (2.0 * self.rng() - 1.0))
+
+    def _is_slow(self, state: HostSchedule, rtt: Optional[float]) -> bool:
+        if rtt is None:
+            return False
+        if self.latency_ms is not None and rtt > self.latency_ms:
+            return True
+        if state.baseline is None:
+            return False
+        return rtt > state.baseline * self.latency_factor and rtt - state.baseline > self.min_increase_ms
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        now = self.clock() if now is None else now
+        return [host for host, state in self.hosts.items() if state.next_due <= now]
+
+    def next_wakeup(self) -> float:
+        return min(state.next_due for state in self.hosts.values()) if self.hosts else self.clock() + self.base_interval
+
+    def probe_count(self, host: str) -> int:
+        return self.dense_count if self.hosts[host].mode == DEGRADED else 1
+
+    def update(self, host: str, result: ProbeResult, now: Optional[float] = None) -> str:
+        """
+        Feeds a probe result into the host state and schedules its next probe.
+        Returns the new mode.
+        """
+        now = self.clock() if now is None else now
+        state = self.hosts[host]
+        state.last_result = result
+        state.probes_sent += result.sent
+
+        if state.mode == HEALTHY:
+            if result.received and not self._is_slow(state, result.avg):
+                rtt = result.avg
+                state.baseline = rtt if state.baseline is None else 0.8 * state.baseline + 0.2 * rtt
+                state.next_due = now + self._jittered(self.base_interval)
+            else:
+                # Escalate right away: confirm with dense probing
+                state.mode = DEGRADED
+                state.next_due = now
+
+        elif state.mode == DEGRADED:
+            state.degraded_rounds += 1
+            lossy = result.loss > self.loss_threshold
+            if not lossy and self._is_slow(state, result.avg) and state.degraded_rounds >= self.down_after:
+                # Stable but slower path: accept it as the new normal
+                state.baseline = result.avg
+            if not lossy and not self._is_slow(state, result.avg):
+                state.mode = HEALTHY
+                state.failures = 0
+                state.degraded_rounds = 0
+                state.next_due = now + self._jittered(self.base_interval)
+            elif result.received == 0:
+                state.failures += 1
+                if state.failures >= self.down_after:
+                    state.mode = DOWN
+                    state.degraded_rounds = 0
+                    state.next_due = now + self._backoff(state)
+                else:
+                    state.next_due = now + self._degraded_delay(state)
+            else:
+                state.failures = 0
+                state.next_due = now + self._degraded_delay(state)
+
+        else:
+            if result.received:
+                state.mode = DEGRADED
+                state.failures = 0
+                state.next_due = now
+            else:
+                state.failures += 1
+                state.next_due = now + self._backoff(state)
+        return state.mode
+
+    def _degraded_delay(self, state: HostSchedule) -> float:
+        delay = (self.base_interval / 4) * (2 ** max(0, state.degraded_rounds - 1))
+        return self._jittered(min(self.base_interval, delay))
+
+    def _backoff(self, state: HostSchedule) -> float:
+        exponent = max(0, state.failures - self.down_after)
+        return self._jittered(min(self.backoff_max, self.base_interval * (2 ** exponent)))
+
+    def run_once(self, executor: Optional[ThreadPoolExecutor] = None, now: Optional[float] = None) -> Dict[str, ProbeResult]:
+        """
+        Probes every host that is due (in parallel) and updates its schedule.
+        """
+        hosts = self.due(now)
+
+        def run(host: str) -> ProbeResult:
+            return self.probe_fn(host, count=self.probe_count(host), interval=0.2, timeout=self.timeout)
+
+        if executor is None:
+            results = [run(host) for host in hosts]
+        else:
+            results = list(executor.map(run, hosts))
+        for host, result in zip(hosts, results):
+            self.update(host, result)
+        return dict(zip(hosts, results))
+
+    def run(self, stop: threading.Event, on_results: Optional[Callable[[Dict[str, ProbeResult]], None]] = None) -> None:
+        with ThreadPoolExecutor(max_workers=max(1, len(self.hosts))) as executor:
+            while not stop.is_set():
+                results = self.run_once(executor)
+                if results and on_results:
+                    on_results(results)
+                stop.wait(max(0.0, self.next_wakeup() - self.clock()))
+
+    def state(self) -> Dict:
+        return {host: state.to_dict() for host, state in self.hosts.items()}
@@ -0,0 +1,130 @@
+import os
+import re
+import sys
+
+# Force Python not to create .pyc files
+sys.dont_write_bytecode = True
+
+# Read on every start of main.py and the date-sync script: keep this module's
+# imports to the bare minimum (no typing, yaml only as a fallback)
+
+# Plain scalars the fast path types itself, exactly like yaml.safe_load (YAML 1.1)
+_INT = re.compile(r"^[-+]?(0|[1-9][0-9]*)$")
+_FLOAT = re.compile(r"^([-+]?[0-9]+\.[0-9]*|\.[0-9]+)$")
+_BOOLS = {"true": True, "yes": True, "on": True, "false": False, "no": False, "off": False}
+_NULLS = ("~", "null")
+# Plain scalars yaml would read as something else (underscored/octal/hex/sexagesimal
+# numbers, .inf/.nan, timestamps) or reject (indicators): left to PyYAML
+_AMBIGUOUS = re.compile(
+    r"^[-+]?(0b[0-1_]+|0x[0-9a-fA-F_]+|0[0-7_]+|[0-9][0-9_]*(:[0-5]?[0-9])+(\.[0-9_]*)?"
+    r"|[0-9][0-9_]*|([0-9][0-9_]*)?\.[0-9_]*([eE][-+][0-9]+)?|\.(inf|nan))$"
+    r"|^[0-9]{4}-[0-9]{1,2}-[0-9]{1,2}"
+    r"|^([\[\]{}&*!|>%@`#,?:'\"]|-(\s|$)|<<$|=$)",
+    re.IGNORECASE,
+)
+_KEY = re.compile(r"^([A-Za-z_][A-Za-z0-9_.-]*):(\s+.*)?$")
+
+
+def _value(text: str):
+    """
+    Parses the value part of a line (comment included).
+    Raises ValueError when PyYAML is needed to read it exactly.
+    """
+    text = text.strip()
+    if not text or text.startswith("#"):
+        return None
+    if text[0] in "'\"":
+        end = text.find(text[0], 1)
+        rest = text[end + 1:].strip() if end > 0 else None
+        if end < 0 or (rest and not rest.startswith("#")):
+            raise ValueError(f"unsupported quoted string: {text}")
+        body = text[1:end]
+        if text[0] == '"' and "\\" in body or text[0] == "'" and text[end + 1:end + 2] == "'":
+            raise ValueError(f"escaped string: {text}")
+        return body
+
+    comment = re.search(r"\s#", text)
+    if comment:
+        text = text[:comment.start()].rstrip()
+    if ": " in text or text.endswith(":") or _AMBIGUOUS.match(text) and not (_INT.match(text) or _FLOAT.match(text)):
+        raise ValueError(f"ambiguous scalar: {text}")
+    lowered = text.lower()
+    if lowered in _BOOLS or lowered in _NULLS:
+        # YAML 1.1 only knows the lower, Capitalized and UPPER spellings
+        if text not in (lowered, lowered.capitalize(), lowered.upper()):
+            raise ValueError(f"ambiguous scalar: {text}")
+        return _BOOLS.get(lowered)
+    if _INT.match(text):
+        return int(text)
+    if _FLOAT.match(text):
+        return float(text)
+    return text
+
+
+def parse_simple_yaml(text: str) -> dict:
+    """
+    Parses the subset of YAML used by this project's settings files: top-level
+    `key: scalar`, `key:` followed by a `- item` list or by one level of
+    `subkey: scalar`. Raises ValueError on anything else, so the caller can fall
+    back to PyYAML; whatever it accepts is read exactly as yaml.safe_load would.
+    """
+    result = {}
+    block_key = None
+    block_indent = None
+    for raw in text.splitlines():
+        stripped = raw.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        indent = len(raw) - len(raw.lstrip(" "))
+        if raw[indent] == "\t" or stripped in ("---", "..."):
+            raise ValueError(f"unsupported line: {raw}")
+
+        if indent == 0:
+            match = _KEY.match(stripped)
+            if not match or match.group(1) in result:
+                raise ValueError(f"unsupported line: {raw}")
+            key = match.group(1)
+            result[key] = _value(match.group(2) or "")
+            block_key = key if result[key] is None else None
+            block_indent = None
+            continue
+
+        if block_key is None or block_indent not in (None, indent):
+            raise ValueError(f"unexpected indentation: {raw}")
+        block_indent = indent
+        block = result[block_key]
+        if stripped == "-" or stripped.startswith("- "):
+            if block is None:
+                block = result[block_key] = []
+            if not isinstance(block, list):
+                raise ValueError(f"mixed block: {block_key}")
+            block.append(_value(stripped[1:]))
+            continue
+        match = _KEY.match(stripped)
+        if block is None:
+            block = result[block_key] = {}
+        if not match or not isinstance(block, dict) or match.group(1) in block:
+            raise ValueError(f"unsupported line: {raw}")
+        value = _value(match.group(2) or "")
+        if value is None:
+            raise ValueError(f"nested block: {raw}")
+        block[match.group(1)] = value
+    return result
+
+
+def load_yaml(path: str):
+    """
+    Reads a settings file, importing PyYAML only when the fast parser cannot
+    handle it. Returns None when the file does not exist.
+    Raises OSError/ValueError (or yaml.YAMLError) when it cannot be read.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        text = f.read()
+    try:
+        # like yaml.safe_load, a file without any key reads as None
+        return parse_simple_yaml(text) or None
+    except ValueError:
+        import yaml
+        return yaml.safe_load(text)
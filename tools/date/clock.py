@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+from typing import Optional
+
+# Force Python not to create .pyc files
+sys.dont_write_bytecode = True
+
+# Offsets up to this are slewed, larger ones are stepped (same default as ntpd)
+STEP_THRESHOLD = 0.128
+
+# adjtimex modes: ADJ_OFFSET_SINGLESHOT is the old adjtime() interface, the kernel
+# slews the clock by the given offset at 500 ppm (0.5 ms per second)
+ADJ_OFFSET_SINGLESHOT = 0x8001
+MAX_SLEW_RATE = 0.0005
+# ADJ_FREQUENCY sets the permanent frequency correction, in ppm with a 16 bit fraction
+ADJ_FREQUENCY = 0x0002
+FREQUENCY_SCALE = 65536
+MAX_FREQUENCY = 500.0
+
+STEP = "step"
+SLEW = "slew"
+
+
+_adjtimex_call = None
+
+
+def _load_adjtimex():
+    """
+    Binds adjtimex(2) with ctypes; done on first use, so that stepping the clock
+    (or just importing this module) does not pay for loading ctypes.
+    """
+    import ctypes
+
+    class Timeval(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_usec", ctypes.c_long)]
+
+    class Timex(ctypes.Structure):
+        """struct timex from <sys/timex.h> (Linux)."""
+        _fields_ = [
+            ("modes", ctypes.c_uint),
+            ("offset", ctypes.c_long),
+            ("freq", ctypes.c_long),
+            ("maxerror", ctypes.c_long),
+            ("esterror", ctypes.c_long),
+            ("status", ctypes.c_int),
+            ("constant", ctypes.c_long),
+            ("precision", ctypes.c_long),
+            ("tolerance", ctypes.c_long),
+            ("time", Timeval),
+            ("tick", ctypes.c_long),
+            ("ppsfreq", ctypes.c_long),
+            ("jitter", ctypes.c_long),
+            ("shift", ctypes.c_int),
+            ("stabil", ctypes.c_long),
+            ("jitcnt", ctypes.c_long),
+            ("calcnt", ctypes.c_long),
+            ("errcnt", ctypes.c_long),
+            ("stbcnt", ctypes.c_long),
+            ("tai", ctypes.c_int),
+            ("_padding", ctypes.c_int * 11),
+        ]
+
+    # The symbols of the running interpreter include libc
+    libc = ctypes.CDLL(None, use_errno=True)
+
+    def call(modes: int, offset: int = 0, freq: int = 0) -> Timex:
+        timex = Timex()
+        timex.modes = modes
+        timex.offset = offset
+        timex.freq = freq
+        if libc.adjtimex(ctypes.byref(timex)) < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return timex
+
+    return call
+
+
+def _adjtimex(modes: int, offset: int = 0, freq: int = 0):
+    global _adjtimex_call
+    if _adjtimex_call is None:
+        _adjtimex_call = _load_adjtimex()
+    return _adjtimex_call(modes, offset, freq)
+
+
+def step_clock(offset: float) -> None:
+    """
+    Moves CLOCK_REALTIME by offset seconds with clock_settime, keeping the
+    nanoseconds. Read and write happen back to back, so nothing is lost in between.
+    Raises PermissionError without CAP_SYS_TIME.
+    """
+    if hasattr(time, "clock_settime_ns"):
+        delta = int(round(offset * 1e9))
+        time.clock_settime_ns(time.CLOCK_REALTIME, time.clock_gettime_ns(time.CLOCK_REALTIME) + delta)
+    else:
+        time.clock_settime(time.CLOCK_REALTIME, time.clock_gettime(time.CLOCK_REALTIME) + offset)
+
+
+def slew_clock(offset: float) -> float:
+    """
+    Asks the kernel to slew CLOCK_REALTIME by offset seconds (adjtimex singleshot):
+    the clock runs slightly faster/slower until the offset is absorbed, so it never
+    jumps. Replaces any slew still in progress.
+    Returns the seconds the correction will take. Raises PermissionError without CAP_SYS_TIME.
+    """
+    _adjtimex(ADJ_OFFSET_SINGLESHOT, int(round(offset * 1e6)))
+    return abs(offset) / MAX_SLEW_RATE
+
+
+def get_frequency() -> float:
+    """
+    Frequency correction the kernel currently applies to the clock (ppm, + runs faster).
+    0 after boot unless something set it. Raises OSError if adjtimex is unavailable.
+    """
+    return _adjtimex(0).freq / FREQUENCY_SCALE
+
+
+def set_frequency(ppm: float) -> float:
+    """
+    Makes the kernel correct the clock rate by ppm from now on (clamped to the
+    kernel limit of 500 ppm), so a known drift is compensated between syncs.
+    Returns the value set. Raises PermissionError without CAP_SYS_TIME.
+    """
+    ppm = max(-MAX_FREQUENCY, min(MAX_FREQUENCY, ppm))
+    _adjtimex(ADJ_FREQUENCY, freq=int(round(ppm * FREQUENCY_SCALE)))
+    return ppm
+
+
+def discipline(offset: float, step_threshold: float = STEP_THRESHOLD) -> str:
+    """
+    Corrects the system clock by a measured offset (seconds, + means the clock is behind):
+    slews offsets up to step_threshold, steps larger ones.
+    Returns STEP or SLEW. Raises OSError (PermissionError when not root) on failure.
+    """
+    if abs(offset) <= step_threshold:
+        slew_clock(offset)
+        return SLEW
+    step_clock(offset)
+    return STEP
+
+
+def date_argument(offset: float, now: Optional[float] = None) -> str:
+    """
+    `date -s` argument for now + offset as epoch seconds with nanoseconds
+    (fallback when the clock cannot be set from this process).
+    """
+    target = (time.time() if now is None else now) + offset
+    return f"@{target:.9f}"
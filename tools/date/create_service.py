@@ -6,6 +6,11 @@ sys.dont_write_bytecode = True
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
+try:
+    from ..deploy import INSTALL_DIR
+except ImportError:
+    INSTALL_DIR = "/opt/dns_and_date"
+
 SERVICE_TEMPLATE = """
 [Unit]
 Description=Synchronize system date and time.
@@ -13,7 +18,27 @@ After=network.target
 
 [Service]
 Type=oneshot
-ExecStart=/usr/bin/python3 {script_path}/script.py
+WorkingDirectory={install_dir}
+ExecStart=/usr/bin/python3 -m tools.date.script
+""".strip()
+
+
+# Long-running alternative to the oneshot service + timer pair
+DAEMON_SERVICE_TEMPLATE = """
+[Unit]
+Description=Keep system date and time synchronized.
+After=network-online.target
+Wants=network-online.target
+
+[Service]
+Type=simple
+WorkingDirectory={install_dir}
+ExecStart=/usr/bin/python3 -m tools.date.script --daemon
+Restart=on-failure
+RestartSec=10
+
+[Install]
+WantedBy=multi-user.target
 """.strip()
 
 
@@ -30,8 +55,15 @@ Unit={name_service}
 WantedBy=timers.target
 """.strip()
 
-def create():
-    service_content = SERVICE_TEMPLATE.format(script_path=SCRIPT_DIR)
+def create(install_dir: str = INSTALL_DIR):
+    """
+    install_dir: where tools.deploy installed the package (or the source tree).
+    """
+    service_content = SERVICE_TEMPLATE.format(install_dir=install_dir)
+    return service_content, SCRIPT_DIR
+
+def create_daemon(install_dir: str = INSTALL_DIR):
+    service_content = DAEMON_SERVICE_TEMPLATE.format(install_dir=install_dir)
     return service_content, SCRIPT_DIR
 
 def create_timer(name_service: str):
@@ -0,0 +1,200 @@
+import os
+import struct
+import sys
+import uuid
+from typing import List, Optional
+
+# Force Python not to create .pyc files
+sys.dont_write_bytecode = True
+
+try:
+    from .clock import MAX_FREQUENCY, MAX_SLEW_RATE
+except ImportError:
+    from clock import MAX_FREQUENCY, MAX_SLEW_RATE
+
+MAGIC = b"DSJ1"
+VERSION = 1
+# magic, version, record size, capacity, records ever written,
+# drift estimate (ppm), last prediction error (ppm), drift samples
+HEADER = struct.Struct("<4sHHIQddI")
+HEADER_SIZE = 64
+# boot id, monotonic time, wall time, offset, delay, kernel frequency (ppm), server address
+SERVER_SIZE = 40
+RECORD = struct.Struct(f"<16sdddff{SERVER_SIZE}s")
+
+DEFAULT_CAPACITY = 1024
+# Intervals shorter than this say little about the frequency
+MIN_FIT_INTERVAL = 16.0
+# Weight of a new drift sample in the estimate
+GAIN = 0.25
+
+
+def boot_id() -> bytes:
+    """
+    Identifies the current boot: monotonic times are only comparable within one.
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id", "r") as f:
+            return uuid.UUID(f.read().strip()).bytes
+    except (OSError, ValueError):
+        return b"\x00" * 16
+
+
+class SyncRecord:
+    """
+    One successful sync: the clock read `wall` at `monotonic` and was `offset`
+    seconds off; `frequency` is the kernel frequency correction (ppm) that was in
+    effect since the previous sync.
+    """
+    def __init__(self, boot: bytes, monotonic: float, wall: float, offset: float, delay: float, frequency: float, server: str):
+        self.boot = boot
+        self.monotonic = monotonic
+        self.wall = wall
+        self.offset = offset
+        self.delay = delay
+        self.frequency = frequency
+        self.server = server
+
+    @property
+    def true_time(self) -> float:
+        return self.wall + self.offset
+
+    def pack(self) -> bytes:
+        return RECORD.pack(
+            self.boot, self.monotonic, self.wall, self.offset, self.delay, self.frequency,
+            self.server.encode("ascii", "replace")[:SERVER_SIZE],
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "SyncRecord":
+        boot, monotonic, wall, offset, delay, frequency, server = RECORD.unpack(data)
+        return cls(boot, monotonic, wall, offset, delay, frequency, server.rstrip(b"\x00").decode("ascii", "replace"))
+
+    def __repr__(self):
+        return f"SyncRecord(wall={self.wall:.3f}, offset={self.offset:+.6f}, delay={self.delay:.6f}, server={self.server!r})"
+
+
+class SyncJournal:
+    """
+    Bounded, append-only journal of syncs in one fixed-size file: a header and a
+    ring of `capacity` fixed-size records, the oldest overwritten first.
+    The header also carries the drift model, so the latest state (last record,
+    frequency estimate) is read in O(1).
+
+    Drift model: with the clock corrected at every sync, the offset measured at
+    the next one is what the oscillator gained or lost in between, on top of the
+    kernel frequency correction in effect. Each interval of the same boot gives a
+    sample frequency + offset / interval; the estimate is their moving average.
+    """
+    def __init__(self, path: str, capacity: int = DEFAULT_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.count = 0
+        self.frequency = 0.0
+        self.error = 0.0
+        self.samples = 0
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(HEADER.size)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"[WARN] Failed to read sync journal {self.path}: {e}")
+            return
+        if len(header) == HEADER.size:
+            magic, version, record_size, capacity, count, frequency, error, samples = HEADER.unpack(header)
+            if magic == MAGIC and version == VERSION and record_size == RECORD.size:
+                self.capacity, self.count = capacity, count
+                self.frequency, self.error, self.samples = frequency, error, samples
+                return
+        print(f"[WARN] Sync journal {self.path} has an unknown format, starting a new one")
+
+    def _header(self) -> bytes:
+        return HEADER.pack(MAGIC, VERSION, RECORD.size, self.capacity, self.count, self.frequency, self.error, self.samples).ljust(HEADER_SIZE, b"\x00")
+
+    def _slot(self, index: int) -> int:
+        return HEADER_SIZE + (index % self.capacity) * RECORD.size
+
+    def _read(self, fd: int, index: int) -> SyncRecord:
+        return SyncRecord.unpack(os.pread(fd, RECORD.size, self._slot(index)))
+
+    def latest(self) -> Optional[SyncRecord]:
+        if not self.count:
+            return None
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            return self._read(fd, self.count - 1)
+        finally:
+            os.close(fd)
+
+    def records(self) -> List[SyncRecord]:
+        """
+        Every record still in the journal, oldest first.
+        """
+        first = max(0, self.count - self.capacity)
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return []
+        try:
+            return [self._read(fd, index) for index in range(first, self.count)]
+        finally:
+            os.close(fd)
+
+    @property
+    def stable(self) -> bool:
+        """
+        True once the drift estimate predicts the clock to within 1 ppm.
+        """
+        return self.samples >= 4 and abs(self.error) < 1.0
+
+    def predict_offset(self, elapsed: float, frequency: float) -> float:
+        """
+        Seconds the clock is expected to drift in `elapsed` seconds while the
+        kernel applies `frequency` ppm (0 on a fresh boot).
+        """
+        return (self.frequency - frequency) * 1e-6 * elapsed
+
+    def append(self, record: SyncRecord, max_offset: float) -> None:
+        """
+        Adds a sync and updates the drift model. Offsets above max_offset were
+        stepped, not drift, and do not feed the model.
+        Raises OSError when the journal cannot be written.
+        """
+        previous = self.latest()
+        if previous is not None and previous.boot == record.boot and abs(record.offset) <= max_offset:
+            interval = record.monotonic - previous.monotonic
+            # Until the previous correction was fully slewed in, the offset is not drift
+            settle = abs(previous.offset) / MAX_SLEW_RATE if abs(previous.offset) <= max_offset else 0.0
+            if interval >= max(MIN_FIT_INTERVAL, settle):
+                sample = record.frequency + record.offset / interval * 1e6
+                if self.samples:
+                    self.error = sample - self.frequency
+                    self.frequency += GAIN * self.error
+                else:
+                    self.frequency = sample
+                self.frequency = max(-MAX_FREQUENCY, min(MAX_FREQUENCY, self.frequency))
+                self.samples += 1
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < HEADER_SIZE:
+                os.pwrite(fd, self._header(), 0)
+            # Record first, then the header that makes it visible
+            os.pwrite(fd, record.pack(), self._slot(self.count))
+            self.count += 1
+            os.pwrite(fd, self._header(), 0)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def new_record(monotonic: float, wall: float, offset: float, delay: float, frequency: float, server: str) -> SyncRecord:
+    return SyncRecord(boot_id(), monotonic, wall, offset, delay, frequency, server)
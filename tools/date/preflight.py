@@ -0,0 +1,93 @@
+import json
+import os
+import re
+import sys
+from typing import Dict, List, Optional, Tuple
+
+# Force Python not to create .pyc files
+sys.dont_write_bytecode = True
+
+UFW_CONF = "/etc/ufw/ufw.conf"
+UFW_USER_RULES = "/etc/ufw/user.rules"
+LOCALTIME = "/etc/localtime"
+TIMEZONE_FILE = "/etc/timezone"
+
+# Rule written by `ufw allow out 123/udp`:  ### tuple ### allow udp 123 0.0.0.0/0 any 0.0.0.0/0 out
+NTP_RULE = re.compile(r"^### tuple ### allow (?:udp|any) 123 \S+ \S+ \S+ out\b", re.MULTILINE)
+ENABLED = re.compile(r"^\s*ENABLED\s*=\s*(\S+)", re.MULTILINE)
+
+
+def fingerprint(paths: List[str]) -> Dict[str, Optional[List[int]]]:
+    """
+    (inode, size, mtime_ns) of every path, None when it does not exist.
+    Symlinks are not followed: retargeting /etc/localtime changes its fingerprint.
+    """
+    result = {}
+    for path in paths:
+        try:
+            st = os.lstat(path)
+            result[path] = [st.st_ino, st.st_size, st.st_mtime_ns]
+        except OSError:
+            result[path] = None
+    return result
+
+
+def read_ufw_state() -> Optional[Tuple[bool, bool]]:
+    """
+    Reads ufw's own files instead of running `ufw status`.
+    Returns (enabled, ntp_rule_present), or None when the files cannot be read
+    (e.g. user.rules is only readable by root).
+    """
+    try:
+        with open(UFW_CONF, "r") as f:
+            match = ENABLED.search(f.read())
+    except FileNotFoundError:
+        return False, False  # ufw is not installed
+    except OSError:
+        return None
+    if not match or match.group(1).strip("\"'").lower() != "yes":
+        return False, False
+    try:
+        with open(UFW_USER_RULES, "r") as f:
+            return True, bool(NTP_RULE.search(f.read()))
+    except OSError:
+        return None
+
+
+def read_timezone() -> Optional[str]:
+    """
+    Timezone name from the /etc/localtime symlink (or /etc/timezone), without timedatectl.
+    """
+    try:
+        target = os.readlink(LOCALTIME)
+        if "zoneinfo/" in target:
+            return target.split("zoneinfo/", 1)[1]
+    except OSError:
+        pass
+    try:
+        with open(TIMEZONE_FILE, "r") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def load(path: str) -> Dict:
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save(path: str, data: Dict) -> bool:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+        return True
+    except OSError as e:
+        print(f"[WARN] Failed to save preflight cache {path}: {e}")
+        return False
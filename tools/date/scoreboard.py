@@ -0,0 +1,166 @@
+import json
+import os
+import socket
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Force Python not to create .pyc files
+sys.dont_write_bytecode = True
+
+try:
+    from .sntp import SKIPPED, SntpSample
+except ImportError:
+    from sntp import SKIPPED, SntpSample
+
+# Kept per server name and per resolved address; the least recently seen are dropped beyond this
+MAX_ENTRIES = 64
+# Delays kept for the median
+DELAY_WINDOW = 8
+# Weight of the latest result in the success rate
+ALPHA = 0.3
+# After this many failures in a row an address is skipped for QUARANTINE seconds,
+# doubling with every further failure up to MAX_QUARANTINE
+QUARANTINE_AFTER = 3
+QUARANTINE = 300
+MAX_QUARANTINE = 86400
+# What we assume about a server we have never queried
+UNKNOWN_RATE = 0.5
+UNKNOWN_DELAY = 0.1
+
+
+def _median(values: List[float]) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+class Scoreboard:
+    """
+    Persistent record of how every NTP server (and every address a pool resolved to)
+    answered: success rate (moving average), median of the recent delays, failures
+    in a row and time of the last failure. Used to query the best addresses first,
+    to skip the ones that keep failing and to reuse known addresses without DNS.
+
+    Stored as a small JSON file, bounded to MAX_ENTRIES per kind and replaced
+    atomically (write + rename) after every sync.
+    """
+    def __init__(self, path: str, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.servers: Dict[str, Dict] = {}
+        self.addresses: Dict[str, Dict] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.servers = dict(data.get("servers", {}))
+            self.addresses = dict(data.get("addresses", {}))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError, TypeError) as e:
+            print(f"[WARN] Ignoring NTP scoreboard {self.path}: {e}")
+
+    def save(self) -> bool:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"servers": self.servers, "addresses": self.addresses}, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+            return True
+        except OSError as e:
+            print(f"[WARN] Failed to save NTP scoreboard {self.path}: {e}")
+            return False
+
+    @staticmethod
+    def _record(entry: Dict, ok: bool, delay: Optional[float], now: float) -> None:
+        entry["rate"] = entry.get("rate", UNKNOWN_RATE) * (1 - ALPHA) + ALPHA * ok
+        entry["seen"] = now
+        if ok:
+            entry["failures"] = 0
+            entry["delays"] = (entry.get("delays", []) + [round(delay, 6)])[-DELAY_WINDOW:]
+        else:
+            entry["failures"] = entry.get("failures", 0) + 1
+            entry["last_failure"] = now
+
+    def _prune(self, entries: Dict[str, Dict]) -> None:
+        if len(entries) > self.max_entries:
+            for key in sorted(entries, key=lambda k: entries[k].get("seen", 0))[:len(entries) - self.max_entries]:
+                del entries[key]
+
+    def update(self, samples: List[SntpSample], now: Optional[float] = None) -> None:
+        """
+        Records the outcome of a round of queries (queries that were not awaited do not count).
+        """
+        now = time.time() if now is None else now
+        by_server: Dict[str, List[SntpSample]] = {}
+        for sample in samples:
+            if sample.error == SKIPPED:
+                continue
+            by_server.setdefault(sample.server, []).append(sample)
+            entry = self.addresses.setdefault(sample.address, {})
+            entry["server"] = sample.server
+            self._record(entry, sample.valid, sample.delay, now)
+        for server, answers in by_server.items():
+            valid = [s.delay for s in answers if s.valid]
+            self._record(self.servers.setdefault(server, {}), bool(valid), min(valid) if valid else None, now)
+        self._prune(self.servers)
+        self._prune(self.addresses)
+
+    def resolved(self, targets: List[Tuple[str, str, int]], now: Optional[float] = None) -> None:
+        """
+        Remembers when the addresses of the servers were (re)resolved.
+        """
+        now = time.time() if now is None else now
+        for server, address, _ in targets:
+            entry = self.addresses.setdefault(address, {"seen": now})
+            entry["server"] = server
+            entry["resolved"] = now
+        self._prune(self.addresses)
+
+    def known_targets(self, servers: List[str], max_age: float, now: Optional[float] = None) -> List[Tuple[str, str, int]]:
+        """
+        Addresses of the configured servers resolved less than max_age seconds ago,
+        as (server, address, family) like sntp.resolve_servers.
+        """
+        now = time.time() if now is None else now
+        wanted = set(servers)
+        return [
+            (entry["server"], address, socket.AF_INET6 if ":" in address else socket.AF_INET)
+            for address, entry in self.addresses.items()
+            if entry.get("server") in wanted and now - entry.get("resolved", 0) < max_age
+        ]
+
+    def quarantined(self, address: str, now: Optional[float] = None) -> bool:
+        entry = self.addresses.get(address, {})
+        failures = entry.get("failures", 0)
+        if failures < QUARANTINE_AFTER:
+            return False
+        period = min(QUARANTINE * 2 ** (failures - QUARANTINE_AFTER), MAX_QUARANTINE)
+        now = time.time() if now is None else now
+        return now - entry.get("last_failure", 0) < period
+
+    def cost(self, server: str, address: str, timeout: float) -> float:
+        """
+        Expected seconds to get an answer: median delay, plus the timeout weighted
+        by the chance of getting none. Unknown addresses inherit their server's record.
+        """
+        entry = self.addresses.get(address) or {}
+        if "rate" not in entry:
+            entry = self.servers.get(server, {})
+        rate = entry.get("rate", UNKNOWN_RATE)
+        delay = _median(entry.get("delays", []))
+        return (UNKNOWN_DELAY if delay is None else delay) + (1 - rate) * timeout
+
+    def rank(self, targets: List[Tuple[str, str, int]], timeout: float, now: Optional[float] = None) -> Tuple[List, List]:
+        """
+        Splits targets into (usable, quarantined), each ordered by expected cost.
+        """
+        now = time.time() if now is None else now
+        ordered = sorted(targets, key=lambda t: self.cost(t[0], t[1], timeout))
+        usable = [t for t in ordered if not self.quarantined(t[1], now)]
+        return usable, [t for t in ordered if self.quarantined(t[1], now)]
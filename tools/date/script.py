@@ -1,13 +1,29 @@
+import math
 import os
+import signal
 import sys
-import yaml
+import threading
 import subprocess
+import time
 from datetime import datetime
 
 # Force Python not to create .pyc files
 sys.dont_write_bytecode = True
 
-import subprocess
+# Allow running this file directly (systemd ExecStart) and still import the tools package
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from tools.probe import probe
+from tools.privileged import run_privileged
+from tools.config import load_yaml
+from tools.date import clock, journal, preflight, sntp
+from tools.date.scoreboard import Scoreboard
+
+# Pools rotate their addresses: resolve the names again after this many seconds
+RESOLVE_INTERVAL = 3600
+
 
 def ensure_ntp_port_is_open():
     """
@@ -23,12 +39,7 @@ def ensure_ntp_port_is_open():
     def is_ufw_active():
         """Verifica se o ufw está ativo."""
         try:
-            result = subprocess.run(
-                ["sudo", "ufw", "status", "verbose"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.DEVNULL,
-                text=True
-            )
+            result = run_privileged(["ufw", "status", "verbose"], capture=True)
             return "Status: active" in result.stdout
         except Exception:
             return False
@@ -36,12 +47,7 @@ def ensure_ntp_port_is_open():
     def is_ntp_rule_present():
         """Verifica se a regra de saída para 123/udp já existe."""
         try:
-            result = subprocess.run(
-                ["sudo", "ufw", "status", "numbered"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.DEVNULL,
-                text=True
-            )
+            result = run_privileged(["ufw", "status", "numbered"], capture=True)
             return "allow out 123/udp" in result.stdout
         except Exception:
             return False
@@ -50,20 +56,24 @@ def ensure_ntp_port_is_open():
         """Adiciona a regra de saída para porta 123/udp."""
         print("[INFO] Liberando saída na porta 123/UDP...")
         try:
-            subprocess.run(["sudo", "ufw", "allow", "out", "123/udp"], check=True)
+            run_privileged(["ufw", "allow", "out", "123/udp"], check=True)
             print("[SUCCESS] Regra adicionada com sucesso.")
             return True
         except subprocess.CalledProcessError as e:
             print(f"[ERROR] Falha ao adicionar regra: {e}")
             return False
 
+    # Leitura direta dos arquivos do ufw (sem subprocessos), quando possível
+    state = preflight.read_ufw_state()
+    active, rule_present = state if state is not None else (None, None)
+
     # Etapa 1: Verifica se o ufw está ativo
-    if not is_ufw_active():
+    if not (is_ufw_active() if active is None else active):
         print("[INFO] O firewall 'ufw' está desativado. Não é necessário liberar a porta.")
         return True  # Se ufw estiver desligado, não há bloqueios
 
     # Etapa 2: Verifica se a regra já existe
-    if is_ntp_rule_present():
+    if (is_ntp_rule_present() if rule_present is None else rule_present):
         print("[INFO] Porta UDP 123 já está liberada.")
         return True
 
@@ -84,49 +94,172 @@ def get_last_modification_time(file_path):
         return None
 
 
-def set_system_date(dt: str):
+def adjust_system_clock(offset: float, slew: bool = True) -> bool:
     """
-    Set the system date using the date -s command.
+    Corrects the system clock by offset seconds, in process (clock_settime/adjtimex)
+    when we are allowed to, otherwise with `date -s @<epoch.ns>` through the privilege helper.
+    Small offsets are slewed unless slew is False.
     """
     try:
-        date_str = format_system_datetime(dt)
-        subprocess.run(["sudo", "date", "-s", date_str], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5, check=True)
-        print(f"[INFO] System date sync: {date_str}")
-    except subprocess.CalledProcessERRORr as e:
-        print(f"[ERROR] Failed system date sync: {e}")
+        mode = clock.discipline(offset, clock.STEP_THRESHOLD if slew else 0.0)
+        print(f"[INFO] System clock {'stepped' if mode == clock.STEP else 'slewed'} by {offset:+.6f}s")
+        return True
+    except PermissionError:
+        pass
+    except OSError as e:
+        print(f"[ERROR] Failed system clock adjust: {e}")
+        return False
+    try:
+        run_privileged(["date", "-s", clock.date_argument(offset)], capture=True, timeout=5, check=True)
+        print(f"[INFO] System clock stepped by {offset:+.6f}s")
+        return True
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+        print(f"[ERROR] Failed system clock adjust: {e}")
+    return False
 
 
-def check_internet(host):
+def set_system_date(dt: str):
     """
-    Check the internet connection by pinging.
+    Set the system date (datetime or "%Y-%m-%d %H:%M:%S" string) by stepping the clock.
     """
-    try:
-        subprocess.run(["ping", "-c", "1", host], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
-        print("[INFO] Internet connection OK.")
+    if isinstance(dt, str):
+        dt = datetime.strptime(dt, "%Y-%m-%d %H:%M:%S")
+    if adjust_system_clock(dt.timestamp() - time.time(), slew=False):
+        print(f"[INFO] System date sync: {format_system_datetime(dt)}")
+
+
+def check_internet(host, attempts=1, timeout=5):
+    """
+    Check the internet connection with the in-process probe engine (no ping fork).
+    """
+    result = probe(host, count=attempts, interval=0.2, timeout=timeout)
+    if result.received:
+        print(f"[INFO] Internet connection OK ({result.method}, {result.avg:.1f} ms).")
         return True
-    except Exception:
-        print("[ERROR] No internet connection.")
+    print(f"[ERROR] No internet connection.{f' {result.error}' if result.error else ''}")
+    return False
+
+
+def query_ranked(servers, scoreboard: Scoreboard, timeout=2.0, targets=None, race=3):
+    """
+    Races the `race` addresses with the best record in the scoreboard (returning
+    as soon as most of them answered) and only queries the others, then the
+    quarantined ones, when those give no usable answer.
+    Without targets, the addresses resolved in the last RESOLVE_INTERVAL are reused
+    and the names are only resolved again when none of them answers.
+    Returns the samples of every query made; the scoreboard is updated and saved.
+    """
+    samples = []
+    tried = set()
+
+    def attempt(targets):
+        usable, quarantined = scoreboard.rank([t for t in targets if t[1] not in tried], timeout)
+        for batch in (usable[:race], usable[race:], quarantined):
+            if not batch:
+                continue
+            answers = sntp.query_servers(servers, timeout=timeout, targets=batch, enough=race // 2 + 1)
+            tried.update(address for _, address, _ in batch)
+            scoreboard.update(answers)
+            samples.extend(answers)
+            if any(answer.valid for answer in answers):
+                return True
         return False
 
+    if targets is not None:
+        attempt(targets)
+    elif not attempt(scoreboard.known_targets(servers, RESOLVE_INTERVAL)):
+        targets = sntp.resolve_servers(servers)
+        scoreboard.resolved(targets)
+        attempt(targets)
+    scoreboard.save()
+    return samples
+
 
-def sync_with_ntp(servers):
+def sync_with_ntp(servers, timeout=2.0, targets=None, scoreboard=None):
     """
-    Tries to synchronize time with the list of NTP servers.
+    Queries the NTP servers, picks the best sample and corrects the system clock
+    by its offset (slewed when small, stepped when large).
+    With a scoreboard only the best few addresses are raced (see query_ranked),
+    otherwise every server (and every address of the pools) is queried at the same time.
+    targets: addresses already resolved with sntp.resolve_servers (skips DNS).
+    Returns the chosen sntp.SntpSample, or None if no server gave a usable answer.
     """
-    for server in servers:
-        try:
-            subprocess.run(["sudo", "ntpdate", "-u", server], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-            print(f"[INFO] Synchronized with server {server}")
-            return True
-        except subprocess.CalledProcessError:
-            print(f"[WARN] Error when syncing with {server}")
-    return False
+    if scoreboard is not None:
+        samples = query_ranked(servers, scoreboard, timeout=timeout, targets=targets)
+    else:
+        samples = sntp.query_servers(servers, timeout=timeout, targets=targets)
+    for sample in samples:
+        if sample.error and sample.error != sntp.SKIPPED:
+            print(f"[WARN] Error when syncing with {sample.server} ({sample.address}): {sample.error}")
+    best = sntp.select_best(samples)
+    if best is None:
+        return None
+    print(f"[INFO] Best NTP sample: {best.server} ({best.address}) offset {best.offset:+.3f}s, delay {best.delay * 1000:.1f} ms, stratum {best.stratum}")
+    if not adjust_system_clock(best.offset):
+        return None
+    print(f"[INFO] Synchronized with server {best.server}")
+    return best
+
+class PollInterval:
+    """
+    NTP-style poll interval: 2^min_exp .. 2^max_exp seconds (64s .. 1024s).
+    Offsets within `gate` times the observed jitter count as stable and push the
+    interval up, larger ones pull it down (hysteresis through a counter, as ntpd
+    does). An offset that had to be stepped, or a failed poll, goes back to the minimum.
+    """
+    def __init__(self, min_exp: int = 6, max_exp: int = 10, limit: int = 30, gate: float = 4.0, precision: float = 0.001):
+        self.min_exp = min_exp
+        self.max_exp = max_exp
+        self.limit = limit
+        self.gate = gate
+        self.precision = precision
+        self.exp = min_exp
+        self.counter = 0
+        self.jitter = None
+
+    @property
+    def seconds(self) -> int:
+        return 2 ** self.exp
+
+    def update(self, offset: float) -> int:
+        if abs(offset) > clock.STEP_THRESHOLD:
+            self.exp, self.counter, self.jitter = self.min_exp, 0, None
+            return self.seconds
+        jitter = max(self.jitter or abs(offset), self.precision)
+        if abs(offset) <= self.gate * jitter:
+            self.counter += self.exp
+            if self.counter >= self.limit:
+                self.counter = 0
+                self.exp = min(self.exp + 1, self.max_exp)
+        else:
+            self.counter -= 2 * self.exp
+            if self.counter <= -self.limit:
+                self.counter = 0
+                self.exp = max(self.exp - 1, self.min_exp)
+        # RMS of the residual offsets, recent ones weighted more
+        self.jitter = math.sqrt(0.75 * jitter ** 2 + 0.25 * offset ** 2)
+        return self.seconds
+
+    def failed(self) -> int:
+        # Converge again from the minimum; the jitter estimate (clock, not network) is kept
+        self.exp, self.counter = self.min_exp, 0
+        return self.seconds
+
 
 class AjustDate:
+    # Longest poll interval (2^exp s), and the one allowed once the drift model is stable
+    MAX_POLL_EXP = 10
+    STABLE_MAX_POLL_EXP = 12
+
     def __init__(self, config_name_file):
         self.load_config(config_name_file)
-        success = ensure_ntp_port_is_open()
-        if success:
+        self.preflight_cached = self.preflight_unchanged()
+        if self.preflight_cached:
+            print("[INFO] Firewall, timezone and config unchanged since the last check.")
+            self.port_open = True
+            return
+        self.port_open = ensure_ntp_port_is_open()
+        if self.port_open:
             print("[INFO] Porta UDP 123 está liberada ou não há bloqueio.")
         else:
             print("[ERROR] Falha ao liberar a porta UDP 123.")
@@ -138,8 +271,7 @@ class AjustDate:
         self.config_file=os.path.join(self._local_dir, config_name_file)
         if os.path.exists(self.config_file):
             try:
-                with open(self.config_file, "r") as f:
-                    config = yaml.safe_load(f)
+                config = load_yaml(self.config_file) or {}
             except:
                 print(f"[WARN] Failed to read {self.config_file}")
         else:
@@ -148,30 +280,74 @@ class AjustDate:
         self.ping_host=config.get("ping_host", '8.8.8.8')
         self.ntp_servers=config.get("ntp_servers", ['pool.ntp.org'])
         self.last_sync_file=os.path.join(self._local_dir, config.get("last_sync_file", os.path.join('.cache', 'last_sync_file.log')))
+        self.preflight_file=os.path.join(os.path.dirname(self.last_sync_file), 'preflight.json')
+        self.journal=journal.SyncJournal(os.path.splitext(self.last_sync_file)[0] + '.journal')
+        self.scoreboard=Scoreboard(os.path.join(os.path.dirname(self.last_sync_file), 'ntp_scoreboard.json'))
+
+
+    def _preflight_fingerprint(self):
+        return preflight.fingerprint([preflight.UFW_CONF, preflight.UFW_USER_RULES, preflight.LOCALTIME, self.config_file])
+
+
+    def preflight_unchanged(self):
+        """
+        True when the firewall and timezone were verified before and none of the
+        files they depend on (ufw rules, /etc/localtime, the config) changed since.
+        """
+        cached = preflight.load(self.preflight_file)
+        return cached.get("timezone") == self.timezone and cached.get("fingerprint") == self._preflight_fingerprint()
+
+
+    def save_preflight(self):
+        """
+        Records the verified state; fingerprints are taken after any fix was applied.
+        """
+        return preflight.save(self.preflight_file, {"timezone": self.timezone, "fingerprint": self._preflight_fingerprint()})
         
     
     def ensure_timezone(self):
         """
         Check if the timezone is correct. If it is not, try to correct it.
+        Once everything checked out, the result is cached (see preflight_unchanged).
         """
+        if self.preflight_cached:
+            return True
         try:
-            result = subprocess.run(["timedatectl"], capture_output=True, text=True)
-            if self.timezone in result.stdout:
+            if preflight.read_timezone() == self.timezone:
                 print(f"[INFO] ✅ Timezone is already correct: {self.timezone}")
-                return True
-            subprocess.run(["sudo", "timedatectl", "set-timezone", self.timezone], check=True)
-            print(f"[INFO] Timezone set to: {self.timezone}")
-            return True
+            else:
+                result = subprocess.run(["timedatectl"], capture_output=True, text=True)
+                if self.timezone in result.stdout:
+                    print(f"[INFO] ✅ Timezone is already correct: {self.timezone}")
+                else:
+                    run_privileged(["timedatectl", "set-timezone", self.timezone], check=True)
+                    print(f"[INFO] Timezone set to: {self.timezone}")
         except Exception as e:
             print(f"[ERROR] Failed to check/set timezone: {e}")
-        return False
+            return False
+        if self.port_open:
+            self.save_preflight()
+        return True
         
         
     def get_min_date(self):
         """
-        Sets the minimum date: if there is a log file, use it, otherwise use the last_date from the config.
+        Sets the minimum date: the time of the last sync in the journal (extrapolated
+        with the drift model when it is from this boot), otherwise the legacy
+        log file, otherwise the last modification of the config.
         """
         try:
+            last = self.journal.latest()
+            if last is not None:
+                if last.boot == journal.boot_id():
+                    elapsed = time.monotonic() - last.monotonic
+                    try:
+                        frequency = clock.get_frequency()
+                    except OSError:
+                        frequency = 0.0
+                    estimate = last.true_time + elapsed + self.journal.predict_offset(elapsed, frequency)
+                    return format_system_datetime(datetime.fromtimestamp(estimate))
+                return format_system_datetime(datetime.fromtimestamp(last.true_time))
             if os.path.exists(self.last_sync_file):
                 with open(self.last_sync_file, "r") as file:
                     date_str = file.read().strip()
@@ -182,43 +358,103 @@ class AjustDate:
         return format_system_datetime(last_edit_date or datetime.now())
 
 
-    def save_date_log(self, dt):
+    def save_sync(self, sample):
         """
-        Saves the last valid synchronized date to the log file.
+        Appends a successful sync (sntp.SntpSample) to the journal, which also
+        updates the drift model, and applies the new drift estimate.
         """
         try:
-            dt = format_system_datetime(dt)
-            os.makedirs(os.path.dirname(self.last_sync_file), exist_ok=True)
-            with open(self.last_sync_file, "w") as f:
-                f.write(dt)
-            print(f"[INFO] Date {dt} save in {self.last_sync_file}.")
-            return True
-        except Exception as e:
-            print(f"[ERROR] Failed to save date in log: {e}")
-        return False
+            frequency = clock.get_frequency()
+        except OSError:
+            frequency = 0.0
+        record = journal.new_record(sample.monotonic, sample.local_time, sample.offset, sample.delay, frequency, sample.address)
+        try:
+            self.journal.append(record, clock.STEP_THRESHOLD)
+        except OSError as e:
+            print(f"[ERROR] Failed to save sync in {self.journal.path}: {e}")
+            return False
+        print(f"[INFO] Sync saved in {self.journal.path}.")
+        self.apply_drift_model()
+        return True
 
 
-def main(config_file: str):
+    def apply_drift_model(self):
+        """
+        Hands the estimated oscillator drift to the kernel (adjtimex frequency), which
+        then corrects the clock continuously between syncs. Needed again after every boot.
+        """
+        if not self.journal.samples:
+            return False
+        try:
+            ppm = clock.set_frequency(self.journal.frequency)
+        except OSError as e:
+            print(f"[WARN] Unable to apply the clock drift correction: {e}")
+            return False
+        print(f"[INFO] Clock drift correction: {ppm:+.3f} ppm ({self.journal.samples} samples, last error {self.journal.error:+.3f} ppm)")
+        return True
+
+
+    def run_daemon(self, stop: threading.Event = None):
+        """
+        Stays resident: keeps the parsed config and the server scoreboard (with the
+        resolved addresses), and polls the NTP servers at an adaptive interval (see PollInterval) until stop is set.
+        """
+        stop = stop or threading.Event()
+        poll = PollInterval(max_exp=self.MAX_POLL_EXP)
+        while not stop.is_set():
+            best = sync_with_ntp(self.ntp_servers, scoreboard=self.scoreboard)
+            if best is not None:
+                self.save_sync(best)
+                # A predictable clock does not need to be polled as often
+                poll.max_exp = self.STABLE_MAX_POLL_EXP if self.journal.stable else self.MAX_POLL_EXP
+                poll.exp = min(poll.exp, poll.max_exp)
+                delay = poll.update(best.offset)
+            else:
+                print("[WARN] Unable to synchronize with any NTP server.")
+                delay = poll.failed()
+            print(f"[INFO] Next NTP poll in {delay}s")
+            stop.wait(delay)
+
+
+def main(config_file: str, daemon: bool = False):
     ad = AjustDate(config_file)
     
     if not ad.ensure_timezone():
         sys.exit(1)
 
+    ad.apply_drift_model()
+    # The clock may be behind after a boot without RTC/network, never move it back
     min_date = ad.get_min_date()
-    set_system_date(min_date)
+    if datetime.strptime(min_date, "%Y-%m-%d %H:%M:%S") > datetime.now():
+        set_system_date(min_date)
+
+    if daemon:
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        try:
+            ad.run_daemon(stop)
+        except KeyboardInterrupt:
+            pass
+        return
 
     if not check_internet(ad.ping_host):
         sys.exit(1)
 
-    if sync_with_ntp(ad.ntp_servers):
+    best = sync_with_ntp(ad.ntp_servers, scoreboard=ad.scoreboard)
+    if best:
         now = datetime.now()        
         print(f"[INFO] ✅ Synchronized date and time: {format_system_datetime(now)}")
-        if not ad.save_date_log(now):
+        if not ad.save_sync(best):
             sys.exit(1)
     else:
         print("[FAIL] ❌ Unable to synchronize with any NTP server.")
         sys.exit(1)
 
 
-if __name__ == "__main__":    
-    main(config_file="settings.yaml")
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Synchronize system date and time.")
+    parser.add_argument("--daemon", action="store_true", help="stay resident and poll the NTP servers at an adaptive interval")
+    parser.add_argument("--config", default="settings.yaml")
+    args = parser.parse_args()
+    main(config_file=args.config, daemon=args.daemon)
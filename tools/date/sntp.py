@@ -0,0 +1,233 @@
+import os
+import select
+import socket
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+# Force Python not to create .pyc files
+sys.dont_write_bytecode = True
+
+NTP_PORT = 123
+NTP_EPOCH_OFFSET = 2208988800  # seconds between 1900-01-01 and 1970-01-01
+NTP_PACKET = struct.Struct("!BBbbII4sQQQQ")
+
+MODE_CLIENT = 3
+MODE_SERVER = 4
+LEAP_UNSYNCHRONIZED = 3
+
+# Error of the queries that were still pending when enough answers had arrived
+SKIPPED = "skipped"
+
+
+def to_ntp(timestamp: float) -> int:
+    """Unix time -> 64-bit NTP timestamp."""
+    return int((timestamp + NTP_EPOCH_OFFSET) * (1 << 32)) & 0xFFFFFFFFFFFFFFFF
+
+
+def from_ntp(value: int) -> float:
+    """64-bit NTP timestamp -> Unix time."""
+    return value / (1 << 32) - NTP_EPOCH_OFFSET
+
+
+class SntpSample:
+    """
+    One server reply, or the reason it was rejected (error).
+    offset: how much the local clock must be moved (seconds, + means ahead of us)
+    delay: round trip delay (seconds)
+    local_time/monotonic: when the reply arrived, on the wall and the monotonic clock
+    """
+    def __init__(self, server: str, address: str):
+        self.server = server
+        self.address = address
+        self.offset: Optional[float] = None
+        self.delay: Optional[float] = None
+        self.stratum: Optional[int] = None
+        self.leap: Optional[int] = None
+        self.refid: Optional[str] = None
+        self.error: Optional[str] = None
+        self.local_time: Optional[float] = None
+        self.monotonic: Optional[float] = None
+
+    @property
+    def valid(self) -> bool:
+        return self.error is None and self.offset is not None
+
+    def to_dict(self) -> Dict:
+        return {
+            "server": self.server,
+            "address": self.address,
+            "offset": self.offset,
+            "delay": self.delay,
+            "stratum": self.stratum,
+            "leap": self.leap,
+            "refid": self.refid,
+            "error": self.error,
+        }
+
+    def __repr__(self):
+        if self.error:
+            return f"SntpSample({self.server} {self.address}: {self.error})"
+        return f"SntpSample({self.server} {self.address}: offset={self.offset:+.6f}s delay={self.delay:.6f}s stratum={self.stratum})"
+
+
+def build_request(transmit: int) -> bytes:
+    """
+    SNTP v4 client request. Our transmit timestamp comes back as the origin
+    timestamp, which ties the reply to this request.
+    """
+    return NTP_PACKET.pack((0 << 6) | (4 << 3) | MODE_CLIENT, 0, 0, 0, 0, 0, b"\x00" * 4, 0, 0, 0, transmit)
+
+
+def parse_reply(sample: SntpSample, data: bytes, transmit: int, t1: float, t4: float, max_delay: float) -> SntpSample:
+    """
+    Fills sample from a server reply; sets sample.error when the reply must be rejected.
+    t1/t4: local send/receive times (Unix time).
+    """
+    if len(data) < NTP_PACKET.size:
+        sample.error = "short reply"
+        return sample
+    flags, stratum, _, _, _, _, refid, _, origin, receive, server_transmit = NTP_PACKET.unpack(data[:NTP_PACKET.size])
+    sample.leap, mode = flags >> 6, flags & 0x7
+    sample.stratum = stratum
+    if stratum == 0:
+        # Kiss-o'-Death: the reference id carries an ASCII code (RATE, DENY, RSTR...)
+        sample.refid = refid.decode("ascii", "replace").strip("\x00")
+        sample.error = f"kiss-o'-death {sample.refid}"
+        return sample
+    sample.refid = socket.inet_ntoa(refid) if stratum > 1 else refid.decode("ascii", "replace").strip("\x00")
+    if mode != MODE_SERVER:
+        sample.error = f"unexpected mode {mode}"
+    elif origin != transmit:
+        sample.error = "origin timestamp mismatch"
+    elif stratum > 15:
+        sample.error = f"bad stratum {stratum}"
+    elif sample.leap == LEAP_UNSYNCHRONIZED:
+        sample.error = "server not synchronized"
+    elif receive == 0 or server_transmit == 0:
+        sample.error = "zero timestamp"
+    if sample.error:
+        return sample
+
+    t2, t3 = from_ntp(receive), from_ntp(server_transmit)
+    sample.offset = ((t2 - t1) + (t3 - t4)) / 2
+    sample.delay = (t4 - t1) - (t3 - t2)
+    if sample.delay > max_delay:
+        sample.error = f"excessive delay {sample.delay:.3f}s"
+    return sample
+
+
+def resolve_servers(servers: List[str], port: int = NTP_PORT) -> List[Tuple[str, str, int]]:
+    """
+    Expands every server name (e.g. a pool) to all the addresses it resolves to,
+    resolving the names in parallel.
+    Returns unique (server, address, family) tuples; unresolvable names are skipped.
+    """
+    def lookup(server: str):
+        try:
+            return socket.getaddrinfo(server, port, 0, socket.SOCK_DGRAM)
+        except OSError as e:
+            print(f"[WARN] Could not resolve {server}: {e}")
+            return []
+
+    servers = list(dict.fromkeys(servers))
+    if not servers:
+        return []
+    with ThreadPoolExecutor(max_workers=len(servers)) as executor:
+        resolved = list(executor.map(lookup, servers))
+
+    targets = []
+    seen = set()
+    for server, infos in zip(servers, resolved):
+        for family, _, _, _, sockaddr in infos:
+            if sockaddr[0] not in seen:
+                seen.add(sockaddr[0])
+                targets.append((server, sockaddr[0], family))
+    return targets
+
+
+def query_servers(
+    servers: List[str],
+    timeout: float = 2.0,
+    max_delay: float = 1.0,
+    port: int = NTP_PORT,
+    targets: Optional[List[Tuple[str, str, int]]] = None,
+    enough: Optional[int] = None,
+) -> List[SntpSample]:
+    """
+    Queries every address of every server at the same time and waits at most
+    `timeout` seconds in total, or until `enough` valid answers arrived (the
+    queries still pending then get the SKIPPED error).
+    Returns one SntpSample per address.
+    """
+    if targets is None:
+        targets = resolve_servers(servers, port)
+    pending = {}
+    samples = []
+    received = 0
+    try:
+        for server, address, family in targets:
+            sample = SntpSample(server, address)
+            samples.append(sample)
+            # A random transmit timestamp hides our clock (t1 is kept locally)
+            transmit = int.from_bytes(os.urandom(8), "big")
+            try:
+                sock = socket.socket(family, socket.SOCK_DGRAM)
+            except OSError as e:
+                sample.error = str(e)
+                continue
+            sock.setblocking(False)
+            try:
+                sock.connect((address, port))
+                t1_mono = time.monotonic()
+                t1 = time.time()
+                sock.send(build_request(transmit))
+            except OSError as e:
+                sample.error = str(e)
+                sock.close()
+                continue
+            pending[sock] = (sample, transmit, t1, t1_mono)
+
+        deadline = time.monotonic() + timeout
+        while pending and (enough is None or received < enough):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select(list(pending), [], [], remaining)
+            for sock in ready:
+                sample, transmit, t1, t1_mono = pending.pop(sock)
+                try:
+                    data = sock.recv(512)
+                except OSError as e:
+                    sample.error = str(e)
+                    sock.close()
+                    continue
+                # t4 on the same timeline as t1, immune to clock steps during the query
+                sample.monotonic = time.monotonic()
+                t4 = sample.local_time = t1 + (sample.monotonic - t1_mono)
+                sock.close()
+                parse_reply(sample, data, transmit, t1, t4, max_delay)
+                received += sample.valid
+    finally:
+        timed_out = enough is None or received < enough
+        for sock, (sample, _, _, _) in pending.items():
+            sample.error = "timeout" if timed_out else SKIPPED
+            sock.close()
+    return samples
+
+
+def select_best(samples: List[SntpSample], agreement: float = 0.128) -> Optional[SntpSample]:
+    """
+    Simple clock selection: keep the valid samples whose offset is within
+    `agreement` seconds (+ half their delay) of the median offset (the majority
+    clique), then pick the one with the lowest delay, lower stratum on ties.
+    """
+    valid = [s for s in samples if s.valid]
+    if not valid:
+        return None
+    offsets = sorted(s.offset for s in valid)
+    median = offsets[len(offsets) // 2]
+    agreeing = [s for s in valid if abs(s.offset - median) <= agreement + s.delay / 2]
+    return min(agreeing or valid, key=lambda s: (s.delay, s.stratum))
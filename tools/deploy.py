@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Root-owned install layout for the systemd units.
+
+The services do not run from the (user-writable) source tree: `install()` copies
+the tools package to INSTALL_DIR together with precompiled bytecode
+(`--invalidation-mode checked-hash`), and the unit files start the scripts from
+there with `python3 -m`, which uses that bytecode. Checked-hash .pyc files are
+validated against the hash of their source instead of its mtime, so they stay
+valid when copied and are never silently stale. The source tree itself stays
+free of __pycache__ (sys.dont_write_bytecode).
+
+    sudo python3 -m tools.deploy [--target /opt/dns_and_date]
+"""
+import compileall
+import filecmp
+import os
+import py_compile
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import List
+
+# Prevent Python from generating .pyc files
+sys.dont_write_bytecode = True
+
+try:
+    from .privileged import run_many
+except ImportError:
+    from privileged import run_many
+
+INSTALL_DIR = "/opt/dns_and_date"
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "tools"
+
+# Shipped files; runtime state (.cache) is kept across installs
+SHIPPED_SUFFIXES = (".py", ".yaml")
+STATE_DIRS = (os.path.join(PACKAGE, "date", ".cache"),)
+
+
+def _source_files(source: str) -> List[str]:
+    """
+    Paths (relative to source) of the package files to ship.
+    """
+    files = []
+    for root, dirs, names in os.walk(os.path.join(source, PACKAGE)):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d != "__pycache__")
+        for name in sorted(names):
+            if name.endswith(SHIPPED_SUFFIXES):
+                files.append(os.path.relpath(os.path.join(root, name), source))
+    return files
+
+
+def up_to_date(target: str = INSTALL_DIR, source: str = PROJECT_DIR) -> bool:
+    """
+    True if target already ships exactly the package files of source, byte for byte.
+    """
+    files = _source_files(source)
+    if not os.path.isdir(target) or _source_files(target) != files:
+        return False
+    return all(filecmp.cmp(os.path.join(source, path), os.path.join(target, path), shallow=False) for path in files)
+
+
+def build(staging: str, source: str = PROJECT_DIR) -> bool:
+    """
+    Copies the package into staging and compiles it to checked-hash bytecode.
+    """
+    for path in _source_files(source):
+        destination = os.path.join(staging, path)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(os.path.join(source, path), destination)
+        os.chmod(destination, 0o644)
+    for root, dirs, _ in os.walk(staging):
+        for name in dirs:
+            os.chmod(os.path.join(root, name), 0o755)
+    return compileall.compile_dir(
+        os.path.join(staging, PACKAGE),
+        quiet=1,
+        invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH,
+    )
+
+
+def _seed_state(staging: str, source: str = PROJECT_DIR) -> None:
+    """
+    First install: brings the runtime state of the source tree (sync journal,
+    preflight cache, NTP scoreboard) along, so the services do not start cold.
+    """
+    # build() skips dot directories, so the state directories are not in staging yet
+    for state in STATE_DIRS:
+        if os.path.isdir(os.path.join(source, state)):
+            try:
+                shutil.copytree(os.path.join(source, state), os.path.join(staging, state))
+            except (OSError, shutil.Error) as e:
+                print(f"[WARN] Failed to copy {state} from {source}, starting without it: {e}")
+
+
+def _stale(staging: str, target: str) -> List[str]:
+    """
+    Paths in target that staging no longer has (deleted sources and their bytecode),
+    top-most only; the runtime state is kept.
+    """
+    stale = []
+    for root, dirs, names in os.walk(target):
+        relative = os.path.relpath(root, target)
+        for name in sorted(dirs) + sorted(names):
+            path = os.path.normpath(os.path.join(relative, name))
+            if path in STATE_DIRS:
+                continue
+            if not os.path.lexists(os.path.join(staging, path)):
+                stale.append(os.path.join(target, path))
+        dirs[:] = [d for d in dirs if os.path.isdir(os.path.join(staging, relative, d))]
+    return stale
+
+
+def _swap(staging: str, target: str) -> None:
+    """
+    Puts staging in place of target, moving over the runtime state of the old install.
+    The old tree is renamed away first, so the target path is missing only between two renames.
+    """
+    old = None
+    if os.path.exists(target):
+        for state in STATE_DIRS:
+            if os.path.isdir(os.path.join(target, state)):
+                os.makedirs(os.path.dirname(os.path.join(staging, state)), exist_ok=True)
+                os.rename(os.path.join(target, state), os.path.join(staging, state))
+        old = f"{target}.old-{os.getpid()}"
+        os.rename(target, old)
+    os.rename(staging, target)
+    if old:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def install(target: str = INSTALL_DIR, source: str = PROJECT_DIR) -> bool:
+    """
+    Builds and installs the package into target (root-owned, 0755/0644), unless
+    it is already up to date. As root the built tree is renamed into place;
+    otherwise it is copied over the old one through the privilege helper and
+    the files it no longer ships are removed. A first install takes over the
+    runtime state (STATE_DIRS) of the source tree.
+    Returns True if successful, False otherwise.
+    """
+    if up_to_date(target, source):
+        print(f"[INFO] {target} is up to date")
+        return True
+    print(f"[INFO] Installing {PACKAGE} into {target}")
+    parent = os.path.dirname(os.path.abspath(target))
+    is_root = hasattr(os, "geteuid") and os.geteuid() == 0
+    try:
+        if is_root:
+            os.makedirs(parent, exist_ok=True)
+        # Build next to the target (same filesystem) so it can be renamed into place
+        staging = tempfile.mkdtemp(prefix=f".{os.path.basename(target)}.new-", dir=parent if is_root else None)
+        os.chmod(staging, 0o755)
+    except OSError as e:
+        print(f"[ERROR] Failed to prepare {target}: {e}")
+        return False
+
+    try:
+        if not build(staging, source):
+            print("[ERROR] Failed to compile the package")
+            return False
+        if not os.path.exists(target):
+            _seed_state(staging, source)
+        if is_root:
+            _swap(staging, target)
+            staging = None
+        else:
+            # Copied over the old tree, then what it no longer ships is removed
+            stale = _stale(staging, target)
+            commands = [["cp", "-rT", staging, target]]
+            if stale:
+                commands.append(["rm", "-rf"] + stale)
+            run_many(commands, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"[ERROR] Failed to install into {target}: {e}")
+        return False
+    finally:
+        if staging:
+            shutil.rmtree(staging, ignore_errors=True)
+    print(f"[INFO] Installed {PACKAGE} into {target}")
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Install the tools package with precompiled bytecode.")
+    parser.add_argument("--target", default=INSTALL_DIR)
+    args = parser.parse_args()
+    sys.exit(0 if install(args.target) else 1)
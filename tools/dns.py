@@ -0,0 +1,360 @@
+import math
+import random
+import socket
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+# Prevent Python from generating .pyc files
+sys.dont_write_bytecode = True
+
+DNS_PORT = 53
+QTYPE_A = 1
+QTYPE_SOA = 6
+QTYPE_AAAA = 28
+QTYPE_OPT = 41
+QCLASS_IN = 1
+
+RCODE_NOERROR = 0
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+RCODE_REFUSED = 5
+
+FLAG_QR = 0x8000
+FLAG_TC = 0x0200
+FLAG_RD = 0x0100
+FLAG_CD = 0x0010
+# DNSSEC OK, in the flags of the OPT record
+EDNS_DO = 0x8000
+
+DEFAULT_BENCHMARK_NAMES = ["www.google.com", "github.com", "wikipedia.org", "ubuntu.com"]
+
+
+def encode_name(name: str) -> bytes:
+    """
+    Encodes a domain name in DNS wire format.
+    """
+    out = b""
+    for label in name.strip(".").split("."):
+        if label:
+            raw = label.encode("idna")
+            out += struct.pack("!B", len(raw)) + raw
+    return out + b"\x00"
+
+
+def build_query(name: str, qtype: int = QTYPE_A, query_id: Optional[int] = None) -> bytes:
+    """
+    Builds a recursive DNS query for name.
+    """
+    if query_id is None:
+        query_id = random.getrandbits(16)
+    header = struct.pack("!HHHHHH", query_id, FLAG_RD, 1, 0, 0, 0)
+    return header + encode_name(name) + struct.pack("!HH", qtype, QCLASS_IN)
+
+
+def parse_header(message: bytes) -> Tuple[int, int, int]:
+    """
+    Returns (id, flags, rcode) of a DNS message.
+    Raises ValueError if the message is too short.
+    """
+    if len(message) < 12:
+        raise ValueError("DNS message too short")
+    query_id, flags = struct.unpack("!HH", message[:4])
+    return query_id, flags, flags & 0x000F
+
+
+def _skip_name(message: bytes, offset: int) -> int:
+    """
+    Returns the offset right after the (possibly compressed) name at offset.
+    """
+    while True:
+        if offset >= len(message):
+            raise ValueError("name runs past end of message")
+        length = message[offset]
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        if length == 0:
+            return offset + 1
+        offset += 1 + length
+
+
+def _read_name(message: bytes, offset: int) -> str:
+    labels = []
+    for _ in range(128):
+        if offset >= len(message):
+            raise ValueError("name runs past end of message")
+        length = message[offset]
+        if length & 0xC0 == 0xC0:
+            offset = struct.unpack("!H", message[offset:offset + 2])[0] & 0x3FFF
+            continue
+        if length == 0:
+            return ".".join(labels)
+        labels.append(message[offset + 1:offset + 1 + length].decode("ascii", "replace"))
+        offset += 1 + length
+    raise ValueError("compression loop in name")
+
+
+def parse_question(message: bytes) -> Tuple[str, int, int]:
+    """
+    Returns (name, qtype, qclass) of the first question, name lowercased.
+    Raises ValueError on malformed messages.
+    """
+    if len(message) < 12 or struct.unpack("!H", message[4:6])[0] < 1:
+        raise ValueError("message without question")
+    end = _skip_name(message, 12)
+    if end + 4 > len(message):
+        raise ValueError("question runs past end of message")
+    qtype, qclass = struct.unpack("!HH", message[end:end + 4])
+    return _read_name(message, 12).lower(), qtype, qclass
+
+
+def query_options(message: bytes) -> Tuple[int, bool, bool]:
+    """
+    What a query asks beyond its question that changes the answer:
+    (EDNS UDP payload size, 0 without EDNS; DO bit, DNSSEC records wanted; CD flag).
+    Raises ValueError on malformed messages.
+    """
+    payload, dnssec_ok = 0, False
+    for section, rtype, ttl_offset, _ in iter_records(message):
+        if section == 2 and rtype == QTYPE_OPT:
+            payload = struct.unpack("!H", message[ttl_offset - 2:ttl_offset])[0]
+            dnssec_ok = bool(struct.unpack("!H", message[ttl_offset + 2:ttl_offset + 4])[0] & EDNS_DO)
+    return payload, dnssec_ok, bool(parse_header(message)[1] & FLAG_CD)
+
+
+def iter_records(message: bytes):
+    """
+    Yields (section, rtype, ttl_offset, rdata_offset) for every resource record.
+    section is 0 (answer), 1 (authority) or 2 (additional).
+    Raises ValueError on truncated or malformed messages.
+    """
+    if len(message) < 12:
+        raise ValueError("DNS message too short")
+    counts = struct.unpack("!HHHH", message[4:12])
+    offset = 12
+    for _ in range(counts[0]):
+        offset = _skip_name(message, offset) + 4
+    for section, count in enumerate(counts[1:]):
+        for _ in range(count):
+            offset = _skip_name(message, offset)
+            if offset + 10 > len(message):
+                raise ValueError("record runs past end of message")
+            rtype, _, _, rdlength = struct.unpack("!HHIH", message[offset:offset + 10])
+            yield section, rtype, offset + 4, offset + 10
+            offset += 10 + rdlength
+            if offset > len(message):
+                raise ValueError("record runs past end of message")
+
+
+def cache_ttl(message: bytes, max_negative_ttl: int = 300) -> Optional[int]:
+    """
+    How long a response may be cached, in seconds:
+    - positive answers: the smallest TTL of all records (OPT excluded)
+    - NXDOMAIN/NODATA: min(SOA TTL, SOA MINIMUM), capped at max_negative_ttl (RFC 2308)
+    Returns None when the response must not be cached.
+    """
+    _, flags, rcode = parse_header(message)
+    if flags & FLAG_TC or rcode not in (RCODE_NOERROR, RCODE_NXDOMAIN):
+        return None
+    ttls = []
+    negative = []
+    answers = struct.unpack("!H", message[6:8])[0]
+    for section, rtype, ttl_offset, rdata_offset in iter_records(message):
+        if rtype == QTYPE_OPT:
+            continue
+        ttl = struct.unpack("!I", message[ttl_offset:ttl_offset + 4])[0]
+        ttls.append(ttl)
+        if section == 1 and rtype == QTYPE_SOA:
+            # MINIMUM is the last 32-bit field of the SOA rdata
+            rdlength = struct.unpack("!H", message[rdata_offset - 2:rdata_offset])[0]
+            end = rdata_offset + rdlength
+            negative.append(min(ttl, struct.unpack("!I", message[end - 4:end])[0]))
+    if rcode == RCODE_NXDOMAIN or answers == 0:
+        return min(negative[0], max_negative_ttl) if negative else None
+    return min(ttls) if ttls else None
+
+
+def age_response(message: bytes, query_id: int, elapsed: int) -> bytes:
+    """
+    Returns a cached response with the id of the new query and every TTL
+    decreased by the seconds it spent in the cache.
+    """
+    data = bytearray(message)
+    struct.pack_into("!H", data, 0, query_id)
+    if elapsed > 0:
+        for _, rtype, ttl_offset, _ in iter_records(message):
+            if rtype == QTYPE_OPT:
+                continue
+            ttl = struct.unpack_from("!I", data, ttl_offset)[0]
+            struct.pack_into("!I", data, ttl_offset, max(0, ttl - elapsed))
+    return bytes(data)
+
+
+def _query_udp(query: bytes, server: str, port: int, timeout: float) -> bytes:
+    family = socket.AF_INET6 if ":" in server else socket.AF_INET
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect((server, port))
+        sock.send(query)
+        deadline = time.monotonic() + timeout
+        while True:
+            response = sock.recv(4096)
+            # Ignore stray datagrams that do not answer this query
+            if response[:2] == query[:2]:
+                return response
+            sock.settimeout(max(deadline - time.monotonic(), 0.001))
+
+
+def _query_tcp(query: bytes, server: str, port: int, timeout: float) -> bytes:
+    family = socket.AF_INET6 if ":" in server else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect((server, port))
+        sock.sendall(struct.pack("!H", len(query)) + query)
+
+        def read(size: int) -> bytes:
+            data = b""
+            while len(data) < size:
+                chunk = sock.recv(size - len(data))
+                if not chunk:
+                    raise ConnectionError("connection closed by DNS server")
+                data += chunk
+            return data
+
+        (length,) = struct.unpack("!H", read(2))
+        return read(length)
+
+
+def query(server: str, name: str, qtype: int = QTYPE_A, port: int = DNS_PORT, timeout: float = 2.0) -> Tuple[bytes, str]:
+    """
+    Sends one query over UDP and retries over TCP when the answer is truncated
+    or UDP is rejected.
+    Returns (response, transport). Raises OSError on timeout/failure.
+    """
+    message = build_query(name, qtype)
+    try:
+        response = _query_udp(message, server, port, timeout)
+        if not parse_header(response)[1] & FLAG_TC:
+            return response, "udp"
+    except (ConnectionRefusedError, ValueError):
+        pass
+    return _query_tcp(message, server, port, timeout), "tcp"
+
+
+class DnsBenchmark:
+    """
+    Latency measurements of one nameserver.
+    cold: first lookup of each name, warm: repeated lookups (served from the server cache).
+    Latencies are in ms.
+    """
+    def __init__(self, server: str):
+        self.server = server
+        self.cold: List[float] = []
+        self.warm: List[float] = []
+        self.failures = 0
+        self.queries = 0
+        self.transports: Dict[str, int] = {}
+
+    @property
+    def failure_rate(self) -> float:
+        return (self.failures / self.queries) * 100 if self.queries else 100.0
+
+    @staticmethod
+    def _median(samples: List[float]) -> Optional[float]:
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        middle = len(ordered) // 2
+        if len(ordered) % 2:
+            return ordered[middle]
+        return (ordered[middle - 1] + ordered[middle]) / 2
+
+    @property
+    def cold_median(self) -> Optional[float]:
+        return self._median(self.cold)
+
+    @property
+    def warm_median(self) -> Optional[float]:
+        return self._median(self.warm)
+
+    @property
+    def worst(self) -> Optional[float]:
+        samples = self.cold + self.warm
+        return max(samples) if samples else None
+
+    def score(self, timeout: float = 2.0) -> float:
+        """
+        Expected lookup cost in ms: failed queries are charged a full timeout.
+        Lower is better.
+        """
+        if not self.queries:
+            return math.inf
+        samples = self.cold + self.warm
+        timeout_ms = timeout * 1000.0
+        return (sum(samples) + self.failures * timeout_ms) / self.queries
+
+    def to_dict(self) -> Dict:
+        return {
+            "server": self.server,
+            "queries": self.queries,
+            "failures": self.failures,
+            "failure_rate": self.failure_rate,
+            "cold_median": self.cold_median,
+            "warm_median": self.warm_median,
+            "worst": self.worst,
+            "transports": self.transports,
+        }
+
+
+def benchmark_server(server: str, names: List[str], port: int = DNS_PORT, timeout: float = 2.0, repeats: int = 2) -> DnsBenchmark:
+    """
+    Resolves every name once (cold) and then `repeats` more times (warm).
+    SERVFAIL/REFUSED and timeouts count as failures; NXDOMAIN is a valid answer.
+    """
+    result = DnsBenchmark(server)
+    for name in names:
+        for attempt in range(1 + repeats):
+            result.queries += 1
+            start = time.monotonic()
+            try:
+                response, transport = query(server, name, port=port, timeout=timeout)
+                _, _, rcode = parse_header(response)
+            except (OSError, ValueError):
+                result.failures += 1
+                continue
+            elapsed = (time.monotonic() - start) * 1000.0
+            if rcode in (RCODE_SERVFAIL, RCODE_REFUSED):
+                result.failures += 1
+                continue
+            result.transports[transport] = result.transports.get(transport, 0) + 1
+            (result.cold if attempt == 0 else result.warm).append(elapsed)
+    return result
+
+
+def benchmark_servers(servers: List[str], names: Optional[List[str]] = None, port: int = DNS_PORT, timeout: float = 2.0, repeats: int = 2) -> List[DnsBenchmark]:
+    """
+    Benchmarks all servers in parallel.
+    Returns the results ordered fastest-first (see DnsBenchmark.score).
+    """
+    names = names or DEFAULT_BENCHMARK_NAMES
+    if not servers:
+        return []
+    with ThreadPoolExecutor(max_workers=len(servers)) as executor:
+        results = list(executor.map(lambda s: benchmark_server(s, names, port, timeout, repeats), servers))
+    return sorted(results, key=lambda r: r.score(timeout))
+
+
+def suggest_resolver_options(results: List[DnsBenchmark]) -> Dict[str, int]:
+    """
+    Derives resolv.conf `timeout:`/`attempts:` from the measured latencies.
+    The timeout is ~3x the worst observed answer of the working servers (1-5s, glibc
+    only accepts whole seconds); one more attempt is allowed when any server failed.
+    """
+    worst = [r.worst for r in results if r.worst is not None]
+    timeout = 1
+    if worst:
+        timeout = min(5, max(1, math.ceil(max(worst) * 3 / 1000.0)))
+    attempts = 3 if any(r.failures for r in results) else 2
+    return {"timeout": timeout, "attempts": attempts}
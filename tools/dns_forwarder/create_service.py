@@ -0,0 +1,42 @@
+import os
+import sys
+from typing import List
+
+# Force Python not to create .pyc files
+sys.dont_write_bytecode = True
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+try:
+    from ..deploy import INSTALL_DIR
+except ImportError:
+    INSTALL_DIR = "/opt/dns_and_date"
+
+DEFAULT_LISTEN = "127.0.1.53"
+
+SERVICE_TEMPLATE = """
+[Unit]
+Description=Local caching DNS forwarder.
+After=network.target
+Before=nss-lookup.target
+Wants=nss-lookup.target
+
+[Service]
+Type=simple
+WorkingDirectory={install_dir}
+ExecStart=/usr/bin/python3 -m tools.dns_forwarder.script --listen {listen} {upstreams}
+Restart=on-failure
+RestartSec=2
+
+[Install]
+WantedBy=multi-user.target
+""".strip()
+
+
+def create(upstreams: List[str], listen: str = DEFAULT_LISTEN, install_dir: str = INSTALL_DIR):
+    service_content = SERVICE_TEMPLATE.format(
+        install_dir=install_dir,
+        listen=listen,
+        upstreams=" ".join(f"--upstream {upstream}" for upstream in upstreams),
+    )
+    return service_content, SCRIPT_DIR
@@ -0,0 +1,235 @@
+import argparse
+import os
+import select
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# Force Python not to create .pyc files
+sys.dont_write_bytecode = True
+
+# Allow running this file directly (systemd ExecStart) and still import the tools package
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from tools import dns
+
+DEFAULT_LISTEN = "127.0.1.53"
+
+
+class DnsCache:
+    """
+    TTL-aware LRU cache of DNS responses, bounded by the total size of the stored
+    messages. Negative answers (NXDOMAIN/NODATA) are cached using the SOA minimum.
+    """
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024, max_ttl: int = 86400, max_negative_ttl: int = 300):
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+        self.max_negative_ttl = max_negative_ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, Tuple[float, float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple, query_id: int) -> Optional[bytes]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            expires, stored, response = entry
+        return dns.age_response(response, query_id, int(now - stored))
+
+    def put(self, key: Tuple, response: bytes) -> None:
+        try:
+            ttl = dns.cache_ttl(response, self.max_negative_ttl)
+        except (ValueError, struct.error):
+            return
+        if not ttl or len(response) > self.max_bytes:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (now + min(ttl, self.max_ttl), now, response)
+            self.size += len(response)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Tuple) -> None:
+        _, _, response = self._entries.pop(key)
+        self.size -= len(response)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DnsForwarder:
+    """
+    Answers from the cache; on a miss, sends the query to every upstream at once
+    and replies with the first valid answer (anything but SERVFAIL/REFUSED).
+    """
+    def __init__(self, upstreams: List[str], cache: Optional[DnsCache] = None, timeout: float = 2.0, port: int = dns.DNS_PORT):
+        self.upstreams = upstreams
+        self.cache = cache or DnsCache()
+        self.timeout = timeout
+        self.port = port
+
+    def _race(self, message: bytes) -> Optional[bytes]:
+        question = dns.parse_question(message)
+        fallback = None
+        sockets = []
+        try:
+            for upstream in self.upstreams:
+                family = socket.AF_INET6 if ":" in upstream else socket.AF_INET
+                sock = socket.socket(family, socket.SOCK_DGRAM)
+                sock.setblocking(False)
+                try:
+                    sock.connect((upstream, self.port))
+                    sock.send(message)
+                except OSError:
+                    sock.close()
+                    continue
+                sockets.append(sock)
+
+            deadline = time.monotonic() + self.timeout
+            while sockets:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                ready, _, _ = select.select(sockets, [], [], remaining)
+                for sock in ready:
+                    try:
+                        response = sock.recv(65535)
+                    except OSError:
+                        # e.g. ICMP port unreachable from this upstream
+                        sockets.remove(sock)
+                        sock.close()
+                        continue
+                    try:
+                        _, flags, rcode = dns.parse_header(response)
+                        if response[:2] != message[:2] or not flags & dns.FLAG_QR:
+                            continue
+                        if dns.parse_question(response) != question:
+                            continue
+                    except (ValueError, struct.error, IndexError):
+                        continue
+                    if rcode in (dns.RCODE_SERVFAIL, dns.RCODE_REFUSED):
+                        fallback = response
+                        sockets.remove(sock)
+                        sock.close()
+                        continue
+                    return response
+        finally:
+            for sock in sockets:
+                sock.close()
+        return fallback
+
+    def _resolve_tcp(self, message: bytes) -> Optional[bytes]:
+        for upstream in self.upstreams:
+            try:
+                return dns._query_tcp(message, upstream, self.port, self.timeout)
+            except OSError:
+                continue
+        return None
+
+    def resolve(self, message: bytes, over_tcp: bool = False) -> Optional[bytes]:
+        """
+        Returns the answer for a raw client query, or None if no upstream answered.
+        """
+        try:
+            # Answers differ with EDNS (size, DNSSEC records) and CD: they are part of the key
+            key = dns.parse_question(message) + dns.query_options(message)
+            query_id = dns.parse_header(message)[0]
+        except (ValueError, struct.error, IndexError):
+            return None
+        cached = self.cache.get(key, query_id)
+        if cached is not None:
+            return cached
+
+        response = self._race(message)
+        if response is not None and dns.parse_header(response)[1] & dns.FLAG_TC and over_tcp:
+            response = self._resolve_tcp(message)
+        if response is not None:
+            self.cache.put(key, response)
+        return response
+
+
+def serve(forwarder: DnsForwarder, listen: str = DEFAULT_LISTEN, port: int = dns.DNS_PORT):
+    """
+    Starts the UDP and TCP listeners. Returns the two servers (already serving in threads).
+    """
+    class UdpHandler(socketserver.BaseRequestHandler):
+        def handle(self):
+            data, sock = self.request
+            response = forwarder.resolve(data)
+            if response is not None:
+                sock.sendto(response, self.client_address)
+
+    class TcpHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            while True:
+                header = self.rfile.read(2)
+                if len(header) < 2:
+                    return
+                data = self.rfile.read(struct.unpack("!H", header)[0])
+                response = forwarder.resolve(data, over_tcp=True)
+                if response is None:
+                    return
+                self.wfile.write(struct.pack("!H", len(response)) + response)
+
+    family = socket.AF_INET6 if ":" in listen else socket.AF_INET
+
+    class UdpServer(socketserver.ThreadingUDPServer):
+        address_family = family
+        daemon_threads = True
+        allow_reuse_address = True
+
+    class TcpServer(socketserver.ThreadingTCPServer):
+        address_family = family
+        daemon_threads = True
+        allow_reuse_address = True
+
+    servers = [UdpServer((listen, port), UdpHandler), TcpServer((listen, port), TcpHandler)]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return servers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local caching DNS forwarder.")
+    parser.add_argument("--listen", default=DEFAULT_LISTEN)
+    parser.add_argument("--port", type=int, default=dns.DNS_PORT)
+    parser.add_argument("--upstream", action="append", required=True, help="upstream DNS server (repeatable)")
+    parser.add_argument("--upstream-port", type=int, default=dns.DNS_PORT)
+    parser.add_argument("--cache-size", type=int, default=4 * 1024 * 1024, help="cache size in bytes")
+    parser.add_argument("--timeout", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    forwarder = DnsForwarder(args.upstream, DnsCache(args.cache_size), args.timeout, args.upstream_port)
+    servers = serve(forwarder, args.listen, args.port)
+    print(f"[INFO] DNS forwarder listening on {args.listen}:{args.port}, upstreams: {', '.join(args.upstream)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+import json
+import math
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+# Prevent Python from generating .pyc files
+sys.dont_write_bytecode = True
+
+try:
+    from .adaptive import AdaptiveScheduler
+    from .probe import probe
+except ImportError:
+    from adaptive import AdaptiveScheduler
+    from probe import probe
+
+DEFAULT_WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+METRIC_PREFIX = "dns_and_date_probe"
+
+
+class RingBuffer:
+    """
+    Fixed-size FIFO on a preallocated list.
+    append() returns the item it had to drop when full, or None.
+    """
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._items: List = [None] * self.capacity
+        self._head = 0
+        self.size = 0
+
+    def append(self, item):
+        evicted = None
+        if self.size == self.capacity:
+            evicted = self.popleft()
+        self._items[(self._head + self.size) % self.capacity] = item
+        self.size += 1
+        return evicted
+
+    def peekleft(self):
+        return self._items[self._head] if self.size else None
+
+    def popleft(self):
+        if not self.size:
+            return None
+        item = self._items[self._head]
+        self._items[self._head] = None
+        self._head = (self._head + 1) % self.capacity
+        self.size -= 1
+        return item
+
+    def __len__(self):
+        return self.size
+
+
+class WindowStats:
+    """
+    Loss, RTT percentiles and jitter over a sliding time window.
+    Aggregates are updated on every insertion/eviction, so reading them never
+    rescans the history: counters and sums are O(1), percentiles come from a
+    sorted list maintained with bisect.
+    Each sample is (timestamp, rtt_ms or None, jitter delta or None).
+    """
+    def __init__(self, seconds: float, capacity: int):
+        self.seconds = seconds
+        self.samples = RingBuffer(capacity)
+        self.sent = 0
+        self.lost = 0
+        self.rtt_sum = 0.0
+        self.delta_sum = 0.0
+        self.deltas = 0
+        self._sorted: List[float] = []
+
+    def add(self, timestamp: float, rtt: Optional[float], delta: Optional[float]) -> None:
+        self._account((timestamp, rtt, delta), 1)
+        evicted = self.samples.append((timestamp, rtt, delta))
+        if evicted is not None:
+            self._account(evicted, -1)
+        self.expire(timestamp)
+
+    def expire(self, now: float) -> None:
+        while self.samples.size and self.samples.peekleft()[0] < now - self.seconds:
+            self._account(self.samples.popleft(), -1)
+
+    def _account(self, sample: Tuple, sign: int) -> None:
+        _, rtt, delta = sample
+        self.sent += sign
+        if rtt is None:
+            self.lost += sign
+        else:
+            self.rtt_sum += sign * rtt
+            if sign > 0:
+                insort(self._sorted, rtt)
+            else:
+                del self._sorted[bisect_left(self._sorted, rtt)]
+        if delta is not None:
+            self.delta_sum += sign * delta
+            self.deltas += sign
+
+    @property
+    def loss(self) -> Optional[float]:
+        return self.lost / self.sent if self.sent else None
+
+    @property
+    def avg(self) -> Optional[float]:
+        return self.rtt_sum / len(self._sorted) if self._sorted else None
+
+    @property
+    def jitter(self) -> Optional[float]:
+        """Mean absolute difference between consecutive RTTs (RFC 3550 style)."""
+        return self.delta_sum / self.deltas if self.deltas else None
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._sorted:
+            return None
+        k = (len(self._sorted) - 1) * (p / 100.0)
+        low, high = math.floor(k), math.ceil(k)
+        return self._sorted[low] + (self._sorted[high] - self._sorted[low]) * (k - low)
+
+    def to_dict(self) -> Dict:
+        return {
+            "sent": self.sent,
+            "lost": self.lost,
+            "loss": self.loss,
+            "avg": self.avg,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "jitter": self.jitter,
+        }
+
+
+class HostMonitor:
+    """
+    Rolling metrics of one host over every configured window.
+    """
+    def __init__(self, host: str, windows: Dict[str, float], interval: float, count: int):
+        self.host = host
+        self.windows = {
+            name: WindowStats(seconds, int(seconds / max(interval, 0.001) + 1) * max(count, 1) + count)
+            for name, seconds in windows.items()
+        }
+        self.last_rtt: Optional[float] = None
+        self.last_seen: Optional[float] = None
+        self.method: Optional[str] = None
+
+    def record(self, timestamp: float, rtts: List[Optional[float]], method: Optional[str] = None) -> None:
+        for rtt in rtts:
+            delta = None
+            if rtt is not None:
+                if self.last_rtt is not None:
+                    delta = abs(rtt - self.last_rtt)
+                self.last_rtt = rtt
+                self.last_seen = time.time()
+            for stats in self.windows.values():
+                stats.add(timestamp, rtt, delta)
+        if method:
+            self.method = method
+
+    def to_dict(self) -> Dict:
+        return {
+            "host": self.host,
+            "method": self.method,
+            "last_seen": self.last_seen,
+            "windows": {name: stats.to_dict() for name, stats in self.windows.items()},
+        }
+
+
+class ConnectivityMonitor:
+    """
+    Probes every host on a fixed schedule and keeps sliding-window metrics.
+    The state can be exported as a Prometheus text file and queried through a
+    local Unix socket (send a host name, or an empty line for all hosts; JSON is returned).
+    With a scheduler (AdaptiveScheduler), probe density and timing follow host health
+    instead of the fixed interval/count.
+    """
+    def __init__(
+        self,
+        hosts: List[str],
+        interval: float = 10.0,
+        count: int = 1,
+        timeout: float = 1.0,
+        windows: Optional[Dict[str, float]] = None,
+        textfile: Optional[str] = None,
+        socket_path: Optional[str] = None,
+        scheduler: Optional[AdaptiveScheduler] = None,
+    ):
+        self.hosts = list(dict.fromkeys(hosts))
+        self.scheduler = scheduler
+        if scheduler is not None:
+            interval = scheduler.base_interval / 4
+            count = max(count, scheduler.dense_count)
+        self.interval = interval
+        self.count = count
+        self.timeout = timeout
+        self.textfile = textfile
+        self.socket_path = socket_path
+        windows = windows or DEFAULT_WINDOWS
+        self.state = {host: HostMonitor(host, windows, interval, count) for host in self.hosts}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+        self.rounds = 0
+
+    def probe_host(self, host: str) -> None:
+        result = probe(host, count=self.count, interval=min(0.2, self.interval), timeout=self.timeout)
+        with self._lock:
+            self.state[host].record(time.monotonic(), result.rtts, result.method)
+
+    def probe_round(self, executor: ThreadPoolExecutor) -> None:
+        if self.scheduler is not None:
+            now = time.monotonic()
+            results = self.scheduler.run_once(executor)
+            with self._lock:
+                for host, result in results.items():
+                    self.state[host].record(now, result.rtts, result.method)
+        else:
+            list(executor.map(self.probe_host, self.hosts))
+        self.rounds += 1
+
+    def snapshot(self, host: Optional[str] = None) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            hosts = [host] if host else self.hosts
+            result = {}
+            for name in hosts:
+                if name in self.state:
+                    for stats in self.state[name].windows.values():
+                        stats.expire(now)
+                    result[name] = self.state[name].to_dict()
+                    if self.scheduler is not None:
+                        result[name]["schedule"] = self.scheduler.hosts[name].to_dict()
+            return {"rounds": self.rounds, "hosts": result}
+
+    def prometheus_text(self) -> str:
+        metrics = {
+            "loss_ratio": ("Packet loss ratio over the window.", lambda s: [("", s.loss)]),
+            "rtt_seconds": ("Round trip time quantiles over the window.", lambda s: [
+                (f',quantile="{q / 100}"', None if s.percentile(q) is None else s.percentile(q) / 1000.0)
+                for q in (50, 90, 99)
+            ]),
+            "jitter_seconds": ("Mean RTT variation over the window.", lambda s: [
+                ("", None if s.jitter is None else s.jitter / 1000.0)
+            ]),
+            "samples": ("Probes sent within the window.", lambda s: [("", s.sent)]),
+        }
+        snapshot = self.snapshot()
+        lines = []
+        with self._lock:
+            for metric, (help_text, values) in metrics.items():
+                name = f"{METRIC_PREFIX}_{metric}"
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                for host in snapshot["hosts"]:
+                    for window, stats in self.state[host].windows.items():
+                        for labels, value in values(stats):
+                            if value is not None:
+                                lines.append(f'{name}{{host="{host}",window="{window}"{labels}}} {value:.6g}')
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self) -> None:
+        """
+        Writes the Prometheus text file atomically (node_exporter textfile collector).
+        """
+        if not self.textfile:
+            return
+        tmp_path = f"{self.textfile}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as file:
+                file.write(self.prometheus_text())
+            os.replace(tmp_path, self.textfile)
+        except OSError as e:
+            print(f"[ERROR] Failed to write {self.textfile}: {e}")
+
+    def start_server(self) -> None:
+        if not self.socket_path:
+            return
+        monitor = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                host = self.rfile.readline().decode(errors="replace").strip() or None
+                self.wfile.write((json.dumps(monitor.snapshot(host)) + "\n").encode())
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"[INFO] Monitor query socket: {self.socket_path}")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self, rounds: Optional[int] = None) -> None:
+        """
+        Runs until stop() (or `rounds` rounds). Rounds start on a fixed schedule,
+        or whenever the next host is due when a scheduler is set.
+        """
+        self.start_server()
+        next_round = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(self.hosts))) as executor:
+                while not self._stop.is_set():
+                    self.probe_round(executor)
+                    self.write_textfile()
+                    if rounds is not None and self.rounds >= rounds:
+                        break
+                    if self.scheduler is not None:
+                        next_round = self.scheduler.next_wakeup()
+                    else:
+                        next_round += self.interval
+                    self._stop.wait(max(0.0, next_round - time.monotonic()))
+        finally:
+            if self._server:
+                self._server.shutdown()
+                self._server.server_close()
+                if os.path.exists(self.socket_path):
+                    os.unlink(self.socket_path)
+
+
+def query(socket_path: str, host: Optional[str] = None) -> Dict:
+    """
+    Reads the current state from a running monitor.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(((host or "") + "\n").encode())
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    return json.loads(data)
@@ -0,0 +1,226 @@
+import fcntl
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Prevent Python from generating .pyc files
+sys.dont_write_bytecode = True
+
+PROC_ROUTE = "/proc/net/route"
+PROC_IPV6_ROUTE = "/proc/net/ipv6_route"
+PROC_IF_INET6 = "/proc/net/if_inet6"
+SYS_CLASS_NET = "/sys/class/net"
+
+SIOCGIFADDR = 0x8915
+RTF_UP = 0x0001
+RTF_GATEWAY = 0x0002
+RTF_REJECT = 0x0200
+
+
+class Route:
+    def __init__(self, interface: str, destination: str, prefix: int, gateway: Optional[str], metric: int, family: int):
+        self.interface = interface
+        self.destination = destination
+        self.prefix = prefix
+        self.gateway = gateway
+        self.metric = metric
+        self.family = family
+
+    @property
+    def is_default(self) -> bool:
+        return self.prefix == 0
+
+    def to_dict(self) -> Dict:
+        return {
+            "interface": self.interface,
+            "destination": f"{self.destination}/{self.prefix}",
+            "gateway": self.gateway,
+            "metric": self.metric,
+            "family": "ipv6" if self.family == socket.AF_INET6 else "ipv4",
+        }
+
+    def __repr__(self):
+        return f"Route({self.destination}/{self.prefix} via {self.gateway} dev {self.interface} metric {self.metric})"
+
+
+class Interface:
+    def __init__(self, name: str, ipv4: List[str], ipv6: List[str], carrier: Optional[bool], operstate: Optional[str]):
+        self.name = name
+        self.ipv4 = ipv4
+        self.ipv6 = ipv6
+        self.carrier = carrier
+        self.operstate = operstate
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "ipv4": self.ipv4,
+            "ipv6": self.ipv6,
+            "carrier": self.carrier,
+            "operstate": self.operstate,
+        }
+
+    def __repr__(self):
+        return f"Interface({self.name}, ipv4={self.ipv4}, ipv6={self.ipv6}, carrier={self.carrier})"
+
+
+class NetworkSnapshot:
+    """
+    Routes, addresses and link state read in one pass, without forking `ip`.
+    """
+    def __init__(self, interfaces: Dict[str, Interface], routes: List[Route], taken_at: float):
+        self.interfaces = interfaces
+        self.routes = routes
+        self.taken_at = taken_at
+
+    @property
+    def default_routes(self) -> List[Route]:
+        """
+        All default routes (IPv4 first), lowest metric first.
+        """
+        defaults = [r for r in self.routes if r.is_default]
+        return sorted(defaults, key=lambda r: (r.family == socket.AF_INET6, r.metric))
+
+    @property
+    def default_route(self) -> Optional[Route]:
+        defaults = self.default_routes
+        return defaults[0] if defaults else None
+
+    def to_dict(self) -> Dict:
+        return {
+            "interfaces": {name: intf.to_dict() for name, intf in self.interfaces.items()},
+            "default_routes": [r.to_dict() for r in self.default_routes],
+        }
+
+
+def _read_lines(path: str) -> List[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read().splitlines()
+    except OSError:
+        return []
+
+
+def _read_value(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        # e.g. reading `carrier` of an interface that is administratively down
+        return None
+
+
+def _hex_to_ipv4(value: str) -> str:
+    return socket.inet_ntoa(struct.pack("<I", int(value, 16)))
+
+
+def _hex_to_ipv6(value: str) -> str:
+    return socket.inet_ntop(socket.AF_INET6, bytes.fromhex(value))
+
+
+def _read_ipv4_routes() -> List[Route]:
+    routes = []
+    for line in _read_lines(PROC_ROUTE)[1:]:
+        parts = line.split()
+        if len(parts) < 8:
+            continue
+        iface, destination, gateway, flags, _, _, metric, mask = parts[:8]
+        flags = int(flags, 16)
+        if not flags & RTF_UP or flags & RTF_REJECT:
+            continue
+        routes.append(Route(
+            interface=iface,
+            destination=_hex_to_ipv4(destination),
+            prefix=bin(int(mask, 16)).count("1"),
+            gateway=_hex_to_ipv4(gateway) if flags & RTF_GATEWAY else None,
+            metric=int(metric),
+            family=socket.AF_INET,
+        ))
+    return routes
+
+
+def _read_ipv6_routes() -> List[Route]:
+    routes = []
+    for line in _read_lines(PROC_IPV6_ROUTE):
+        parts = line.split()
+        if len(parts) < 10:
+            continue
+        destination, prefix, _, _, next_hop, metric, _, _, flags, iface = parts[:10]
+        flags = int(flags, 16)
+        if not flags & RTF_UP or flags & RTF_REJECT or iface == "lo":
+            continue
+        routes.append(Route(
+            interface=iface,
+            destination=_hex_to_ipv6(destination),
+            prefix=int(prefix, 16),
+            gateway=_hex_to_ipv6(next_hop) if flags & RTF_GATEWAY else None,
+            metric=int(metric, 16),
+            family=socket.AF_INET6,
+        ))
+    return routes
+
+
+def _read_ipv6_addresses() -> Dict[str, List[str]]:
+    addresses: Dict[str, List[str]] = {}
+    for line in _read_lines(PROC_IF_INET6):
+        parts = line.split()
+        if len(parts) < 6:
+            continue
+        addresses.setdefault(parts[5], []).append(_hex_to_ipv6(parts[0]))
+    return addresses
+
+
+def _get_ipv4_address(sock: socket.socket, ifname: str) -> Optional[str]:
+    """Returns the primary IPv4 address of the interface (SIOCGIFADDR)."""
+    try:
+        return socket.inet_ntoa(fcntl.ioctl(
+            sock.fileno(),
+            SIOCGIFADDR,
+            struct.pack('256s', ifname[:15].encode('utf-8'))
+        )[20:24])
+    except OSError:
+        return None
+
+
+def read_snapshot() -> NetworkSnapshot:
+    """
+    Reads routes (/proc/net/route, /proc/net/ipv6_route), addresses (SIOCGIFADDR,
+    /proc/net/if_inet6) and link state (/sys/class/net) without spawning processes.
+    """
+    try:
+        names = sorted(os.listdir(SYS_CLASS_NET))
+    except OSError:
+        names = []
+    ipv6 = _read_ipv6_addresses()
+    interfaces = {}
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for name in names:
+            ipv4 = _get_ipv4_address(sock, name)
+            carrier = _read_value(os.path.join(SYS_CLASS_NET, name, "carrier"))
+            interfaces[name] = Interface(
+                name=name,
+                ipv4=[ipv4] if ipv4 else [],
+                ipv6=ipv6.get(name, []),
+                carrier=(carrier == "1") if carrier is not None else None,
+                operstate=_read_value(os.path.join(SYS_CLASS_NET, name, "operstate")),
+            )
+    return NetworkSnapshot(interfaces, _read_ipv4_routes() + _read_ipv6_routes(), time.monotonic())
+
+
+_cache_lock = threading.Lock()
+_cache: Optional[NetworkSnapshot] = None
+
+
+def get_snapshot(ttl: float = 2.0, refresh: bool = False) -> NetworkSnapshot:
+    """
+    Returns a cached snapshot, re-reading the system only when it is older than ttl seconds.
+    """
+    global _cache
+    with _cache_lock:
+        if refresh or _cache is None or time.monotonic() - _cache.taken_at > ttl:
+            _cache = read_snapshot()
+        return _cache
@@ -1,23 +1,49 @@
-import socket
 import fcntl
-import struct
+import socket
 import os
-import getpass
+import queue
+import re
+import struct
+import tempfile
 import subprocess
 import sys
-from typing import List, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, List, Optional
+
+# The other tools modules are imported by the functions that use them,
+# so each action only loads what it needs
+try:
+    from .privileged import run_privileged
+except ImportError:
+    from privileged import run_privileged
+
+if TYPE_CHECKING:
+    from .adaptive import AdaptiveScheduler
+    from .dns import DnsBenchmark
+    from .probe import ProbeResult
 
 # Prevent Python from generating .pyc files
 sys.dont_write_bytecode = True
 
+APT_LOCK_FILE = "/var/lib/apt/lists/lock"
+# glibc reads at most this many nameserver lines from resolv.conf
+MAXNS = 3
+
 
 def _exec(command: List[str]) -> bool:
     """
     Executes the given command.
+    Commands prefixed with "sudo" go through tools.privileged (persistent root helper,
+    or no sudo at all when already root).
     Returns True if successful, False otherwise.
     """
     try:
-        subprocess.run(command, check=True)
+        if command and command[0] == "sudo":
+            run_privileged(command[1:], check=True)
+        else:
+            subprocess.run(command, check=True)
         return True
     except Exception as e:
         print(f"[ERROR] Failed to execute command: {e}")
@@ -60,11 +86,106 @@ def _cat_file(file_path: str) -> str:
     return result.stdout
 
 
-def check_internet_connection_2(attempts: int = 5, host: str = "1.1.1.1") -> bool:
+def _read_file(file_path: str) -> Optional[bytes]:
+    """
+    Reads a file in-process. Returns None if it does not exist or cannot be read.
+    """
+    try:
+        with open(file_path, "rb") as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+# <linux/fs.h>: _IOR('f', 1, long) / _IOW('f', 2, long)
+_LONG_SIZE = struct.calcsize("l")
+FS_IOC_GETFLAGS = 0x80006601 | (_LONG_SIZE << 16)
+FS_IOC_SETFLAGS = 0x40006602 | (_LONG_SIZE << 16)
+FS_IMMUTABLE_FL = 0x00000010
+
+
+def _set_immutable(file_path: str, immutable: bool) -> bool:
+    """
+    Sets or clears the immutable attribute (like chattr +i/-i) with the
+    FS_IOC_GETFLAGS/FS_IOC_SETFLAGS ioctl. Requires root (CAP_LINUX_IMMUTABLE).
+    Returns True if the flag is in the requested state, False otherwise.
+    """
+    try:
+        fd = os.open(file_path, os.O_RDONLY | os.O_NONBLOCK)
+    except OSError:
+        return False
+    try:
+        flags = struct.unpack("i", fcntl.ioctl(fd, FS_IOC_GETFLAGS, struct.pack("i", 0)))[0]
+        new_flags = flags | FS_IMMUTABLE_FL if immutable else flags & ~FS_IMMUTABLE_FL
+        if new_flags != flags:
+            fcntl.ioctl(fd, FS_IOC_SETFLAGS, struct.pack("i", new_flags))
+        return True
+    except OSError as e:
+        # Clearing fails harmlessly on filesystems without attribute support
+        if immutable:
+            print(f"[WARN] Could not set immutable flag on {file_path}: {e}")
+        return False
+    finally:
+        os.close(fd)
+
+
+def atomic_write(file_path: str, content: str, immutable: bool = False) -> bool:
+    """
+    Replaces file_path atomically, without subprocesses: the content is written to a
+    temporary file in the same directory, fsynced and renamed over the target, so
+    readers see either the old or the new file, never a missing one.
+    With immutable=True the immutable flag is cleared before and set again after.
+    Returns True if successful, False otherwise.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    if os.path.exists(file_path):
+        _set_immutable(file_path, False)
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+        with os.fdopen(fd, "wb") as file:
+            file.write(content.encode())
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
+        tmp_path = None
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError as e:
+        print(f"[ERROR] Failed to save file: {e}")
+        if tmp_path:
+            os.unlink(tmp_path)
+        return False
+    if immutable and _set_immutable(file_path, True):
+        print(f"[INFO] File {file_path} has been locked.")
+    return True
+
+
+def check_internet_connection_2(attempts: int = 5, host: str = "1.1.1.1", native: bool = False) -> bool:
     """
     Checks internet connectivity by pinging the specified host.
     Returns True if packets are received, False otherwise.
+    With native=True the in-process probe engine is used instead of the ping binary.
     """
+    if native:
+        try:
+            from .probe import probe
+        except ImportError:
+            from probe import probe
+        print("\n================== Internet Connection Check ==================\n")
+        result = probe(host, count=attempts)
+        if result.received == 0:
+            print("[ERROR] No response from server. No internet connection.")
+            return False
+        if result.received == result.sent:
+            print("[INFO] Internet connection established successfully.")
+            return True
+        print("[INFO] Internet connection is partially working.")
+        return True
     try:
         command = ["ping", "-c", str(attempts), host]
         result = subprocess.run(
@@ -88,59 +209,236 @@ def check_internet_connection_2(attempts: int = 5, host: str = "1.1.1.1") -> boo
         return False
 
 
-def check_internet_connection(host: str = "1.1.1.1", attempts: int = 5) -> bool:
+# One reply line of iputils/BSD ping (LC_ALL=C): "... icmp_seq=1 ttl=117 time=12.3 ms"
+PING_REPLY = re.compile(r"icmp_seq=(?P<seq>\d+)\s+ttl=(?P<ttl>\d+)\s+time[=<](?P<time>[\d.]+)\s*ms")
+# Windows ping has no sequence numbers: "Reply from 1.1.1.1: bytes=32 time=12ms TTL=117"
+WIN_PING_REPLY = re.compile(r"time[=<](?P<time>[\d.]+)\s*ms\s+TTL=(?P<ttl>\d+)", re.IGNORECASE)
+# Seconds between echo requests; iputils accepts down to 0.2 without root
+PING_INTERVAL = 0.5
+
+
+def check_internet_connection(
+    host: str = "1.1.1.1",
+    attempts: int = 5,
+    timeout: Optional[float] = None,
+    output: Optional[List[str]] = None,
+    native: bool = False,
+    threshold: float = 80.0,
+    interval: float = PING_INTERVAL,
+    wait: float = 2.0,
+) -> "ProbeResult":
     """
     Checks internet connectivity by pinging the specified host.
-    Prints output in real time and returns True if at least 80% of packets are received.
+    Prints output in real time; the result is ok if at least `threshold`% of packets are received.
+    Replies are parsed as they stream in and ping is killed as soon as the outcome is
+    settled (threshold reached, or no longer reachable). A packet counts as lost once
+    it is `wait` seconds overdue.
+    If timeout is given, the ping is killed once it expires; an already expired
+    timeout gives a failed result without pinging.
+    If output is given, lines are appended to it instead of being printed.
+    With native=True the in-process probe engine is used instead of the ping binary.
+    Returns a ProbeResult with the per-packet RTTs and statistics.
     """
-    print(f"[INFO] Testing connection to {host} ({attempts} attempts)...")
-    
-    # Platfrom: Linux/macOS or  Windows
-    arg = "-c" if sys.platform != "win32" else "-n"
+    try:
+        from .probe import ProbeResult, settled
+    except ImportError:
+        from probe import ProbeResult, settled
+    log: Callable[[str], None] = output.append if output is not None else print
+    log(f"[INFO] Testing connection to {host} ({attempts} attempts)...")
+
+    if timeout is not None and timeout <= 0:
+        log(f"[WARN] Deadline reached before testing {host}.")
+        return ProbeResult(host, None, "ping", [None] * attempts, error="deadline reached", threshold=threshold)
+
+    if native:
+        return _check_internet_connection_native(host, attempts, timeout, threshold, log)
+
+    # Platfrom: Linux/macOS or Windows (no interval option, replies without icmp_seq)
+    if sys.platform != "win32":
+        command = ["ping", "-c", str(attempts), "-i", str(interval), host]
+    else:
+        command = ["ping", "-n", str(attempts), host]
+        interval = 1.0
     try:
         process = subprocess.Popen(
-            ["ping", host, arg, str(attempts)],
+            command,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
             bufsize=1,
-            universal_newlines=True
+            env=dict(os.environ, LC_ALL="C"),
         )
-
-        received = 0
-        transmitted = 0
-
-        if process.stdout:
-            for line in process.stdout:
-                line = line.strip()
-                if not line:
-                    continue
-
-                print(line)
-
-                if "bytes from" in line or "64 bytes from" in line:
-                    received += 1
-                elif "packets transmitted" in line or "Packets: Sent" in line:
-                    parts = line.split(",")
-                    for part in parts:
-                        if "received" in part:
-                            received = int(part.split()[0])
-                        elif "transmitted" in part or "Received" in part:
-                            transmitted = int(part.split()[0])
-
-        process.wait()
-
-        if transmitted == 0:
-            transmitted = attempts
-
-        success_rate = (received / transmitted) * 100
-        print(f"\n[RESULT] Received {received}/{transmitted} packets ({success_rate:.1f}%)\n")
-
-        return (success_rate >= 80.0, success_rate)
-
     except Exception as e:
-        print(f"[ERROR] Connection check failed: {e}")
-        return False
+        log(f"[ERROR] Connection check failed: {e}")
+        return ProbeResult(host, None, "ping", [None] * attempts, error=str(e), threshold=threshold)
+
+    lines: "queue.Queue[Optional[str]]" = queue.Queue()
+
+    def reader():
+        for line in process.stdout:
+            lines.put(line)
+        lines.put(None)
+
+    threading.Thread(target=reader, daemon=True).start()
+
+    started = time.monotonic()
+    replies = {}
+    finished = stopped_early = False
+    while True:
+        now = time.monotonic()
+        # ping sends icmp_seq 1, 2, ... every `interval` seconds
+        overdue = 0
+        if now - started >= wait:
+            overdue = min(attempts, int((now - started - wait) / interval) + 1)
+        if timeout is not None and now - started >= timeout:
+            log(f"[WARN] Deadline reached while testing {host}.")
+            break
+        known = max([overdue] + list(replies))
+        lost = known - len([seq for seq in replies if seq <= known])
+        if settled(len(replies), lost, attempts, threshold) is not None and known < attempts:
+            stopped_early = True
+            break
+        try:
+            line = lines.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if line is None:
+            finished = True
+            break
+        line = line.strip()
+        if not line:
+            continue
+        log(line)
+        match = PING_REPLY.search(line)
+        if match and 0 < int(match.group("seq")) <= attempts:
+            replies[int(match.group("seq"))] = float(match.group("time"))
+        elif not match and sys.platform == "win32":
+            match = WIN_PING_REPLY.search(line)
+            if match and len(replies) < attempts:
+                replies[len(replies) + 1] = float(match.group("time"))
+
+    if process.poll() is None:
+        process.kill()
+    process.wait()
+
+    known = attempts if finished else max([overdue] + list(replies))
+    result = ProbeResult(
+        host, None, "ping", [replies.get(seq) for seq in range(1, known + 1)],
+        threshold=threshold, stopped_early=stopped_early,
+    )
+    if finished and not replies and process.returncode not in (0, 1):
+        result.error = f"ping exited with code {process.returncode}"
+    _log_result(result, log)
+    return result
+
+
+def _log_result(result: "ProbeResult", log: Callable[[str], None]) -> None:
+    if result.received:
+        log(f"rtt min/avg/max/stddev = {result.min:.3f}/{result.avg:.3f}/{result.max:.3f}/{result.stddev:.3f} ms")
+    if result.stopped_early:
+        log("[INFO] Outcome settled, stopped early.")
+    log(f"\n[RESULT] Received {result.received}/{result.sent} packets ({result.success_rate:.1f}%)\n")
+
+
+def _check_internet_connection_native(
+    host: str,
+    attempts: int,
+    timeout: Optional[float],
+    threshold: float,
+    log: Callable[[str], None],
+) -> "ProbeResult":
+    """
+    Same contract as check_internet_connection, backed by tools.probe.
+    """
+    try:
+        from .probe import probe
+    except ImportError:
+        from probe import probe
+    interval = PING_INTERVAL
+    if timeout is not None and attempts > 1:
+        interval = min(interval, max(timeout - 1.0, 0.0) / (attempts - 1))
+    result = probe(host, count=attempts, interval=interval, threshold=threshold)
+    if result.error:
+        log(f"[ERROR] Connection check failed: {result.error}")
+    for seq, rtt in enumerate(result.rtts):
+        if rtt is None:
+            log(f"No reply from {result.address}: seq={seq}")
+        else:
+            log(f"Reply from {result.address}: seq={seq} method={result.method} time={rtt:.2f} ms")
+    _log_result(result, log)
+    return result
+
+
+def check_host(
+    host: str,
+    scheduler: Optional["AdaptiveScheduler"] = None,
+    attempts: int = 5,
+    timeout: Optional[float] = None,
+    output: Optional[List[str]] = None,
+    native: bool = False,
+) -> "ProbeResult":
+    """
+    check_internet_connection driven by an AdaptiveScheduler (that knows host): the
+    host gets the packets its schedule asks for, one light probe while healthy, and
+    when that probe was lost or slower than the host's baseline it is escalated and
+    probed again densely within the same timeout. Without a scheduler it sends
+    `attempts` packets.
+    """
+    if scheduler is None:
+        return check_internet_connection(host=host, attempts=attempts, timeout=timeout, output=output, native=native)
+    try:
+        from .adaptive import DEGRADED
+    except ImportError:
+        from adaptive import DEGRADED
+    started = time.monotonic()
+    count = scheduler.probe_count(host)
+    result = check_internet_connection(host=host, attempts=count, timeout=timeout, output=output, native=native)
+    if scheduler.update(host, result) == DEGRADED and scheduler.probe_count(host) > count:
+        count = scheduler.probe_count(host)
+        log: Callable[[str], None] = output.append if output is not None else print
+        log(f"[INFO] Loss or latency above the baseline on {host}, probing with {count} packets.")
+        remaining = None if timeout is None else timeout - (time.monotonic() - started)
+        result = check_internet_connection(host=host, attempts=count, timeout=remaining, output=output, native=native)
+        scheduler.update(host, result)
+    return result
+
+
+def check_hosts_concurrently(
+    hosts: List[str],
+    attempts: int = 5,
+    timeout: float = 30.0,
+    max_workers: int = 16,
+    native: bool = False,
+    scheduler: Optional["AdaptiveScheduler"] = None,
+) -> List["ProbeResult"]:
+    """
+    Runs check_internet_connection for every host in parallel on a bounded thread pool.
+    All probes share a single deadline of `timeout` seconds.
+    With a scheduler the number of packets per host follows it (see check_host).
+    The output of each host is printed as one block, as soon as the host finishes.
+    Returns the ProbeResults in the same order as hosts.
+    """
+    deadline = time.monotonic() + timeout
+    print_lock = threading.Lock()
+
+    def check(host: str) -> "ProbeResult":
+        lines: List[str] = []
+        result = check_host(
+            host,
+            scheduler,
+            attempts=attempts,
+            timeout=deadline - time.monotonic(),
+            output=lines,
+            native=native,
+        )
+        with print_lock:
+            print("\n".join(lines))
+        return result
+
+    if not hosts:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(len(hosts), max_workers))) as executor:
+        return list(executor.map(check, hosts))
 
 
 def block_file(file_path: str) -> bool:
@@ -181,106 +479,70 @@ def del_file(file_path: str) -> bool:
     return False
 
 
-def _check_content_matches(expected_dns: List[str], content: str) -> bool:
+def _check_content_matches(expected_dns: List[str], content: str, options: Optional[dict] = None) -> bool:
     """
-    Verifies that all expected DNS entries are present in the content.
+    Verifies that all expected DNS entries are present in the content, in the same order,
+    and, when options are given, that the matching `options` line is present.
     Returns True if all are found, False otherwise.
     """
-    for dns in expected_dns:
-        if f"nameserver {dns}" not in content:
-            return False
+    nameservers = [
+        line.split()[1] for line in content.splitlines()
+        if line.startswith("nameserver") and len(line.split()) > 1
+    ]
+    if [ns for ns in nameservers if ns in expected_dns] != list(expected_dns):
+        return False
+    if options and _render_options(options) not in content.splitlines():
+        return False
     return True
 
-def is_apt_process(line: str) -> bool:
-    return any(keyword in line for keyword in ["apt-get", "apt-cache", "apt install", "/usr/lib/apt"])
+
+def _render_options(options: dict) -> str:
+    return "options " + " ".join(f"{key}:{value}" for key, value in options.items())
 
 
-def get_default_interface_and_ip():
+def _render_resolv_conf(dns_servers: List[str], options: Optional[dict] = None) -> str:
+    """
+    Renders resolv.conf content: nameservers in the given order, then the options line.
+    """
+    lines = [f"nameserver {server}" for server in dns_servers]
+    if options:
+        lines.append(_render_options(options))
+    return "\n".join(lines) + "\n"
+
+def get_default_interface_and_ip(ttl: float = 2.0) -> dict:
     """
     Retorna informações sobre a interface de saída padrão:
     - Interface (ex: eth0)
     - IP local atribuído
-    - Gateway padrão
+    - Gateway padrão (lido da tabela de rotas, não deduzido do IP)
+    - Métrica e estado do link (carrier)
+    Lê /proc e /sys sem criar subprocessos; o resultado fica em cache por `ttl` segundos.
     """
-    def list_network_interfaces():
-        """
-        Lista todas as interfaces de rede disponíveis no sistema.
-        """
-        try:
-            return os.listdir("/sys/class/net")
-        except FileNotFoundError:
-            return []
-    
-    def get_all_ips():
-        """
-        Retorna um dicionário com interfaces e seus IPs.
-        """
-        cmd = ["ip", "-br", "addr", "show"]
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
-        data = {}
-
-        for line in result.stdout.splitlines():
-            parts = line.split()
-            if len(parts) < 3:
-                continue
-            intf = parts[0]
-            ip = parts[2].split("/")[0] if '/' in parts[2] else None
-            data[intf] = ip
-
-        return data
-
-    def get_gateway():
-        """Retorna o gateway padrão."""
-        data = {}
-        try:
-            result = subprocess.run(["ip", "route"],stdout=subprocess.PIPE,stderr=subprocess.DEVNULL,text=True)
-            result = [line.strip() for line in result.stdout.splitlines() if line.startswith("default")]
-            result = result[0] if result else None
-        except:
-            return {}
-        if result:
-            try: 
-                iface = [part.strip() for part in result.split() if part in list_network_interfaces()]
-                iface = iface[0] if iface else None
-                if iface:
-                    data["interface"]=iface
-                    try:
-                        ip = [ip for ifcon, ip in get_all_ips().items() if iface == ifcon]
-                        ip = ip[0] if ip else None
-                    except:
-                        ip = get_ip_address(iface)
-                    if ip:
-                        data["ip"]=ip
-                        try:
-                            class_ip = ip.split('.')[-1] if '.' in ip else ip
-                            class_ip = ip.rstrip(class_ip) if class_ip != ip else class_ip
-                            gw = [part for part in result.split() if class_ip in part]
-                            if gw: data["gateway"]=gw[0]
-                        except:
-                            pass
-            except Exception:
-                pass            
-        return data
-
-    def get_ip_address(ifname):
-        """Retorna o IP da interface."""
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            ip = socket.inet_ntoa(fcntl.ioctl(
-                s.fileno(),
-                0x8915,  # SIOCGIFADDR
-                struct.pack('256s', ifname[:15].encode('utf-8'))
-            )[20:24])
-            return ip
-        except Exception:
-            return None
-
-    # Busca gateway e interface
-    gw_info = get_gateway()
-    if not gw_info:
+    try:
+        from . import netinfo
+    except ImportError:
+        import netinfo
+    snapshot = netinfo.get_snapshot(ttl=ttl)
+    route = snapshot.default_route
+    if route is None:
         return {"error": "No default route found"}
 
-    return gw_info
+    data = {"interface": route.interface}
+    intf = snapshot.interfaces.get(route.interface)
+    if intf:
+        addresses = intf.ipv4 if route.family == socket.AF_INET else intf.ipv6
+        if addresses:
+            data["ip"] = addresses[0]
+    if route.gateway:
+        data["gateway"] = route.gateway
+    data["metric"] = route.metric
+    if intf and intf.carrier is not None:
+        data["carrier"] = "up" if intf.carrier else "down"
+    others = [f"{r.gateway or '-'} dev {r.interface} metric {r.metric}" for r in snapshot.default_routes[1:]]
+    if others:
+        data["other_default_routes"] = ", ".join(others)
+    return data
+
     
 class NetworkManager:
     def __init__(
@@ -288,10 +550,30 @@ class NetworkManager:
         dns_servers: List[str] = None,
         ping_host: str = "www.google.com",
         resolv_conf: str = "/etc/resolv.conf",
+        native_probe: bool = False,
+        resolver_options: Optional[dict] = None,
+        forwarder_address: Optional[str] = None,
+        latency_ms: Optional[float] = None,
     ):
         self.dns_servers = dns_servers or ["8.8.8.8", "8.8.4.4", "1.1.1.1"]
         self.ping_host = ping_host
         self.resolv_conf_path = resolv_conf
+        self.native_probe = native_probe
+        self.resolver_options = resolver_options or {}
+        self.forwarder_address = forwarder_address
+        self.latency_ms = latency_ms
+        self.scheduler: Optional["AdaptiveScheduler"] = None
+
+    @property
+    def resolv_servers(self) -> List[str]:
+        """
+        Nameservers written to resolv.conf: the local forwarder first when enabled
+        (it races dns_servers itself), then dns_servers up to the resolver's limit
+        of MAXNS, so names still resolve if the forwarder is not running.
+        """
+        if not self.forwarder_address:
+            return self.dns_servers
+        return [self.forwarder_address] + [server for server in self.dns_servers if server != self.forwarder_address][:MAXNS - 1]
 
     def configure_dns(self) -> Optional[bool]:
         """
@@ -301,38 +583,69 @@ class NetworkManager:
             - False if failed
             - None if already configured
         """
-        if os.path.exists(self.resolv_conf_path):
+        content = _render_resolv_conf(self.resolv_servers, self.resolver_options)
+        current_content = _read_file(self.resolv_conf_path)
+        if current_content is not None:
+            if current_content == content.encode():
+                return None  # Already configured, byte for byte
+
             print(f"[INFO] Current content of {self.resolv_conf_path}:")
-            current_content = _cat_file(self.resolv_conf_path)
+            current_content = current_content.decode(errors="replace")
             print(current_content)
 
-            if current_content and _check_content_matches(self.dns_servers, current_content):
+            if current_content and _check_content_matches(self.resolv_servers, current_content, self.resolver_options):
                 return None  # Already configured
 
+        if os.geteuid() == 0:
+            # Already root: write in-process, atomically, without sudo/chattr/mv
+            print(f"\n[INFO] Setting up {self.resolv_conf_path}.\n")
+            if atomic_write(self.resolv_conf_path, content, immutable=True):
+                print(f"[INFO] Successfully configured {self.resolv_conf_path}.")
+                print(f"[INFO] New content of {self.resolv_conf_path}:\n{content}")
+                return True
+            print(f"[ERROR] Failed to save {self.resolv_conf_path}.")
+            return False
+
         unblock_file(self.resolv_conf_path)
         if not del_file(self.resolv_conf_path):
             print(f"[ERROR] Failed to remove {self.resolv_conf_path}.")
             return False
 
         print(f"\n[INFO] Setting up {self.resolv_conf_path}.\n")
-        content = "\n".join([f"nameserver {dns}" for dns in self.dns_servers]) + "\n"
-
-        if _save(content, "temp.conf"):
-            if _exec(["sudo", "mv", "temp.conf", self.resolv_conf_path]):
+        # Staged in a private temporary directory: the privilege helper only moves files from there
+        temp_dir = tempfile.mkdtemp(prefix="resolv-")
+        temp_path = os.path.join(temp_dir, "resolv.conf")
+        try:
+            if _save(content, temp_path) and _exec(["sudo", "mv", temp_path, self.resolv_conf_path]):
                 print(f"[INFO] Successfully configured {self.resolv_conf_path}.")
                 block_file(self.resolv_conf_path)
 
                 new_content = _cat_file(self.resolv_conf_path)
                 print(f"[INFO] New content of {self.resolv_conf_path}:\n{new_content}")
                 return True
-            _del_if_exists("temp.conf")
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            os.rmdir(temp_dir)
 
         print(f"[ERROR] Failed to save {self.resolv_conf_path}.")
         return False
 
-    def check_connection(self, percentage_of_correct: float = 60.0) -> bool:
+    def check_connection(
+        self,
+        percentage_of_correct: float = 60.0,
+        concurrent: bool = True,
+        timeout: float = 30.0,
+        adaptive: bool = True,
+    ) -> bool:
         """
         Checks internet connection and handles common issues.
+        With concurrent=True all hosts are probed in parallel, sharing a global
+        deadline of `timeout` seconds; otherwise they are probed one after another.
+        With adaptive=True each host gets one light probe and is only probed densely
+        when it was lost or slower than its baseline (see adaptive_scheduler; the
+        schedule is kept in self.scheduler, so later checks reuse the baselines and
+        back off from hosts that stay down); otherwise every host gets 5 packets.
         """
         info = get_default_interface_and_ip()
         print("[INFO] Default Network Interface Info:")
@@ -342,13 +655,23 @@ class NetworkManager:
         print("\n[INFO] Checking initial internet connection.")
         hosts=[self.ping_host] + self.dns_servers        
         print("[INFO] Testing DNS servers...\n")
+        scheduler = None
+        if adaptive:
+            if self.scheduler is None:
+                self.scheduler = self.adaptive_scheduler()
+            scheduler = self.scheduler
+        if concurrent:
+            host_results = check_hosts_concurrently(hosts, timeout=timeout, native=self.native_probe, scheduler=scheduler)
+        else:
+            host_results = [check_host(host, scheduler, native=self.native_probe) for host in hosts]
         results = []
         rates = 0.0
-        for host in hosts:
-            result, rate = check_internet_connection(host=host)
-            results.append(result)
+        for host, host_result in zip(hosts, host_results):
+            results.append(host_result.ok)
+            rate = host_result.success_rate
             rates += rate
-            print(f"[INFO] {str(f'{rate:.1f}').zfill(3)}% rate of success in test host='{host}'\n")
+            print(f"[INFO] {str(f'{rate:.1f}').zfill(3)}% rate of success in test host='{host}'")
+        print()
         rates=float(rates/len(hosts))
         if all(results):
             print("[SUCCESS] Successfully connected to DNS servers.")
@@ -359,33 +682,120 @@ class NetworkManager:
         print(f"[INFO] Full test {str(f'{rates:.1f}').zfill(3)}% rate of success")
         return rates >= percentage_of_correct
 
+    def benchmark_dns(
+        self,
+        names: Optional[List[str]] = None,
+        rewrite: bool = False,
+        port: Optional[int] = None,
+        timeout: float = 2.0,
+    ) -> List["DnsBenchmark"]:
+        """
+        Sends real DNS queries to every configured server in parallel and ranks them
+        by cold/warm latency and failure rate.
+        With rewrite=True, resolv.conf is rewritten fastest-first with tuned
+        `options timeout:`/`attempts:` (glibc tries the servers in order).
+        Returns the results, fastest first.
+        port: DNS port of the servers (default 53).
+        """
+        try:
+            from . import dns
+        except ImportError:
+            import dns
+        port = dns.DNS_PORT if port is None else port
+        print(f"[INFO] Benchmarking DNS servers: {', '.join(self.dns_servers)}")
+        results = dns.benchmark_servers(self.dns_servers, names, port=port, timeout=timeout)
+
+        def fmt(value):
+            return f"{value:8.1f}" if value is not None else "       -"
+
+        print(f"\n {'server':<20} {'cold ms':>8} {'warm ms':>8} {'fail %':>7}")
+        for result in results:
+            print(f" {result.server:<20} {fmt(result.cold_median)} {fmt(result.warm_median)} {result.failure_rate:7.1f}")
+        print()
+
+        if rewrite:
+            working = [r.server for r in results if r.failure_rate < 100.0]
+            if not working:
+                print("[ERROR] No DNS server answered; keeping current configuration.")
+                return results
+            self.dns_servers = working + [r.server for r in results if r.server not in working]
+            self.resolver_options = dns.suggest_resolver_options(results)
+            print(f"[INFO] New order: {', '.join(self.dns_servers)} ({_render_options(self.resolver_options)})")
+            config_result = self.configure_dns()
+            if config_result is None:
+                print("[INFO] Configuration already applied.")
+        return results
+
+    def adaptive_scheduler(self, **kwargs) -> "AdaptiveScheduler":
+        """
+        Returns an AdaptiveScheduler for ping_host and every DNS server:
+        one light probe per host while healthy, dense probing when loss or latency
+        drifts, exponential backoff (with jitter) for hosts that stay down.
+        Keyword arguments are passed to AdaptiveScheduler (latency_ms defaults to self.latency_ms).
+        """
+        try:
+            from .adaptive import AdaptiveScheduler
+        except ImportError:
+            from adaptive import AdaptiveScheduler
+        kwargs.setdefault("latency_ms", self.latency_ms)
+        return AdaptiveScheduler([self.ping_host] + self.dns_servers, **kwargs)
+
+    def monitor(
+        self,
+        interval: float = 10.0,
+        textfile: Optional[str] = None,
+        socket_path: Optional[str] = None,
+        rounds: Optional[int] = None,
+        adaptive: bool = False,
+    ):
+        """
+        Continuously probes ping_host and every DNS server (Ctrl+C to stop), keeping
+        rolling loss/latency/jitter over 1m/5m/1h windows.
+        The state is exported to `textfile` (Prometheus format) and served on `socket_path`.
+        With adaptive=True probing follows adaptive_scheduler (base interval = interval).
+        Returns the ConnectivityMonitor.
+        """
+        try:
+            from .monitor import ConnectivityMonitor
+        except ImportError:
+            from monitor import ConnectivityMonitor
+        watcher = ConnectivityMonitor(
+            [self.ping_host] + self.dns_servers,
+            interval=interval,
+            textfile=textfile,
+            socket_path=socket_path,
+            scheduler=self.adaptive_scheduler(base_interval=interval) if adaptive else None,
+        )
+        print(f"[INFO] Monitoring {', '.join(watcher.hosts)} every {interval}s (Ctrl+C to stop).")
+        try:
+            watcher.run(rounds)
+        except KeyboardInterrupt:
+            print("\n[INFO] Monitor stopped.")
+        return watcher
+
     def check_proccess_lock(self):
+        """
+        Kills stuck apt processes (found by scanning /proc) and removes the apt lock file.
+        The launching parent chain of every process is printed before it is killed.
+        """
+        try:
+            from . import processes
+        except ImportError:
+            import processes
         print("[INFO] Checking for stuck apt processes.")
-        result = subprocess.run(["ps", "aux"], stdout=subprocess.PIPE, text=True)
-        lines = result.stdout.split("\n")
-        current_user = getpass.getuser()
-
-        for line in lines:
-            if is_apt_process(line):
-                parts = line.split()
-                try:
-                    pid = parts[1]
-                    user = parts[0]
-
-                    # Pula se for processo do usuário atual e do próprio script ou editor
-                    if user == current_user and ("python" in line or "code" in line or "debugpy" in line):
-                        print(f"[SKIP] Skipping own/editor process: {line}")
-                        continue
-
-                    print(f"[INFO] Killing stuck apt process (PID: {pid})")
-                    _exec(["sudo", "kill", "-9", pid])
-                except Exception as e:
-                    print(f"[ERROR] Could not parse line: {e}")
-
-        lock_file="/var/lib/apt/lists/lock"
+        pids = []
+        for record in processes.iter_apt_processes():
+            print(f"[INFO] Killing stuck apt process (PID: {record.pid}, user: {record.user}): {record.command}")
+            for parent in record.parents:
+                print(f"        <- {parent.pid} {parent.user} {parent.command}")
+            pids.append(str(record.pid))
+        if pids:
+            _exec(["sudo", "kill", "-9"] + pids)
+
+        lock_file=APT_LOCK_FILE
         if os.path.exists(lock_file):
             print("[INFO] Removing apt lock files.")
-            _del_if_exists()
+            _del_if_exists(lock_file)
 
         return True
 
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Privilege broker.
+
+Instead of spawning `sudo` for every privileged command, the tool elevates once and
+starts this file as a long-lived root helper
+(`sudo python3 privileged.py --serve --manage PATH... --source PATH...`).
+Requests travel over the helper's stdin/stdout as one JSON object per line:
+
+    -> {"id": 1, "argv": ["systemctl", "daemon-reload"], "capture": false, "timeout": null, "batch": 1, "check": true}
+    <- {"id": 1, "returncode": 0, "stdout": "", "stderr": ""}
+
+Several requests may be written before reading the answers (pipelining); the helper
+answers them in order. With "check", the requests of a batch after a failed one
+are not run and answered with "skipped".
+
+Only executables in ALLOWED_COMMANDS are run, and the file commands only on the
+paths the tool manages (the --manage paths, fixed when the helper is started):
+cp/mv write there (reading from a managed path or a --source directory),
+rm/chattr only touch them, and kill only signals apt processes.
+"""
+import atexit
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from typing import List, Optional, Sequence
+
+# Prevent Python from generating .pyc files
+sys.dont_write_bytecode = True
+
+ALLOWED_COMMANDS = {
+    "chattr",
+    "cp",
+    "date",
+    "kill",
+    "mv",
+    "ntpdate",
+    "rm",
+    "systemctl",
+    "timedatectl",
+    "ufw",
+}
+
+HELPER_PATH = os.path.abspath(__file__)
+PROJECT_DIR = os.path.dirname(os.path.dirname(HELPER_PATH))
+
+
+class BrokerError(OSError):
+    """
+    The helper stopped answering; results holds the answers to the first commands.
+    """
+    def __init__(self, message: str, results: Optional[List[subprocess.CompletedProcess]] = None):
+        super().__init__(message)
+        self.results = results or []
+
+
+def _is_root() -> bool:
+    return hasattr(os, "geteuid") and os.geteuid() == 0
+
+
+# ---------------------------------------------------------------- helper side
+
+def _within(path: str, root: str) -> bool:
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+class Policy:
+    """
+    Paths the helper may write (managed) and read from (sources). A managed
+    directory may be the target of a copy, but only what is inside it may be removed.
+    """
+    def __init__(self, managed: Sequence[str] = (), sources: Sequence[str] = ()):
+        self.managed = [os.path.realpath(path) for path in managed]
+        self.sources = [os.path.realpath(path) for path in sources]
+
+    def writable(self, path: str, remove: bool = False) -> bool:
+        path = os.path.realpath(path)
+        for root in self.managed:
+            if path == root and not (remove and os.path.isdir(root)):
+                return True
+            if path != root and _within(path, root):
+                return True
+        return False
+
+    def source(self, path: str) -> bool:
+        path = os.path.realpath(path)
+        return any(_within(path, root) for root in self.sources)
+
+    def refusal(self, argv: List[str]) -> Optional[str]:
+        """
+        Why the command must not run, None if it may.
+        """
+        name, args = argv[0], list(argv[1:])
+        if "--" in args:
+            index = args.index("--")
+            operands = [arg for arg in args[:index] if not arg.startswith("-")] + args[index + 1:]
+        else:
+            operands = [arg for arg in args if not arg.startswith("-")]
+        if name in ("cp", "mv"):
+            target_option = any(arg.startswith("--target") or (arg[:1] == "-" and arg[1:2] != "-" and "t" in arg) for arg in args)
+            if len(operands) < 2 or target_option:
+                return f"{name}: expected SOURCE... DEST"
+            if not self.writable(operands[-1]):
+                return f"{name}: not a managed path: {operands[-1]}"
+            # mv removes its sources
+            for source in operands[:-1]:
+                if not (self.source(source) or self.writable(source, remove=(name == "mv"))):
+                    return f"{name}: source not allowed: {source}"
+        elif name == "rm":
+            for operand in operands:
+                if not self.writable(operand, remove=True):
+                    return f"rm: not a managed path: {operand}"
+        elif name == "chattr":
+            files = [arg for arg in operands if not arg.startswith(("+", "="))]
+            if not files:
+                return "chattr: no file"
+            for operand in files:
+                if not self.writable(operand):
+                    return f"chattr: not a managed path: {operand}"
+        elif name == "kill":
+            if not operands:
+                return "kill: no pid"
+            for operand in operands:
+                if not operand.isdigit() or not _is_apt_process(int(operand)):
+                    return f"kill: not an apt process: {operand}"
+        return None
+
+
+def _is_apt_process(pid: int) -> bool:
+    try:
+        from . import processes
+    except ImportError:
+        import processes
+    cmdline = processes.read_cmdline(pid)
+    return bool(cmdline) and processes.is_apt_command(cmdline)
+
+
+def _handle(request: dict, policy: Policy) -> dict:
+    argv = request.get("argv") or []
+    response = {"id": request.get("id"), "returncode": 126, "stdout": "", "stderr": ""}
+    if not argv or argv[0] not in ALLOWED_COMMANDS:
+        response["stderr"] = f"command not allowed: {argv[:1]}"
+        return response
+    refusal = policy.refusal(argv)
+    if refusal:
+        response["stderr"] = f"command not allowed: {refusal}"
+        return response
+    executable = shutil.which(argv[0])
+    if executable is None:
+        response["returncode"] = 127
+        response["stderr"] = f"command not found: {argv[0]}"
+        return response
+    capture = bool(request.get("capture"))
+    try:
+        result = subprocess.run(
+            [executable] + list(argv[1:]),
+            stdin=subprocess.DEVNULL,
+            # stdout of the helper is the protocol channel: never let children write to it
+            stdout=subprocess.PIPE if capture else sys.stderr,
+            stderr=subprocess.PIPE if capture else None,
+            text=True,
+            timeout=request.get("timeout"),
+        )
+    except subprocess.TimeoutExpired:
+        response["returncode"] = 124
+        response["stderr"] = f"timeout after {request.get('timeout')}s"
+        return response
+    response["returncode"] = result.returncode
+    response["stdout"] = result.stdout or ""
+    response["stderr"] = result.stderr or ""
+    return response
+
+
+def serve(stdin=None, stdout=None, policy: Optional[Policy] = None) -> None:
+    """
+    Helper main loop: answers requests until stdin is closed.
+    Without a policy no path may be touched.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    policy = policy or Policy()
+    failed_batch = None
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+            batch = request.get("batch")
+            if request.get("check") and batch is not None and batch == failed_batch:
+                response = {"id": request.get("id"), "returncode": None, "stdout": "", "stderr": "", "skipped": True}
+            else:
+                response = _handle(request, policy)
+                if response["returncode"] != 0:
+                    failed_batch = batch
+        except Exception as e:
+            response = {"id": None, "returncode": 126, "stdout": "", "stderr": f"bad request: {e}"}
+        stdout.write(json.dumps(response) + "\n")
+        stdout.flush()
+
+
+# ---------------------------------------------------------------- client side
+
+class PrivilegeBroker:
+    """
+    Client of a root helper started once with sudo.
+    managed: paths the helper may change (see Policy); commands run from
+    this tree and the temporary directory may be copied from.
+    """
+    def __init__(self, command: Optional[List[str]] = None, managed: Sequence[str] = ()):
+        if command is None:
+            command = ["sudo", sys.executable, HELPER_PATH, "--serve"]
+            for path in managed:
+                command += ["--manage", os.path.abspath(path)]
+            for path in (PROJECT_DIR, tempfile.gettempdir()):
+                command += ["--source", path]
+        self.command = command
+        self._process = None
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            process, self._process = self._process, None
+            if process is None:
+                return
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+    def run_many(self, commands: List[List[str]], capture: bool = False, timeout: Optional[float] = None, check: bool = False) -> List[subprocess.CompletedProcess]:
+        """
+        Pipelines all commands to the helper and waits for every answer.
+        With check the helper stops at the first failure: the results end with it.
+        Raises BrokerError (with the answers received so far) if the helper is gone
+        or answers out of order.
+        """
+        with self._lock:
+            self.start()
+            self._next_id += 1
+            batch = self._next_id
+            sent = []
+            try:
+                for argv in commands:
+                    self._next_id += 1
+                    request = {"id": self._next_id, "argv": list(argv), "capture": capture, "timeout": timeout, "batch": batch, "check": check}
+                    self._process.stdin.write(json.dumps(request) + "\n")
+                    sent.append((argv, self._next_id))
+                self._process.stdin.flush()
+            except OSError:
+                # The helper is gone: collect the answers it still wrote
+                pass
+
+            results = []
+            for argv, request_id in sent:
+                line = self._process.stdout.readline()
+                if not line:
+                    raise BrokerError("privilege helper exited", results)
+                try:
+                    response = json.loads(line)
+                except ValueError:
+                    raise BrokerError(f"unexpected answer from privilege helper: {line.strip()}", results)
+                if response.get("id") != request_id:
+                    raise BrokerError(f"unexpected answer from privilege helper: {response}", results)
+                if response.get("skipped"):
+                    continue
+                if response["stderr"] and not capture:
+                    print(response["stderr"], file=sys.stderr)
+                results.append(subprocess.CompletedProcess(
+                    list(argv), response["returncode"], response["stdout"], response["stderr"],
+                ))
+            if len(sent) < len(commands):
+                raise BrokerError("privilege helper exited", results)
+            return results
+
+    def run(self, argv: List[str], capture: bool = False, timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        return self.run_many([argv], capture, timeout)[0]
+
+
+_broker: Optional[PrivilegeBroker] = None
+
+
+def enable_broker(command: Optional[List[str]] = None, managed: Sequence[str] = ()) -> None:
+    """
+    Routes run_privileged through a persistent root helper, allowed to change
+    only the `managed` paths (files, or directories and what is inside them).
+    Nothing is needed when already running as root. The helper is started on first use.
+    """
+    global _broker
+    if _is_root() or _broker is not None:
+        return
+    _broker = PrivilegeBroker(command, managed)
+    atexit.register(disable_broker)
+
+
+def disable_broker() -> None:
+    global _broker
+    if _broker is not None:
+        _broker.close()
+        _broker = None
+
+
+def _check(result: subprocess.CompletedProcess, check: bool) -> subprocess.CompletedProcess:
+    if check and result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, result.args, result.stdout, result.stderr)
+    return result
+
+
+def run_many(commands: List[List[str]], check: bool = False, capture: bool = False, timeout: Optional[float] = None) -> List[subprocess.CompletedProcess]:
+    """
+    Runs privileged commands (argv without `sudo`), pipelined through the broker
+    when it is enabled. Same result/exception contract as subprocess.run: with
+    check, the commands after the first failure are not run.
+    If the helper dies, only the commands it did not answer are run with sudo.
+    """
+    results = []
+    if _broker is not None:
+        try:
+            return [_check(r, check) for r in _broker.run_many(commands, capture, timeout, check)]
+        except BrokerError as e:
+            print(f"[WARN] Privilege helper unavailable, falling back to sudo: {e}")
+            disable_broker()
+            results = [_check(r, check) for r in e.results]
+            commands = commands[len(results):]
+
+    prefix = [] if _is_root() else ["sudo"]
+    pipe = subprocess.PIPE if capture else None
+    return results + [
+        subprocess.run(prefix + list(argv), stdout=pipe, stderr=pipe, text=True, timeout=timeout, check=check)
+        for argv in commands
+    ]
+
+
+def run_privileged(argv: List[str], check: bool = False, capture: bool = False, timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+    return run_many([argv], check, capture, timeout)[0]
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Root helper of the privilege broker.")
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--manage", action="append", default=[], help="path the helper may change")
+    parser.add_argument("--source", action="append", default=[], help="directory the helper may copy from")
+    args = parser.parse_args()
+    if args.serve:
+        serve(policy=Policy(args.manage, args.source))
@@ -0,0 +1,351 @@
+import errno
+import math
+import os
+import select
+import socket
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Prevent Python from generating .pyc files
+sys.dont_write_bytecode = True
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+UDP_PROBE_PORT = 33434
+TCP_PROBE_PORT = 443
+
+METHODS = ("auto", "icmp", "udp", "tcp")
+
+
+class ProbeResult:
+    """
+    Structured result of a probe run.
+    rtts holds one entry per packet whose fate is known: the round trip time in ms,
+    or None if lost. Packets not sent (or still in flight) after an early stop are left out.
+    ok is True when success_rate reaches threshold (percent).
+    """
+    def __init__(
+        self,
+        host: str,
+        address: Optional[str],
+        method: str,
+        rtts: List[Optional[float]],
+        error: Optional[str] = None,
+        threshold: float = 80.0,
+        stopped_early: bool = False,
+    ):
+        self.host = host
+        self.address = address
+        self.method = method
+        self.rtts = rtts
+        self.error = error
+        self.threshold = threshold
+        self.stopped_early = stopped_early
+
+    @property
+    def ok(self) -> bool:
+        return self.sent > 0 and self.success_rate >= self.threshold
+
+    @property
+    def sent(self) -> int:
+        return len(self.rtts)
+
+    @property
+    def received(self) -> int:
+        return len(self.samples)
+
+    @property
+    def samples(self) -> List[float]:
+        return [rtt for rtt in self.rtts if rtt is not None]
+
+    @property
+    def success_rate(self) -> float:
+        return (self.received / self.sent) * 100 if self.sent else 0.0
+
+    @property
+    def loss(self) -> float:
+        return 100.0 - self.success_rate if self.sent else 100.0
+
+    @property
+    def min(self) -> Optional[float]:
+        return min(self.samples) if self.samples else None
+
+    @property
+    def max(self) -> Optional[float]:
+        return max(self.samples) if self.samples else None
+
+    @property
+    def avg(self) -> Optional[float]:
+        samples = self.samples
+        return sum(samples) / len(samples) if samples else None
+
+    @property
+    def stddev(self) -> Optional[float]:
+        samples = self.samples
+        if not samples:
+            return None
+        avg = sum(samples) / len(samples)
+        return math.sqrt(sum((s - avg) ** 2 for s in samples) / len(samples))
+
+    def percentile(self, p: float) -> Optional[float]:
+        return percentile(self.samples, p)
+
+    def to_dict(self) -> Dict:
+        return {
+            "host": self.host,
+            "address": self.address,
+            "method": self.method,
+            "sent": self.sent,
+            "received": self.received,
+            "loss": self.loss,
+            "rtts": self.rtts,
+            "min": self.min,
+            "avg": self.avg,
+            "max": self.max,
+            "stddev": self.stddev,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "ok": self.ok,
+            "stopped_early": self.stopped_early,
+            "error": self.error,
+        }
+
+    def __repr__(self):
+        return f"ProbeResult(host={self.host!r}, method={self.method!r}, received={self.received}/{self.sent})"
+
+
+def settled(received: int, lost: int, count: int, threshold: float) -> Optional[bool]:
+    """
+    Decides a run of count packets early:
+    True once threshold% can no longer be missed, False once it can no longer be
+    reached, None while the outcome still depends on packets not yet answered.
+    """
+    need = math.ceil(count * threshold / 100.0 - 1e-9)
+    if received >= need:
+        return True
+    if count - lost < need:
+        return False
+    return None
+
+
+def percentile(samples: List[float], p: float) -> Optional[float]:
+    """
+    Returns the p-th percentile (0-100) of samples, linearly interpolated.
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * (p / 100.0)
+    low = math.floor(k)
+    high = math.ceil(k)
+    if low == high:
+        return ordered[int(k)]
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _resolve(host: str) -> Tuple[int, str]:
+    """
+    Resolves host once and returns (family, address).
+    """
+    family, _, _, _, sockaddr = socket.getaddrinfo(host, None, 0, socket.SOCK_DGRAM)[0]
+    return family, sockaddr[0]
+
+
+def _icmp_socket(family: int) -> socket.socket:
+    """
+    Opens an unprivileged ICMP datagram socket.
+    Raises PermissionError when net.ipv4.ping_group_range does not allow it.
+    """
+    proto = socket.IPPROTO_ICMPV6 if family == socket.AF_INET6 else socket.IPPROTO_ICMP
+    return socket.socket(family, socket.SOCK_DGRAM, proto)
+
+
+def _probe_icmp(
+    sock: socket.socket,
+    family: int,
+    address: str,
+    count: int,
+    interval: float,
+    timeout: float,
+    threshold: Optional[float] = None,
+) -> Tuple[List[Optional[float]], bool]:
+    """
+    Sends count echo requests, interval seconds apart, and collects the replies.
+    Several requests may be in flight at once; replies are matched by sequence number.
+    With a threshold, stops as soon as the outcome is settled.
+    Returns (rtts of the packets whose fate is known, stopped_early).
+    """
+    request_type = ICMPV6_ECHO_REQUEST if family == socket.AF_INET6 else ICMP_ECHO_REQUEST
+    reply_type = ICMPV6_ECHO_REPLY if family == socket.AF_INET6 else ICMP_ECHO_REPLY
+    ident = os.getpid() & 0xFFFF
+    payload = b"dns_and_date-probe".ljust(32, b".")
+
+    rtts: List[Optional[float]] = [None] * count
+    sent_at: List[Optional[float]] = [None] * count
+    next_send = time.monotonic()
+    last_deadline = None
+    seq = 0
+
+    while True:
+        now = time.monotonic()
+        if threshold is not None:
+            received = sum(1 for r in rtts if r is not None)
+            lost = sum(1 for i in range(seq) if rtts[i] is None and now - sent_at[i] > timeout)
+            if settled(received, lost, count, threshold) is not None and received + lost < count:
+                # Keep the packets whose fate is known; unsent and in-flight ones are dropped
+                return [rtts[i] for i in range(seq) if rtts[i] is not None or now - sent_at[i] > timeout], True
+        if seq < count and now >= next_send:
+            header = struct.pack("!BBHHH", request_type, 0, 0, ident, seq)
+            checksum = _checksum(header + payload)
+            packet = struct.pack("!BBHHH", request_type, 0, checksum, ident, seq) + payload
+            sent_at[seq] = time.monotonic()
+            try:
+                sock.sendto(packet, (address, 0))
+            except OSError:
+                pass
+            seq += 1
+            next_send = sent_at[seq - 1] + interval
+            if seq == count:
+                last_deadline = sent_at[seq - 1] + timeout
+            continue
+
+        if seq == count and (now >= last_deadline or all(r is not None for r in rtts)):
+            break
+
+        wake = next_send if seq < count else last_deadline
+        ready, _, _ = select.select([sock], [], [], max(0.0, wake - now))
+        if not ready:
+            continue
+        try:
+            data = sock.recv(1024)
+        except OSError:
+            continue
+        received_at = time.monotonic()
+
+        # Some platforms (e.g. macOS) hand back the IP header as well.
+        if family == socket.AF_INET and len(data) >= 20 and data[0] >> 4 == 4:
+            data = data[(data[0] & 0x0F) * 4:]
+        if len(data) < 8:
+            continue
+        icmp_type, _, _, _, reply_seq = struct.unpack("!BBHHH", data[:8])
+        if icmp_type != reply_type or reply_seq >= count:
+            continue
+        start = sent_at[reply_seq]
+        if start is not None and rtts[reply_seq] is None and received_at - start <= timeout:
+            rtts[reply_seq] = (received_at - start) * 1000.0
+    return rtts, False
+
+
+def _probe_udp_once(family: int, address: str, port: int, timeout: float) -> Optional[float]:
+    """
+    Sends one UDP datagram to a (normally closed) port.
+    Either an answer or an ICMP port unreachable proves the host is reachable.
+    """
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        start = time.monotonic()
+        try:
+            sock.connect((address, port))
+            sock.send(b"dns_and_date-probe")
+            sock.recv(1024)
+        except ConnectionRefusedError:
+            pass
+        except OSError:
+            return None
+        return (time.monotonic() - start) * 1000.0
+
+
+def _probe_tcp_once(family: int, address: str, port: int, timeout: float) -> Optional[float]:
+    """
+    Opens a TCP connection; both a handshake and a RST prove the host is reachable.
+    """
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        start = time.monotonic()
+        code = sock.connect_ex((address, port))
+        if code in (0, errno.ECONNREFUSED):
+            return (time.monotonic() - start) * 1000.0
+        return None
+
+
+def _probe_serial(
+    once,
+    family: int,
+    address: str,
+    port: int,
+    count: int,
+    interval: float,
+    timeout: float,
+    threshold: Optional[float] = None,
+) -> Tuple[List[Optional[float]], bool]:
+    rtts: List[Optional[float]] = []
+    for i in range(count):
+        started = time.monotonic()
+        rtts.append(once(family, address, port, timeout))
+        if threshold is not None and i < count - 1:
+            received = len([r for r in rtts if r is not None])
+            if settled(received, len(rtts) - received, count, threshold) is not None:
+                return rtts, True
+        if i < count - 1:
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    return rtts, False
+
+
+def probe(
+    host: str,
+    count: int = 5,
+    interval: float = 1.0,
+    timeout: float = 1.0,
+    method: str = "auto",
+    port: Optional[int] = None,
+    threshold: Optional[float] = None,
+) -> ProbeResult:
+    """
+    Probes host from this process, without forking ping.
+    - method="icmp": unprivileged ICMP echo (SOCK_DGRAM/IPPROTO_ICMP)
+    - method="udp": datagram to a closed port, waits for an answer or port unreachable
+    - method="tcp": TCP connect, a handshake or a RST counts as a reply
+    - method="auto": ICMP, falling back to TCP when ICMP sockets are not allowed
+    With a threshold (percent of replies), probing stops as soon as reaching it is
+    guaranteed or impossible; ProbeResult.ok is judged against it (default 80%).
+    Never raises; errors are reported in ProbeResult.error.
+    """
+    limit = 80.0 if threshold is None else threshold
+    if method not in METHODS:
+        return ProbeResult(host, None, method, [None] * count, error=f"unknown probe method: {method}", threshold=limit)
+    try:
+        family, address = _resolve(host)
+    except OSError as e:
+        return ProbeResult(host, None, method, [None] * count, error=f"resolve failed: {e}", threshold=limit)
+
+    if method in ("auto", "icmp"):
+        try:
+            with _icmp_socket(family) as sock:
+                rtts, early = _probe_icmp(sock, family, address, count, interval, timeout, threshold)
+                return ProbeResult(host, address, "icmp", rtts, threshold=limit, stopped_early=early)
+        except OSError as e:
+            if method == "icmp":
+                return ProbeResult(host, address, method, [None] * count, error=f"icmp socket unavailable: {e}", threshold=limit)
+        method = "tcp"
+
+    if method == "udp":
+        once, port = _probe_udp_once, port or UDP_PROBE_PORT
+    else:
+        once, port = _probe_tcp_once, port or TCP_PROBE_PORT
+    rtts, early = _probe_serial(once, family, address, port, count, interval, timeout, threshold)
+    return ProbeResult(host, address, method, rtts, threshold=limit, stopped_early=early)
@@ -0,0 +1,160 @@
+import os
+import pwd
+import sys
+from typing import Dict, Iterator, List, Optional
+
+# Prevent Python from generating .pyc files
+sys.dont_write_bytecode = True
+
+PROC = "/proc"
+
+APT_EXECUTABLES = {"apt", "apt-get", "apt-cache", "aptitude", "unattended-upgrade", "unattended-upgrades"}
+APT_PATH_PREFIXES = ("/usr/lib/apt/",)
+INTERPRETERS = {"sh", "dash", "bash", "python", "python3", "perl"}
+
+
+class ProcessRecord:
+    def __init__(self, pid: int, ppid: int, uid: int, comm: str, cmdline: List[str]):
+        self.pid = pid
+        self.ppid = ppid
+        self.uid = uid
+        self.comm = comm
+        self.cmdline = cmdline
+        self.parents: List["ProcessRecord"] = []
+
+    @property
+    def user(self) -> str:
+        return _user_name(self.uid)
+
+    @property
+    def command(self) -> str:
+        return " ".join(self.cmdline) or f"[{self.comm}]"
+
+    def to_dict(self) -> Dict:
+        return {
+            "pid": self.pid,
+            "ppid": self.ppid,
+            "user": self.user,
+            "comm": self.comm,
+            "cmdline": self.cmdline,
+            "parents": [{"pid": p.pid, "comm": p.comm, "user": p.user} for p in self.parents],
+        }
+
+    def __repr__(self):
+        return f"ProcessRecord(pid={self.pid}, user={self.user!r}, command={self.command!r})"
+
+
+_user_cache: Dict[int, str] = {}
+
+
+def _user_name(uid: int) -> str:
+    if uid not in _user_cache:
+        try:
+            _user_cache[uid] = pwd.getpwuid(uid).pw_name
+        except KeyError:
+            _user_cache[uid] = str(uid)
+    return _user_cache[uid]
+
+
+def _read(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        # The process exited while we were scanning, or it is not readable
+        return None
+
+
+def read_cmdline(pid: int) -> Optional[List[str]]:
+    data = _read(f"{PROC}/{pid}/cmdline")
+    if data is None:
+        return None
+    return [arg.decode("utf-8", "replace") for arg in data.split(b"\x00") if arg]
+
+
+def read_process(pid: int, cmdline: Optional[List[str]] = None) -> Optional[ProcessRecord]:
+    """
+    Reads comm, cmdline and status (uid/ppid) of a single process.
+    Returns None if the process is gone.
+    """
+    status = _read(f"{PROC}/{pid}/status")
+    if status is None:
+        return None
+    ppid = uid = 0
+    for line in status.decode("utf-8", "replace").splitlines():
+        if line.startswith("PPid:"):
+            ppid = int(line.split()[1])
+        elif line.startswith("Uid:"):
+            uid = int(line.split()[1])
+    comm = (_read(f"{PROC}/{pid}/comm") or b"").decode("utf-8", "replace").strip()
+    if cmdline is None:
+        cmdline = read_cmdline(pid) or []
+    return ProcessRecord(pid, ppid, uid, comm, cmdline)
+
+
+def is_apt_command(cmdline: List[str]) -> bool:
+    """
+    Matches on the executable actually being run (argv[0], or the script of an interpreter),
+    not on substrings of the whole command line.
+    """
+    if not cmdline:
+        return False
+    candidates = [cmdline[0]]
+    if os.path.basename(cmdline[0]).rstrip("0123456789.") in INTERPRETERS:
+        candidates += [arg for arg in cmdline[1:] if not arg.startswith("-")][:1]
+    for path in candidates:
+        if os.path.basename(path) in APT_EXECUTABLES or path.startswith(APT_PATH_PREFIXES):
+            return True
+    return False
+
+
+def parent_chain(record: ProcessRecord, max_depth: int = 16) -> List[ProcessRecord]:
+    """
+    Returns the ancestors of a process, closest first, up to (not including) pid 0.
+    """
+    chain = []
+    ppid = record.ppid
+    while ppid > 0 and len(chain) < max_depth:
+        parent = read_process(ppid)
+        if parent is None:
+            break
+        chain.append(parent)
+        ppid = parent.ppid
+    return chain
+
+
+def _own_lineage() -> set:
+    pids = {os.getpid()}
+    me = read_process(os.getpid())
+    if me:
+        pids.update(p.pid for p in parent_chain(me))
+    return pids
+
+
+def iter_apt_processes(with_parents: bool = True) -> Iterator[ProcessRecord]:
+    """
+    Walks /proc with os.scandir and yields apt processes as they are found.
+    Only the cmdline is read for every process; status/comm are read for matches.
+    This process and its ancestors are never reported.
+    """
+    own = _own_lineage()
+    with os.scandir(PROC) as entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            pid = int(entry.name)
+            if pid in own:
+                continue
+            cmdline = read_cmdline(pid)
+            if not cmdline or not is_apt_command(cmdline):
+                continue
+            record = read_process(pid, cmdline)
+            if record is None:
+                continue
+            if with_parents:
+                record.parents = parent_chain(record)
+            yield record
+
+
+def find_apt_processes(with_parents: bool = True) -> List[ProcessRecord]:
+    return list(iter_apt_processes(with_parents))
@@ -1,11 +1,91 @@
 #!/usr/bin/env python3
+import hashlib
 import os
+import shutil
 import subprocess
 import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
 
 # Force Python not to create .pyc files
 sys.dont_write_bytecode = True
 
+try:
+    from .privileged import run_privileged
+except ImportError:
+    from privileged import run_privileged
+
+# What MyService.apply() does to a unit
+INSTALL = "install"
+UPDATE = "update"
+START = "start"
+REMOVE = "remove"
+UNCHANGED = "unchanged"
+
+STATE_PROPERTIES = ("Id", "ActiveState", "SubState", "UnitFileState")
+# MyService.status(): column -> systemctl property (the last two only exist for timers)
+STATUS_PROPERTIES = {
+    "load": "LoadState",
+    "active": "ActiveState",
+    "sub": "SubState",
+    "enabled": "UnitFileState",
+    "exit_status": "ExecMainStatus",
+    "last_trigger": "LastTriggerUSec",
+    "next_elapse": "NextElapseUSecRealtime",
+}
+
+
+def _read(path: Optional[str]) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as file:
+            return file.read()
+    except (OSError, TypeError):
+        return None
+
+
+def _file_digest(path: Optional[str]) -> Optional[str]:
+    """
+    sha256 of a file's content, None if it cannot be read.
+    """
+    data = _read(path)
+    return None if data is None else hashlib.sha256(data).hexdigest()
+
+
+def _names(depende) -> List[str]:
+    """
+    Unit names a `depende` value refers to (a name or a list of names).
+    """
+    if not depende:
+        return []
+    return [depende] if isinstance(depende, str) else list(depende)
+
+
+def _running(state: Optional[Dict[str, str]]) -> bool:
+    return bool(state) and state.get("UnitFileState") == "enabled" and state.get("ActiveState") in ("active", "activating", "reloading")
+
+
+def unit_states(names: List[str], properties: Iterable[str] = STATE_PROPERTIES) -> Dict[str, Dict[str, str]]:
+    """
+    Live state of the units (the given `systemctl show` properties) with a single
+    `systemctl show`, which needs no privileges. Units missing from the result are unknown.
+    """
+    if not names:
+        return {}
+    try:
+        result = subprocess.run(
+            ["systemctl", "show", f"--property={','.join(properties)}", "--"] + list(names),
+            capture_output=True, text=True, timeout=10,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return {}
+    states = {}
+    # One block of key=value lines per unit, in the order asked, separated by blank lines
+    for name, block in zip(names, result.stdout.strip().split("\n\n")):
+        states[name] = dict(line.split("=", 1) for line in block.splitlines() if "=" in line)
+    return states
+
+
 class ModelService():
     def __init__(self, prefix: str, name: str, function, depende=None, auto_init=True, destination_path="~/", sufix="service"):
         self.name = f"{prefix}-{name}.{sufix}"
@@ -14,9 +94,32 @@ class ModelService():
         self.auto_init = auto_init
         self.destination_path = os.path.join(destination_path, self.name)
         self.is_timer = True if sufix == "timer" else False
+        self.file_path = None
+        self.content = None
+        self.deployed_content = None
+
+
+    def render(self):
+        """
+        Renders the unit in memory; returns its content (also kept in self.content).
+        """
+        if self.depende:
+            self.content, self.file_path = self.__create(self.depende)
+        else:
+            self.content, self.file_path = self.__create()
+        return self.content
+
+
+    @property
+    def digest(self):
+        return hashlib.sha256(self.content.encode()).hexdigest()
 
 
-    def create(self):
+    def create(self, log: Callable[[str], None] = print):
+        """
+        Renders the unit and saves it into the script directory, unless the saved file
+        already has the same content. Progress goes to log (print by default).
+        """
         def _save(_content):
             """
             Salva o arquivo de serviço.
@@ -25,22 +128,44 @@ class ModelService():
                 file_path_service = os.path.join(self.file_path, self.name)
                 with open(file_path_service, 'w') as file:
                     file.write(_content)
-                print(f"[INFO] Serviço salvo: {file_path_service}")
+                log(f"[INFO] Serviço salvo: {file_path_service}")
                 return True
             except Exception as e:
-                print(f"[ERROR] Falha ao salvar o {self.name}: {e}")
+                log(f"[ERROR] Falha ao salvar o {self.name}: {e}")
                 return False
-        
-        if self.depende:
-            _content, self.file_path = self.__create(self.depende)
-        else:
-            _content, self.file_path = self.__create()
-            
+
+        _content = self.render()
+        if _file_digest(self.source_path) == self.digest:
+            return True
         if _save(_content):
             return True
         return False
 
 
+    @property
+    def source_path(self):
+        """
+        Unit file in the script directory (None before render()).
+        """
+        return os.path.join(self.file_path, self.name) if self.file_path else None
+
+
+    @property
+    def deployed(self):
+        return os.path.exists(self.destination_path)
+
+
+    def changed(self):
+        """
+        True if the rendered unit differs from the deployed one (or is not deployed).
+        """
+        if self.content is None:
+            self.render()
+        # Kept so that a failed transaction can put it back
+        self.deployed_content = _read(self.destination_path)
+        return self.deployed_content is None or hashlib.sha256(self.deployed_content).hexdigest() != self.digest
+
+
     def install(self):
         """
         Ativa e inicia o serviço systemd.
@@ -57,7 +182,7 @@ class ModelService():
                 print(f"[ERROR] Arquivo não encontrado em: {file_path_service}")
                 return False
             try:
-                subprocess.run(["sudo", "cp", file_path_service, self.destination_path], check=True)
+                run_privileged(["cp", file_path_service, self.destination_path], check=True)
                 print(f"[INFO] Serviço copiado para {self.destination_path}")
                 return True
             except subprocess.CalledProcessError as e:
@@ -65,7 +190,7 @@ class ModelService():
                 return False
             
         if copy_to_destiny():
-            subprocess.run(["sudo", "systemctl", "daemon-reload"], check=True) 
+            run_privileged(["systemctl", "daemon-reload"], check=True) 
             if self.auto_init:
                 self.systemctl_enable()
                 self.systemctl_start()
@@ -82,10 +207,10 @@ class ModelService():
         if os.path.exists(self.destination_path):
             try:
                 if self.systemctl_stop() and self.systemctl_disable():
-                    subprocess.run(["sudo", "rm", self.destination_path], check=True)
+                    run_privileged(["rm", self.destination_path], check=True)
                     print(f"[INFO] {self.name} desistalado")
                     if _reload:
-                        subprocess.run(["sudo", "systemctl", "daemon-reload"], check=True)
+                        run_privileged(["systemctl", "daemon-reload"], check=True)
                     return True
             except subprocess.CalledProcessError as e:
                 print(f"[ERROR] Falha ao copiar {self.name}: {e}")
@@ -97,7 +222,7 @@ class ModelService():
     def __systemctl(self, action):
         if os.path.exists(self.destination_path):
             try:
-                subprocess.run(["sudo", "systemctl", action, self.name], check=True)
+                run_privileged(["systemctl", action, self.name], check=True)
                 return True
             except subprocess.CalledProcessError as e:
                 print(f"[ERROR] Falha ao executar  'systemctl {action} {self.name}': {e}")
@@ -122,12 +247,278 @@ class ModelService():
     
 
 class MyService:
-    def __init__(self, prefix: str, destination_path: str):
+    def __init__(self, prefix: str, destination_path: str, workers: int = 4):
         self.prefix = prefix
         self.destination_path = destination_path
+        self.workers = workers
     
     def create_service(self, name: str, function, depende=None, auto_init=False):
         return ModelService(self.prefix, name, function, depende, auto_init, self.destination_path, "service")
     
     def create_timer(self, name: str, function, depende=None, auto_init=True):
-        return ModelService(self.prefix, name, function, depende, auto_init, self.destination_path, "timer")
\ No newline at end of file
+        return ModelService(self.prefix, name, function, depende, auto_init, self.destination_path, "timer")
+
+
+    def changes(self, install: Iterable[ModelService], remove: Iterable[ModelService] = ()) -> Dict[str, str]:
+        """
+        What a transaction would do to each unit: INSTALL (not deployed), UPDATE
+        (deployed file differs), START (same file, but not enabled and running),
+        REMOVE (deployed, only in `remove`) or UNCHANGED.
+        Units are rendered in memory and compared by hash; nothing is written.
+        """
+        install = list(install)
+        for service in install:
+            if service.content is None:
+                service.render()
+        names = {service.name for service in install}
+        # Each deployed file is read and hashed once
+        changed = {service.name: service.changed() for service in install if service.deployed}
+        states = unit_states([service.name for service in install if service.auto_init and changed.get(service.name) is False])
+        actions = {}
+        for service in install:
+            if service.name not in changed:
+                actions[service.name] = INSTALL
+            elif changed[service.name]:
+                actions[service.name] = UPDATE
+            elif service.auto_init and not _running(states.get(service.name)):
+                actions[service.name] = START
+            else:
+                actions[service.name] = UNCHANGED
+        for service in remove:
+            if service.name not in names and service.deployed:
+                actions[service.name] = REMOVE
+        return actions
+
+
+    @staticmethod
+    def levels(services: Iterable[ModelService]) -> List[List[ModelService]]:
+        """
+        Topological levels of the `depende` DAG: every unit comes after the units it
+        depends on (dependencies outside the set are ignored), units of the same level
+        are independent. Raises ValueError on a dependency cycle.
+        """
+        remaining = list(services)
+        names = {service.name for service in remaining}
+        depends = {service.name: [name for name in _names(service.depende) if name in names and name != service.name] for service in remaining}
+        levels = []
+        done = set()
+        while remaining:
+            ready = [service for service in remaining if all(name in done for name in depends[service.name])]
+            if not ready:
+                raise ValueError(f"Dependency cycle between {', '.join(service.name for service in remaining)}")
+            levels.append(ready)
+            done.update(service.name for service in ready)
+            remaining = [service for service in remaining if service.name not in done]
+        return levels
+
+
+    def _steps(self, install: List[ModelService], remove: Iterable[ModelService], actions: Dict[str, str], backup: Optional[str] = None):
+        """
+        The transaction as (command, undo commands) pairs, in order. Shared steps (cp,
+        daemon-reload) run once; starts go level by level of the DAG, so the cost grows
+        with its depth, not with the number of units. Removals come last, once the
+        install went through. backup: directory holding the previous content of the
+        updated units, restored by the undo of the copy.
+        """
+        changed = [service for service in install if actions[service.name] in (INSTALL, UPDATE)]
+        steps = []
+        if changed:
+            destination = os.path.dirname(changed[0].destination_path)
+            new = [service.destination_path for service in changed if actions[service.name] == INSTALL]
+            updated = [service for service in changed if actions[service.name] == UPDATE]
+            restore = [service for service in updated if service.deployed_content is not None]
+            undo = []
+            if new:
+                undo.append(["rm", "-f"] + new)
+            if restore and backup:
+                undo.append(["cp"] + [os.path.join(backup, service.name) for service in restore] + [destination])
+            undo.append(["systemctl", "daemon-reload"])
+            if updated:
+                undo.append(["systemctl", "try-restart"] + [service.name for service in updated])
+            steps.append((["cp"] + [service.source_path for service in changed] + [destination], undo))
+            steps.append((["systemctl", "daemon-reload"], []))
+
+        for level in self.levels(service for service in install if service.auto_init):
+            # Running units whose file changed are restarted, the others started if needed
+            updated = [service.name for service in level if actions[service.name] == UPDATE]
+            started = [service.name for service in level if actions[service.name] in (INSTALL, START)]
+            if updated:
+                steps.append((["systemctl", "enable"] + updated, []))
+                steps.append((["systemctl", "restart"] + updated, []))
+            if started:
+                steps.append((["systemctl", "enable", "--now"] + started, [["systemctl", "disable", "--now"] + started]))
+
+        removed = [service for service in remove if actions.get(service.name) == REMOVE]
+        if removed:
+            # Dependents are stopped before what they depend on
+            for level in reversed(self.levels(removed)):
+                steps.append((["systemctl", "disable", "--now"] + [service.name for service in level], []))
+            steps.append((["rm", "-f"] + [service.destination_path for service in removed], []))
+            steps.append((["systemctl", "daemon-reload"], []))
+        return steps
+
+
+    def plan(self, install: Iterable[ModelService], remove: Iterable[ModelService] = (), actions: Optional[Dict[str, str]] = None) -> List[List[str]]:
+        """
+        Minimal privileged commands that bring the systemd directory to `install`
+        and remove the deployed units of `remove` that are not in it:
+        one `cp` of every changed unit file, a single `daemon-reload`, grouped
+        `systemctl enable --now` / `restart` per level of the dependency DAG,
+        then `disable --now` and one `rm` for the removed units.
+        Empty when everything is up to date.
+        """
+        install, remove = list(install), list(remove)
+        actions = self.changes(install, remove) if actions is None else actions
+        return [argv for argv, _ in self._steps(install, remove, actions)]
+
+
+    def _prepare(self, service: ModelService, log: Callable[[str], None] = print) -> Optional[str]:
+        """
+        Writes a changed unit into the script directory and checks it with
+        `systemd-analyze verify` (together with the units it depends on, when known).
+        Returns the error, None if the unit is fine.
+        """
+        if not service.create(log):
+            return f"failed to save {service.source_path}"
+        if shutil.which("systemd-analyze") is None:
+            return None
+        files = [service.source_path] + [
+            os.path.join(service.file_path, name) for name in _names(service.depende)
+            if os.path.exists(os.path.join(service.file_path, name))
+        ]
+        try:
+            result = subprocess.run(["systemd-analyze", "verify"] + files, capture_output=True, text=True, timeout=30)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            return str(e)
+        if result.returncode:
+            return (result.stderr or result.stdout).strip() or "verify failed"
+        return None
+
+
+    def _undo(self, undo: List[List[str]]) -> None:
+        print("[WARN] Desfazendo a instalação...")
+        for argv in undo:
+            print(f"[INFO] {' '.join(argv)}")
+            try:
+                run_privileged(argv, check=True)
+            except (subprocess.CalledProcessError, OSError) as e:
+                print(f"[ERROR] Falha ao executar '{' '.join(argv)}': {e}")
+
+
+    def apply(self, install: Iterable[ModelService], remove: Iterable[ModelService] = (), dry_run: bool = False) -> bool:
+        """
+        Brings the units up to date as one transaction (see plan()). The changed units
+        are written and validated concurrently on a pool of `workers` threads before
+        any privileged command runs; with nothing changed this costs a few file reads
+        and one `systemctl show`. If a command fails, what was done is undone in
+        reverse order (units stopped dependents first, previous unit files restored).
+        dry_run: only print what would change.
+        Returns True if successful, False otherwise.
+        """
+        # Both are walked more than once (changes, then the steps)
+        install, remove = list(install), list(remove)
+        for service in install:
+            service.render()
+        actions = self.changes(install, remove)
+        if dry_run:
+            for name, action in actions.items():
+                print(f"[PLAN] {name}: {action}")
+            for argv in self.plan(install, remove, actions):
+                print(f"[PLAN] {' '.join(argv)}")
+            return True
+
+        changed = [service for service in install if actions[service.name] in (INSTALL, UPDATE)]
+        if changed:
+            # The workers collect their output, printed once all of them finished
+            output = {service.name: [] for service in changed}
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(changed))) as executor:
+                errors = list(executor.map(lambda service: self._prepare(service, output[service.name].append), changed))
+            for service, error in zip(changed, errors):
+                for line in output[service.name]:
+                    print(line)
+                if error:
+                    print(f"[ERROR] {service.name} inválido: {error}")
+            if any(errors):
+                return False
+
+        backup = tempfile.mkdtemp(prefix="units-")
+        try:
+            for service in install:
+                if actions[service.name] == UPDATE and service.deployed_content is not None:
+                    with open(os.path.join(backup, service.name), 'wb') as file:
+                        file.write(service.deployed_content)
+            steps = self._steps(install, remove, actions, backup)
+            if not steps:
+                print("[INFO] Serviços já estão atualizados.")
+                return True
+            undo = []
+            for argv, reverse in steps:
+                print(f"[INFO] {' '.join(argv)}")
+                try:
+                    run_privileged(argv, check=True)
+                except (subprocess.CalledProcessError, OSError) as e:
+                    print(f"[ERROR] Falha ao executar '{' '.join(argv)}': {e}")
+                    self._undo(undo)
+                    return False
+                undo[:0] = reverse
+            return True
+        finally:
+            shutil.rmtree(backup, ignore_errors=True)
+
+
+    def managed(self) -> List[str]:
+        """
+        Names of the deployed units with our prefix in destination_path.
+        """
+        try:
+            names = os.listdir(self.destination_path)
+        except OSError:
+            return []
+        return sorted(name for name in names if name.startswith(f"{self.prefix}-") and name.endswith((".service", ".timer")))
+
+
+    def status(self, services: Optional[Iterable] = None) -> List[Dict]:
+        """
+        State of every unit (ModelService objects or names; default: managed())
+        from one `systemctl show` call, one dict per unit with the STATUS_PROPERTIES
+        columns (None when unknown or not applicable).
+        """
+        names = [getattr(service, "name", service) for service in (self.managed() if services is None else services)]
+        states = unit_states(names, ["Id"] + list(STATUS_PROPERTIES.values()))
+        rows = []
+        for name in names:
+            state = states.get(name, {})
+            row = {"unit": name}
+            for column, prop in STATUS_PROPERTIES.items():
+                value = state.get(prop) or None
+                row[column] = None if value in ("n/a", "0") and column in ("last_trigger", "next_elapse") else value
+            if row["exit_status"] is not None and row["exit_status"].isdigit() and not name.endswith(".timer"):
+                row["exit_status"] = int(row["exit_status"])
+            else:
+                row["exit_status"] = None
+            rows.append(row)
+        return rows
+
+
+def status_table(rows: List[Dict]) -> str:
+    """
+    MyService.status() rows as an aligned text table.
+    """
+    columns = ["unit"] + list(STATUS_PROPERTIES)
+    cells = [[column.upper() for column in columns]]
+    cells += [["-" if row.get(column) is None else str(row[column]) for column in columns] for row in rows]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(columns))]
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip() for line in cells)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="State of the managed systemd units, with one systemctl call.")
+    parser.add_argument("units", nargs="*", help="units to show (default: every deployed unit with the prefix)")
+    parser.add_argument("--prefix", default="system")
+    parser.add_argument("--destination", default="/etc/systemd/system/")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+    rows = MyService(args.prefix, args.destination).status(args.units or None)
+    print(json.dumps(rows) if args.json else status_table(rows))